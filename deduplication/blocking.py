@@ -0,0 +1,274 @@
+"""
+This module is used for generating candidate pairs for deduplication without comparing every pair of citations.
+Citations are expected to be formatted by engine.format_citations.
+"""
+from collections import defaultdict
+from itertools import combinations
+from typing import Iterable, List, Set, Tuple, Union
+
+import numpy as np
+
+# exact-key blocking rounds of ASySD match_citations, pairs of blocks up to MAX_EXACT_BLOCK_SIZE are compared
+# as ASySD does
+EXACT_ROUNDS = (
+    ('title',),
+    ('author', 'title'),
+    ('title', 'abstract'),
+    ('doi',),
+    ('author', 'year'),
+    ('year', 'title'),
+    ('title', 'journal'),
+)
+# rounds which ASySD doesn't have, they only add candidates
+FUZZY_ROUNDS = (
+    ('surname', 'year'),
+)
+BLOCKING_ROUNDS = EXACT_ROUNDS + FUZZY_ROUNDS
+_FUZZY_ROUND_NAMES = frozenset('+'.join(block) for block in FUZZY_ROUNDS)
+_EXACT_ROUND_NAMES = frozenset('+'.join(block) for block in EXACT_ROUNDS)
+# values standing for a missing one, e.g. format_citations turns missing authors into UNKNOWN;
+# they would put unrelated citations into one block
+PLACEHOLDERS = frozenset(('UNKNOWN', 'ANONYMOUS', 'NA', 'N/A', 'NONE', 'NULL', 'UNTITLED', 'NO TITLE'))
+
+# blocks of fuzzy rounds larger than this are chained in sorted order instead of being compared pairwise,
+# e.g. all citations of authors with a common surname in one year
+MAX_BLOCK_SIZE = 50
+# the same for exact rounds, e.g. all editorials of one year, so that pairs grow linearly with citations
+MAX_EXACT_BLOCK_SIZE = 200
+WINDOW = 3
+# in bytes, at most 8 so that a shingle fits into one integer
+SHINGLE_SIZE = 3
+BANDS = 16
+ROWS = 4
+# titles hashed at once, bounds memory used for signatures
+CHUNK_SIZE = 2000
+
+
+def candidate_pairs(citations: List[dict], window: int = WINDOW, bands: int = BANDS, rows: int = ROWS,
+                    max_block_size: int = MAX_BLOCK_SIZE,
+                    max_exact_block_size: int = MAX_EXACT_BLOCK_SIZE) -> List[Tuple[int, int]]:
+    """
+    Union of pairs from exact-key blocking, sorted neighbourhood on titles and MinHash-LSH on title shingles.
+    Blocks of the exact rounds of ASySD are compared pairwise up to max_exact_block_size, so pairs ASySD compares
+    are among the candidates unless a key is shared by that many citations.
+    :param citations: formatted citations
+    :type citations: List[dict]
+    :param window: number of neighbours in title order each citation is paired with
+    :type window: int
+    :param bands: number of LSH bands
+    :type bands: int
+    :param rows: number of MinHash values in a band, more rows make a band match only more similar titles
+    :type rows: int
+    :param max_block_size: blocks of fuzzy rounds and of LSH larger than this are chained instead of compared
+    pairwise
+    :type max_block_size: int
+    :param max_exact_block_size: blocks of exact rounds larger than this are chained instead of compared pairwise
+    :type max_exact_block_size: int
+    :return: sorted pairs of citation indices, the first index is always the smaller one
+    :rtype: List[Tuple[int, int]]
+    """
+
+    pairs = key_pairs(citations, EXACT_ROUNDS, max_exact_block_size)
+    pairs |= key_pairs(citations, FUZZY_ROUNDS, max_block_size)
+    pairs |= sorted_neighbourhood_pairs(citations, window)
+    pairs |= minhash_lsh_pairs(citations, bands, rows, max_block_size)
+
+    return sorted(pairs)
+
+
+def key_pairs(citations: List[dict], rounds: Iterable[tuple] = EXACT_ROUNDS,
+              max_block_size: Union[int, None] = None) -> Set[Tuple[int, int]]:
+    """
+    Pairs of citations with equal values of all fields of a round; missing values and placeholders never match.
+    Blocks are compared pairwise whatever their size, unless max_block_size is set.
+    """
+
+    pairs = set()
+    for block in rounds:
+        groups = defaultdict(list)
+        for index, citation in enumerate(citations):
+            key = _round_key(citation, block)
+            if key is not None:
+                groups[key].append(index)
+
+        pairs |= _block_pairs(citations, groups.values(), max_block_size)
+
+    return pairs
+
+
+def sorted_neighbourhood_pairs(citations: List[dict], window: int = WINDOW) -> Set[Tuple[int, int]]:
+    """
+    Pairs of citations which are close to each other when sorted by title.
+    """
+
+    titles = sorted((' '.join(citation['title'].split()), index)
+                    for index, citation in enumerate(citations) if citation['title'])
+
+    pairs = set()
+    for position, (_, index) in enumerate(titles):
+        for _, other in titles[position + 1:position + window]:
+            pairs.add((min(index, other), max(index, other)))
+
+    return pairs
+
+
+def minhash_lsh_pairs(citations: List[dict], bands: int = BANDS, rows: int = ROWS,
+                      max_block_size: int = MAX_BLOCK_SIZE) -> Set[Tuple[int, int]]:
+    """
+    Pairs of citations with similar sets of title shingles: titles which share at least one band
+    of their MinHash signatures.
+    """
+
+    indices, band_keys = _band_keys(citations, bands, rows)
+    if len(indices) < 2:
+        return set()
+
+    blocks = []
+    for keys in band_keys:
+        # titles with equal keys are neighbours after sorting, only groups of two and more make pairs
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+
+        for group_start, group_end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            blocks.append(sorted(indices[order[group_start:group_end]].tolist()))
+
+    return _block_pairs(citations, blocks, max_block_size)
+
+
+def blocking_keys(citations: List[dict], bands: int = BANDS, rows: int = ROWS) -> List[Set[str]]:
+    """
+    Keys of every citation in the key rounds and in the LSH bands. Citations paired by these rounds share
+    a key, so keys of deduplicated citations can be stored and new citations blocked only against citations
+    with the same keys. Sorted neighbourhood has no keys, it depends on all titles.
+    :param citations: formatted citations
+    :type citations: List[dict]
+    :return: keys of every citation
+    :rtype: List[Set[str]]
+    """
+
+    keys = [set() for _ in citations]
+    for block in BLOCKING_ROUNDS:
+        for index, citation in enumerate(citations):
+            key = _round_key(citation, block)
+            if key is not None:
+                keys[index].add('+'.join(block) + ':' + '\x1f'.join(map(str, key)))
+
+    indices, band_keys = _band_keys(citations, bands, rows)
+    for band, band_key in enumerate(band_keys):
+        for index, key in zip(indices.tolist(), band_key.tolist()):
+            keys[index].add(f'lsh{band}:{key}')
+
+    return keys
+
+
+def max_key_block_size(key: str) -> Union[int, None]:
+    """
+    :param key: key returned by blocking_keys or any other key
+    :type key: str
+    :return: size above which blocks of the key are chained instead of compared pairwise, None for other keys
+    :rtype: Union[int, None]
+    """
+
+    round_name = key.split(':', 1)[0]
+    if key.startswith('lsh') or round_name in _FUZZY_ROUND_NAMES:
+        return MAX_BLOCK_SIZE
+    if round_name in _EXACT_ROUND_NAMES:
+        return MAX_EXACT_BLOCK_SIZE
+    return None
+
+
+def _band_keys(citations: List[dict], bands: int, rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MinHash signatures of titles hashed band by band.
+    :return: indices of citations with titles and a key of every band for each of them
+    """
+
+    indices = np.array([index for index, citation in enumerate(citations) if citation['title']], dtype=np.int64)
+    if not len(indices):
+        return indices, np.zeros((bands, 0), dtype=np.uint64)
+
+    # a random odd multiplier and an offset for every MinHash value; over well mixed hashes
+    # a * x + b modulo 2 ** 64 is a cheap enough permutation
+    generator = np.random.default_rng(0)
+    a = generator.integers(0, np.iinfo(np.uint64).max, size=(bands * rows, 1), dtype=np.uint64) | np.uint64(1)
+    b = generator.integers(0, np.iinfo(np.uint64).max, size=(bands * rows, 1), dtype=np.uint64)
+
+    signatures = []
+    for start in range(0, len(indices), CHUNK_SIZE):
+        hashes, offsets = _shingle_hashes([citations[index]['title'] for index in indices[start:start + CHUNK_SIZE]])
+        # minimum of every permuted hash over the shingles of each title
+        signatures.append(np.minimum.reduceat(a * _mix(hashes) + b, offsets, axis=1))
+    signatures = np.concatenate(signatures, axis=1).reshape(bands, rows, len(indices))
+
+    band_keys = np.zeros((bands, len(indices)), dtype=np.uint64)
+    for band, band_signatures in enumerate(signatures):
+        for row in band_signatures:
+            band_keys[band] = _mix(band_keys[band] ^ row)
+
+    return indices, band_keys
+
+
+def _block_pairs(citations: List[dict], blocks: Iterable[list],
+                 max_block_size: Union[int, None]) -> Set[Tuple[int, int]]:
+    pairs = set()
+    for indices in blocks:
+        if max_block_size is None or len(indices) <= max_block_size:
+            pairs.update(combinations(indices, 2))
+        else:
+            # similar citations of the block are neighbours in this order
+            indices = sorted(indices, key=lambda index: (_sort_key(citations[index]), index))
+            pairs.update((min(pair), max(pair)) for pair in zip(indices, indices[1:]))
+
+    return pairs
+
+
+def _sort_key(citation: dict) -> tuple:
+    return tuple(' '.join(citation[field].split()) if citation[field] else '' for field in ('title', 'author', 'year'))
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+    return values ^ (values >> np.uint64(31))
+
+
+def _shingle_hashes(titles: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes of byte shingles of all titles in one array, with offsets of the shingles of every title.
+    """
+
+    encoded = [' '.join(title.split()).encode('utf-8').ljust(SHINGLE_SIZE) for title in titles]
+    buffer = np.frombuffer(b'\n'.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    length = len(buffer) - SHINGLE_SIZE + 1
+    hashes = np.zeros(length, dtype=np.uint64)
+    valid = np.ones(length, dtype=bool)
+    for shift in range(SHINGLE_SIZE):
+        hashes = (hashes << np.uint64(8)) | buffer[shift:shift + length]
+        # shingles spanning the separator of two titles are dropped
+        valid &= buffer[shift:shift + length] != ord('\n')
+
+    sizes = np.array([len(title) - SHINGLE_SIZE + 1 for title in encoded])
+    offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+
+    return hashes[valid], offsets
+
+
+def _round_key(citation: dict, block: tuple) -> Union[tuple, None]:
+    key = tuple(_surname(citation) if field == 'surname' else citation[field] for field in block)
+    if None in key or PLACEHOLDERS.intersection(key):
+        return None
+    return key
+
+
+def _surname(citation: dict):
+    author = citation['author']
+    if not author or author in PLACEHOLDERS:
+        return None
+
+    # authors are joined with commas, the surname is the last word of the first author's name
+    first_author = author.split(',')[0].split()
+    return first_author[-1] if first_author else None
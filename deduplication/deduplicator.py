@@ -1,139 +1,178 @@
-import csv
-import json
-import os.path
-import subprocess
 from copy import deepcopy
 from itertools import chain
-from pprint import pprint
-from typing import Iterable, Dict
+from typing import Iterable, List, Set
 
-import pdfkit
-from json2html import json2html
+import numpy as np
 
+from deduplication import blocking, engine
+from deduplication.report import CaseReport, default_report
 from search_engine.databases.database_client import Document
 from utils.publications_graph import PublicationsGraph
 
 
 class Deduplicator:
-    def __init__(self):
-        initial_wd = os.getcwd()
+    def __init__(self, report: CaseReport = None):
+        """
+        :param report: report to record decisions on candidate pairs in, see report.default_report
+        :type report: CaseReport
+        """
 
-        while os.path.split(os.getcwd())[-1] != 'scientific-knowledge-distiller':
-            os.chdir(os.path.join(os.getcwd(), '..'))
-
-        self._root_path = os.getcwd()
-        self._path_to_deduplication_script = os.path.join(self._root_path, 'deduplication', 'deduplicate.r')
-        os.chdir(initial_wd)
+        self._report = report if report is not None else default_report()
 
     def deduplicate(self, remove_without_title=True, *iterables) -> Iterable[Document]:
         publications_dict = {pub.id: pub for pub in chain(*iterables) if
                              (remove_without_title and pub.title) or not remove_without_title}
         print(f'total found: {len(publications_dict)}')
 
+        yield from self._deduplicate(publications_dict, frozenset())
+
+    def deduplicate_new(self, new: Iterable[Document], known: Iterable[Document],
+                        remove_without_title=True) -> Iterable[Document]:
+        """
+        Deduplicate new publications against already deduplicated ones, e.g. results of a new run against stored
+        results of previous runs. Pairs of two known publications are not compared again and only clusters with
+        at least one new publication are returned. A known publication stays the base of its cluster, so its id
+        doesn't change; known publications merged into another one are among its versions.
+        :param new: publications to deduplicate
+        :type new: Iterable[Document]
+        :param known: deduplicated publications, new ones with the same ids are skipped
+        :type known: Iterable[Document]
+        :return: merged clusters with new publications
+        :rtype: Iterable[Document]
+        """
+
+        publications_dict = {pub.id: pub for pub in known}
+        known_ids = frozenset(publications_dict)
+        for pub in new:
+            if pub.id not in known_ids and ((remove_without_title and pub.title) or not remove_without_title):
+                publications_dict[pub.id] = pub
+        print(f'new found: {len(publications_dict) - len(known_ids)}')
+
+        yield from self._deduplicate(publications_dict, known_ids)
+
+    def _deduplicate(self, publications_dict: dict, known_ids: frozenset) -> Iterable[Document]:
         pubs_graph = PublicationsGraph()
         for pub_id in publications_dict:
             pubs_graph.add_vertex(pub_id)
 
-        self._dump_to_csv(publications_dict)
-        self.__run_deduplication_script()
-
-        path_to_deduplication_module = os.path.join(self._root_path, 'deduplication')
-        possible_duplicates_path = os.path.join(path_to_deduplication_module, '_manual_dedup.csv')
-        true_duplicates_path = os.path.join(path_to_deduplication_module, '_true_pairs.csv')
-
-        false_positive = 0
-        true_positive = 0
-        false_negative = 0
-        true_negative = 0
-
-        with open(true_duplicates_path, 'r', encoding='utf-8') as true_pairs_csv:
-            true_pairs_csv.readline()
-            reader = csv.DictReader(true_pairs_csv,
-                                    fieldnames=['id1', 'id2', 'author1', 'author2', 'author', 'title1', 'title2',
-                                                'title', 'abstract1', 'abstract2', 'abstract', 'year1', 'year2', 'year',
-                                                'number1', 'number2', 'number', 'pages1', 'pages2', 'pages', 'volume1',
-                                                'volume2', 'volume', 'journal1', 'journal2', 'journal', 'isbn', 'isbn1',
-                                                'isbn2', 'doi1', 'doi2', 'doi', 'record_id1', 'record_id2', 'label1',
-                                                'label2', 'source1', 'source2'
-                                                ]
-                                    )
-
-            rows = []
-            for row in reader:
-                rows.append(deepcopy(row))
-
-            true_pairs_len = len(rows)
-            for n, row in enumerate(rows):
-                id_1, id_2 = row['record_id1'].lower(), row['record_id2'].lower()
+        # duplicates with the same DOI or title are linked right away, only one of each group is matched fuzzily
+        pub_ids = self._link_exact_duplicates(publications_dict, pubs_graph, known_ids)
+        print(f'unique after exact matching: {len(pub_ids)}')
+        citations = engine.format_citations(publications_dict[pub_id].to_csv() for pub_id in pub_ids)
+
+        print('starting deduplication...')
+        candidate_pairs = blocking.candidate_pairs(citations)
+        if known_ids:
+            # known publications were compared with each other in previous runs
+            candidate_pairs = [(index_1, index_2) for index_1, index_2 in candidate_pairs
+                               if pub_ids[index_1] not in known_ids or pub_ids[index_2] not in known_ids]
+        pairs = engine.match_citations(citations, candidate_pairs)
+        true_pairs, maybe_pairs = engine.identify_true_matches(pairs, citations)
+        manual_pairs = engine.manual_dedup_pairs(pairs, true_pairs, maybe_pairs)
+        print(f'true pairs: {true_pairs.sum()}, manual dedup: {manual_pairs.sum()}')
+
+        for index in np.flatnonzero(true_pairs):
+            id_1, id_2 = pub_ids[pairs['id1'][index]], pub_ids[pairs['id2'][index]]
+            pubs_graph.add_edge(id_1, id_2)
+
+            if self._report is not None:
+                self._report.add(publications_dict[id_1], publications_dict[id_2], True)
+
+        for index in np.flatnonzero(manual_pairs):
+            row = engine.pair_row(pairs, citations, index)
+            id_1, id_2 = pub_ids[row['id1']], pub_ids[row['id2']]
+            are_duplicates = Deduplicator.are_duplicates(row)
+            if are_duplicates:
                 pubs_graph.add_edge(id_1, id_2)
 
-                # testing logic
-                res_json = {'cases': []}
-                res_json['cases'].append({'doc_1': publications_dict[id_1].to_dict(),
-                                          'doc_2': publications_dict[id_2].to_dict(),
-                                          'decision': 'DUPLICATES',
-                                          'id': n})
-                filename = os.path.join(path_to_deduplication_module, 'cases', f'cases-{n}.pdf')
-                config = pdfkit.configuration(wkhtmltopdf='/usr/local/bin/wkhtmltopdf')
-                pdfkit.from_string(json2html.convert(res_json), filename, configuration=config, css='style.css', options={'page-height': '297mm', 'page-width': '420mm' })
-                # testing logic
-
-        with open(possible_duplicates_path, 'r', encoding='utf-8') as manual_dedup_csv:
-            manual_dedup_csv.readline()
-            reader = csv.DictReader(manual_dedup_csv,
-                                    fieldnames=['id1', 'id2', 'author1', 'author2', 'author', 'title1', 'title2',
-                                                'title', 'abstract1', 'abstract2', 'abstract', 'year1', 'year2', 'year',
-                                                'number1', 'number2', 'number', 'pages1', 'pages2', 'pages', 'volume1',
-                                                'volume2', 'volume', 'journal1', 'journal2', 'journal', 'isbn', 'isbn1',
-                                                'isbn2', 'doi1', 'doi2', 'doi', 'record_id1', 'record_id2', 'label1',
-                                                'label2', 'source1', 'source2'
-                                                ]
-                                    )
-
-            rows = []
-            for row in reader:
-                rows.append(deepcopy(row))
-
-            for n, row in enumerate(rows):
-                id_1, id_2 = row['record_id1'].lower(), row['record_id2'].lower()
-                are_duplicates = Deduplicator.are_duplicates(row)
-                if are_duplicates:
-                    pubs_graph.add_edge(id_1, id_2)
-
-                # testing logic
-                res_json = {'cases': []}
-                res_json['cases'].append({'doc_1': publications_dict[id_1].to_dict(),
-                                          'doc_2': publications_dict[id_2].to_dict(),
-                                          'decision': 'DUPLICATES' if are_duplicates else 'NOT DUPLICATES',
-                                          'id': n + true_pairs_len})
-                filename = os.path.join(path_to_deduplication_module, 'cases', f'cases-{n + true_pairs_len}.pdf')
-                config = pdfkit.configuration(wkhtmltopdf='/usr/local/bin/wkhtmltopdf')
-                pdfkit.from_string(json2html.convert(res_json), filename, configuration=config, css='style.css', options={'page-height': '297mm', 'page-width': '420mm'})
-                # testing logic
+            if self._report is not None:
+                self._report.add(publications_dict[id_1], publications_dict[id_2], are_duplicates)
+
+        if self._report is not None:
+            self._report.write()
 
         connected_components = pubs_graph.connected_components()
 
         unique_pubs_ids = set()
         for component in connected_components:
-            base_pub = self._merge_publications(*[publications_dict[pub_id] for pub_id in component])
+            if known_ids and component <= known_ids:
+                continue
+
+            base_pub = self._merge_publications(*[publications_dict[pub_id] for pub_id in component],
+                                                known_ids=known_ids)
             component.discard(base_pub.id)
 
             publications_dict[base_pub.id] = deepcopy(base_pub)
             unique_pubs_ids.add(base_pub.id)
 
-        # unique_cites_path = os.path.join(path_to_deduplication_module, '_unique_citations.csv')
-        # os.remove(unique_cites_path)
-        # os.remove(possible_duplicates_path)
-        # os.remove(os.path.join(path_to_deduplication_module, '_dump_tmp.csv'))
-
         for pub_id in unique_pubs_ids:
             yield publications_dict[pub_id]
 
-    def _merge_publications(self, *pubs) -> Document:
+    def _link_exact_duplicates(self, publications_dict: dict, pubs_graph: PublicationsGraph,
+                               known_ids: frozenset = frozenset()) -> list:
+        """
+        Link publications with equal canonical DOIs or equal normalized titles and years.
+        :return: ids of the most complete publication of every group
+        :rtype: list
+        """
+
+        first_ids = {}
+        for pub_id, pub in publications_dict.items():
+            for key in self._exact_keys(pub):
+                if key in first_ids:
+                    pubs_graph.add_edge(first_ids[key], pub_id)
+                else:
+                    first_ids[key] = pub_id
+
+        pub_ids = []
+        for component in pubs_graph.connected_components():
+            if len(component) == 1:
+                pub_ids.extend(component)
+            else:
+                pub_ids.append(self._choose_best(*[publications_dict[pub_id] for pub_id in component],
+                                                 known_ids=known_ids).id)
+
+        return pub_ids
+
+    @staticmethod
+    def blocking_keys(publications: List[Document]) -> List[Set[str]]:
+        """
+        Keys under which publications are compared: their canonical DOIs, titles and years, and keys of
+        the blocking rounds, see blocking.blocking_keys. A publication is only compared with publications
+        sharing a key with it, except for neighbours in title order, so the keys of stored publications
+        are enough to find the ones a new publication should be deduplicated against.
+        :param publications: publications to get keys of
+        :type publications: List[Document]
+        :return: keys of every publication
+        :rtype: List[Set[str]]
+        """
+
+        citations = engine.format_citations(pub.to_csv() for pub in publications)
+        keys = blocking.blocking_keys(citations)
+        for pub, pub_keys in zip(publications, keys):
+            pub_keys.update('\x1f'.join(map(str, key)) for key in Deduplicator._exact_keys(pub))
+
+        return keys
+
+    @staticmethod
+    def _exact_keys(pub: Document) -> list:
+        keys = []
+
+        doi = engine.canonical_doi(pub.doi)
+        if doi:
+            keys.append(('doi', doi))
+
+        title = engine.normalized_title(pub.title)
+        if title and pub.year:
+            keys.append(('title', title, pub.year))
+
+        return keys
+
+    def _merge_publications(self, *pubs, known_ids: frozenset = frozenset()) -> Document:
         if len(pubs) == 1:
             return pubs[0]
 
-        base_pub = self._choose_best(*pubs)
+        base_pub = self._choose_best(*pubs, known_ids=known_ids)
 
         for p in pubs:
             if p.id != base_pub.id:
@@ -142,44 +181,34 @@ class Deduplicator:
         return base_pub
 
     @staticmethod
-    def _choose_best(*pubs) -> Document:
-        return min(*pubs, key=lambda x: x.empty_fields)
+    def _choose_best(*pubs, known_ids: frozenset = frozenset()) -> Document:
+        # known publications are preferred, so that stored ids survive merging with new ones
+        candidates = [pub for pub in pubs if pub.id in known_ids] or pubs
+        return min(candidates, key=lambda x: x.empty_fields)
 
     # NOTE: HERE we perform manual deduplication
     @staticmethod
-    def are_duplicates(row):
-        doi = -1
-        if row['doi'] != 'NA':
-            doi = float(row['doi'])
+    def are_duplicates(row) -> bool:
+        """
+        Decide on a pair left for manual deduplication.
+        :param row: pair as returned by engine.pair_row, similarities are NaN if a value is missing
+        :type row: dict
+        :return: whether the pair is a duplicate
+        :rtype: bool
+        """
+
+        doi = row['doi']
 
         if doi == 1 and row['doi1']:
             return True
-        if doi < 1 and doi != -1:
+        if doi < 1:
             return False
 
-        if float(row['author']) >= 0.5 and row['title'] == '1':
+        if row['author'] >= 0.5 and row['title'] == 1:
             return True
-        if row['title'] == '1' and row['abstract'] == '1' and row['year'] == '1':
+        if row['title'] == 1 and row['abstract'] == 1 and row['year'] == 1:
             return True
-        if float(row['author']) >= 0.5 and row['title'] == '1' and row['abstract'] == '1':
+        if row['author'] >= 0.5 and row['title'] == 1 and row['abstract'] == 1:
             return True
 
         return False
-
-    def _dump_to_csv(self, publications: Dict[int, Document]):
-        # TODO: add env variable for path to deduplication raw dump
-
-        path_to_dump = os.path.join(self._root_path, 'deduplication', '_dump_tmp.csv')
-
-        with open(path_to_dump, 'w', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=Document.csv_keys())
-            writer.writeheader()
-
-            for pub_id in publications:
-                writer.writerow(publications[pub_id].to_csv())
-
-    def __run_deduplication_script(self):
-        print('starting deduplication...')
-        p = subprocess.run(['Rscript', self._path_to_deduplication_script], capture_output=True, text=True,
-                           cwd=os.path.join(self._root_path, 'deduplication'))
-        p.check_returncode()
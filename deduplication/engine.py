@@ -0,0 +1,260 @@
+"""
+This module is used for finding duplicate citations without leaving the process.
+It follows the ASySD pipeline (see ASySD/R/dedup_refs.R): citations are formatted the same way, candidate pairs
+come from the blocking module, which covers the blocking rounds of ASySD, fields are compared column by column
+with the Jaro-Winkler similarity RecordLinkage uses and pairs are classified with the same identify_true_matches rules.
+Missing values are NaN, comparisons with NaN are false, which gives the same result as R's filter() for these rules.
+"""
+import re
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Jaro, Prefix
+
+from deduplication import blocking
+
+FIELDS = ('author', 'title', 'year', 'journal', 'abstract', 'doi', 'number', 'pages', 'volume', 'isbn')
+
+_PUNCTUATION = re.compile(r'[!"#$%&\'()*+,\-./:;<=>?@\[\\\]^_`{|}~]')
+_DOI_PREFIXES = re.compile(r'^(HTTPS?://(DX\.)?DOI\.ORG/|DOI:?\s*)')
+_ISBN_SUFFIXES = re.compile(r'\s\((PRINT|ELECTRONIC)\).*')
+_DOI_URL = re.compile(r'^(https?://(dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+
+
+def canonical_doi(doi: str) -> Union[str, None]:
+    """
+    DOI without the resolver URL or doi: prefix, with decoded parentheses and in lower case, as DOIs are
+    case-insensitive.
+    """
+
+    if not doi:
+        return None
+
+    doi = _DOI_URL.sub('', doi.strip()).replace('%28', '(').replace('%29', ')').lower()
+    return doi or None
+
+
+def normalized_title(title: str) -> Union[str, None]:
+    """
+    Title in lower case without punctuation and repeated whitespace.
+    """
+
+    if not title:
+        return None
+
+    return ' '.join(_PUNCTUATION.sub('', title).lower().split()) or None
+
+
+def format_citations(citations: Iterable[dict]) -> List[dict]:
+    """
+    Normalize citations as format_citations of ASySD does.
+    :param citations: dicts with Document.csv_keys()
+    :type citations: Iterable[dict]
+    :return: formatted citations, missing values are None
+    :rtype: List[dict]
+    """
+
+    formatted = []
+    for citation in citations:
+        citation = dict(citation)
+        for field in FIELDS:
+            citation[field] = str(citation[field]).strip().upper() if citation.get(field) is not None else ''
+
+        if citation['author'] in ('', 'NA', 'ANONYMOUS'):
+            citation['author'] = 'UNKNOWN'
+
+        citation['doi'] = _DOI_PREFIXES.sub('', citation['doi'].replace('%28', '(').replace('%29', ')'))
+        for field in ('title', 'year', 'abstract'):
+            citation[field] = _PUNCTUATION.sub('', citation[field])
+        citation['isbn'] = _ISBN_SUFFIXES.sub('', citation['isbn'])
+
+        for field in FIELDS:
+            if citation[field] in ('', 'NA'):
+                citation[field] = None
+
+        formatted.append(citation)
+
+    return formatted
+
+
+def jaro_winkler(string_1: str, string_2: str, prefix_scale: float = 0.1) -> float:
+    """
+    Jaro-Winkler similarity of two strings, see jaro_winkler_pairs.
+    """
+
+    return float(jaro_winkler_pairs([string_1], [string_2], prefix_scale)[0])
+
+
+def jaro_winkler_pairs(strings_1: Sequence[str], strings_2: Sequence[str], prefix_scale: float = 0.1) -> np.ndarray:
+    """
+    Jaro-Winkler similarities of strings at the same positions, computed by rapidfuzz in C.
+    Weights are those RecordLinkage uses: equal weights for both strings and transpositions, which are half
+    the matched characters out of order, rounded down, and the common prefix of up to 4 characters always counts,
+    not only when the Jaro similarity is above 0.7.
+    :param strings_1: first strings of pairs
+    :type strings_1: Sequence[str]
+    :param strings_2: second strings of pairs, as many as the first ones
+    :type strings_2: Sequence[str]
+    :param prefix_scale: weight of every character of the common prefix
+    :type prefix_scale: float
+    :return: similarities between 0 and 1
+    :rtype: np.ndarray
+    """
+
+    if not len(strings_1):
+        return np.empty(0)
+
+    jaro = process.cpdist(strings_1, strings_2, scorer=Jaro.similarity, dtype=np.float64, workers=-1)
+    prefix = np.minimum(process.cpdist(strings_1, strings_2, scorer=Prefix.similarity, workers=-1), 4)
+
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def match_citations(citations: List[dict], pairs: List[Tuple[int, int]] = None) -> Dict[str, np.ndarray]:
+    """
+    Compare every field of candidate pairs.
+    :param citations: formatted citations
+    :type citations: List[dict]
+    :param pairs: pairs of indices to compare, blocking.candidate_pairs are used if not given
+    :type pairs: List[Tuple[int, int]]
+    :return: columns 'id1', 'id2' with citation indices and a similarity column for every field, NaN if missing
+    :rtype: Dict[str, np.ndarray]
+    """
+
+    if pairs is None:
+        pairs = blocking.candidate_pairs(citations)
+
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    id_1, id_2 = pairs[:, 0], pairs[:, 1]
+    columns = {'id1': id_1, 'id2': id_2}
+
+    # both values missing counts as agreement for pages, volume and number, and as disagreement for the rest
+    both_missing_values = {'abstract': 0, 'pages': 1, 'volume': 1, 'number': 1, 'doi': 0, 'isbn': 0}
+
+    for field in FIELDS:
+        values = np.array([citation[field] for citation in citations], dtype=object)
+        missing = np.array([value is None for value in values], dtype=bool)
+        compared = ~missing[id_1] & ~missing[id_2]
+
+        column = np.full(len(pairs), np.nan)
+        column[compared] = jaro_winkler_pairs(values[id_1[compared]].tolist(), values[id_2[compared]].tolist())
+        if field in both_missing_values:
+            column[missing[id_1] & missing[id_2]] = both_missing_values[field]
+
+        columns[field] = column
+
+    return columns
+
+
+def identify_true_matches(pairs: Dict[str, np.ndarray], citations: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Classify compared pairs.
+    :return: masks of true pairs and of pairs to check manually because of mismatching DOIs or years
+    :rtype: Tuple[np.ndarray, np.ndarray]
+    """
+
+    author, title, abstract = pairs['author'], pairs['title'], pairs['abstract']
+    journal, isbn, doi = pairs['journal'], pairs['isbn'], pairs['doi']
+    pages, volume, number = pairs['pages'], pairs['volume'], pairs['number']
+
+    with np.errstate(invalid='ignore'):
+        true_pairs = (
+            (pages > 0.8) & (volume > 0.8) & (title > 0.90) & (abstract > 0.90) & (author > 0.50) & (isbn > 0.99) |
+            (pages > 0.8) & (volume > 0.8) & (title > 0.90) & (abstract > 0.90) & (author > 0.50) & (journal > 0.6) |
+            (pages > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.90) & (author > 0.50) & (journal > 0.6) |
+            (volume > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.90) & (author > 0.50) & (journal > 0.6) |
+
+            (volume > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.90) & (author > 0.8) |
+            (volume > 0.8) & (pages > 0.8) & (title > 0.90) & (abstract > 0.9) & (author > 0.8) |
+            (pages > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.9) & (author > 0.8) |
+
+            (doi > 0.95) & (author > 0.75) & (title > 0.9) |
+
+            (title > 0.80) & (abstract > 0.90) & (volume > 0.85) & (journal > 0.65) & (author > 0.9) |
+            (title > 0.90) & (abstract > 0.80) & (volume > 0.85) & (journal > 0.65) & (author > 0.9) |
+
+            (pages > 0.8) & (volume > 0.8) & (title > 0.90) & (abstract > 0.8) & (author > 0.9) & (journal > 0.75) |
+            (pages > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.80) & (author > 0.9) & (journal > 0.75) |
+            (volume > 0.8) & (number > 0.8) & (title > 0.90) & (abstract > 0.8) & (author > 0.9) & (journal > 0.75) |
+
+            (title > 0.9) & (author > 0.9) & (abstract > 0.9) & (journal > 0.7) |
+            (title > 0.9) & (author > 0.9) & (abstract > 0.9) & (isbn > 0.99) |
+
+            (pages > 0.9) & (number > 0.9) & (title > 0.90) & (author > 0.80) & (journal > 0.6) |
+            (number > 0.9) & (volume > 0.9) & (title > 0.90) & (author > 0.90) & (journal > 0.6) |
+            (pages > 0.9) & (volume > 0.9) & (title > 0.90) & (author > 0.80) & (journal > 0.6) |
+            (pages > 0.9) & (number > 0.9) & (title > 0.90) & (author > 0.80) & (isbn > 0.99) |
+
+            (pages > 0.8) & (volume > 0.8) & (title > 0.95) & (author > 0.80) & (journal > 0.9) |
+            (number > 0.8) & (volume > 0.8) & (title > 0.95) & (author > 0.80) & (journal > 0.9) |
+            (number > 0.8) & (pages > 0.8) & (title > 0.95) & (author > 0.80) & (journal > 0.9) |
+            (pages > 0.8) & (volume > 0.8) & (title > 0.95) & (author > 0.80) & (isbn > 0.99)
+        )
+
+        # R reads `journal|isbn > 0.9` as `journal | (isbn > 0.9)`, i.e. any non-zero journal similarity
+        good_match = (title > 0.9) & (abstract > 0.9) & ((journal != 0) & ~np.isnan(journal) | (isbn > 0.9))
+        # the same condition when missing values are taken as matching: if it's false, it's false for sure
+        maybe_good_match = (
+            ((title > 0.9) | np.isnan(title)) & ((abstract > 0.9) | np.isnan(abstract)) &
+            ((journal != 0) | (isbn > 0.9) | np.isnan(isbn))
+        )
+
+        doi_mismatch = ~np.isnan(doi) & (doi != 0) & ~(doi > 0.99)
+        true_pairs_mismatch_doi = true_pairs & doi_mismatch & ~maybe_good_match
+        true_pairs &= np.isnan(doi) | (doi > 0.99) | (doi == 0) | good_match
+
+    # pairs which years differ by more than one are left for manual deduplication
+    years = np.array([_to_number(citation['year']) for citation in citations], dtype=float)
+    with np.errstate(invalid='ignore'):
+        year_mismatch_major = true_pairs & (np.abs(years[pairs['id1']] - years[pairs['id2']]) > 1)
+    true_pairs &= ~year_mismatch_major
+
+    return true_pairs, true_pairs_mismatch_doi | year_mismatch_major
+
+
+def manual_dedup_pairs(pairs: Dict[str, np.ndarray], true_pairs: np.ndarray, maybe_pairs: np.ndarray) -> np.ndarray:
+    """
+    Pairs left for manual deduplication as in get_manual_dedup_list of ASySD: pairs with suspicious DOIs
+    or years and pairs which are similar enough, but not true pairs.
+    """
+
+    author, title, abstract = pairs['author'], pairs['title'], pairs['abstract']
+
+    with np.errstate(invalid='ignore'):
+        maybe_also_pairs = (
+            (pairs['doi'] > 0.99) |
+            (title > 0.85) & (author > 0.75) |
+            (title > 0.80) & (abstract > 0.80) |
+            (title > 0.80) & (pairs['isbn'] > 0.99) |
+            (title > 0.80) & (pairs['journal'] > 0.80)
+        )
+
+    return (maybe_pairs | maybe_also_pairs) & ~true_pairs
+
+
+def pair_row(pairs: Dict[str, np.ndarray], citations: List[dict], n: int) -> dict:
+    """
+    Values and similarities of the n-th pair as one dict, like a row of the pairs data frame.
+    """
+
+    id_1, id_2 = int(pairs['id1'][n]), int(pairs['id2'][n])
+    row = {'id1': id_1, 'id2': id_2}
+
+    for field in FIELDS:
+        row[f'{field}1'] = citations[id_1][field]
+        row[f'{field}2'] = citations[id_2][field]
+        row[field] = float(pairs[field][n])
+
+    for field in ('record_id', 'label', 'source'):
+        row[f'{field}1'] = citations[id_1][field]
+        row[f'{field}2'] = citations[id_2][field]
+
+    return row
+
+
+def _to_number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
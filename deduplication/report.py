@@ -0,0 +1,110 @@
+"""
+This module is used for auditing deduplication decisions.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Union
+
+from search_engine.databases.database_client import Document
+
+WKHTMLTOPDF_PATH = '/usr/local/bin/wkhtmltopdf'
+CSS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'style.css')
+PDF_OPTIONS = {'page-height': '297mm', 'page-width': '420mm'}
+
+
+class CaseReport:
+    """
+    Collects pairs the deduplicator decided on and writes them once per run: every case as a line of
+    cases.jsonl and all of them in one cases.html. If PDFs are requested, cases are rendered by wkhtmltopdf
+    in batches on a thread pool, so the deduplication doesn't wait for it.
+    """
+
+    def __init__(self, path: str, pdf: bool = False, cases_per_pdf: int = 100, workers: int = 2,
+                 wkhtmltopdf: str = WKHTMLTOPDF_PATH):
+        self._path = path
+        self._pdf = pdf
+        self._cases_per_pdf = cases_per_pdf
+        self._workers = workers
+        self._wkhtmltopdf = wkhtmltopdf
+
+        self._cases = []
+        self._futures = []
+
+    @property
+    def cases(self) -> List[dict]:
+        return self._cases
+
+    def add(self, doc_1: Document, doc_2: Document, duplicates: bool):
+        self._cases.append({'doc_1': doc_1.to_dict(),
+                            'doc_2': doc_2.to_dict(),
+                            'decision': 'DUPLICATES' if duplicates else 'NOT DUPLICATES',
+                            'id': len(self._cases)})
+
+    def write(self) -> str:
+        """
+        Write collected cases to a new directory under the report path and start rendering PDFs if requested.
+        :return: directory with the report
+        :rtype: str
+        """
+
+        from json2html import json2html
+
+        run_path = os.path.join(self._path, datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        os.makedirs(run_path, exist_ok=True)
+
+        with open(os.path.join(run_path, 'cases.jsonl'), 'w', encoding='utf-8') as file:
+            for case in self._cases:
+                file.write(json.dumps(case, ensure_ascii=False, default=str) + '\n')
+
+        with open(os.path.join(run_path, 'cases.html'), 'w', encoding='utf-8') as file:
+            file.write(json2html.convert({'cases': self._cases}))
+
+        if self._pdf and self._cases:
+            executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='case-report')
+            for start in range(0, len(self._cases), self._cases_per_pdf):
+                cases = self._cases[start:start + self._cases_per_pdf]
+                filename = os.path.join(run_path, f'cases-{start}-{start + len(cases) - 1}.pdf')
+                self._futures.append(executor.submit(self._render_pdf, cases, filename))
+            # the executor finishes submitted batches in the background
+            executor.shutdown(wait=False)
+
+        logging.info(f'Deduplication report with {len(self._cases)} cases written to {run_path}.')
+        self._cases = []
+
+        return run_path
+
+    def wait(self):
+        """
+        Block until all PDFs are rendered.
+        """
+
+        for future in self._futures:
+            future.result()
+        self._futures = []
+
+    def _render_pdf(self, cases: List[dict], filename: str):
+        import pdfkit
+        from json2html import json2html
+
+        try:
+            config = pdfkit.configuration(wkhtmltopdf=self._wkhtmltopdf)
+            pdfkit.from_string(json2html.convert({'cases': cases}), filename, configuration=config,
+                               css=CSS_PATH if os.path.exists(CSS_PATH) else None, options=PDF_OPTIONS)
+        except Exception as error:
+            logging.error(f"Can't render {filename}: {error!r}")
+
+
+def default_report() -> Union[CaseReport, None]:
+    """
+    Report used by Deduplicator unless another one is passed. Reporting is off unless DEDUPLICATION_REPORT_PATH
+    is set, DEDUPLICATION_REPORT_PDF=1 additionally renders PDFs.
+    """
+
+    path = os.getenv('DEDUPLICATION_REPORT_PATH')
+    if not path:
+        return None
+
+    return CaseReport(path, pdf=os.getenv('DEDUPLICATION_REPORT_PDF') == '1')
@@ -0,0 +1,5 @@
+from ranking.backends import EmbeddingBackend, HashingBackend, SentenceTransformerBackend, default_backend
+from ranking.embedding_cache import EmbeddingCache, default_embedding_cache
+from ranking.ranker import Ranker
+from ranking.ann_index import IVFIndex
+from ranking.relevance_filter import RelevanceFilter
@@ -0,0 +1,257 @@
+"""
+This module is used for finding similar documents by their embeddings without comparing them with all documents.
+"""
+import json
+import os
+import threading
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+from ranking.ranker import Ranker
+from search_engine.databases.database_client import Document
+
+# vectors are searched exhaustively until there are enough of them to train the clustering
+MIN_TRAINING_SIZE = 1000
+PROBES = 8
+KMEANS_ITERATIONS = 10
+# vectors compared with centroids at once, bounds memory of the assignment step
+CHUNK_SIZE = 10000
+
+
+class IVFIndex:
+    """
+    Inverted file index over L2-normalized embeddings, e.g. from Ranker.embed. Vectors are clustered with
+    spherical k-means and a query is compared only with vectors of the clusters whose centroids are closest
+    to it. The index is a directory: vectors are appended to a raw float16 or float32 file which is
+    memory-mapped, so the index doesn't have to fit into memory, and new vectors are assigned to the
+    existing clusters. If many vectors were added after training, retrain to rebalance the clusters.
+    """
+
+    def __init__(self, path: str, dimension: int = None, dtype: str = 'float16', probes: int = PROBES):
+        """
+        :param path: directory of the index, created if needed
+        :type path: str
+        :param dimension: size of embeddings, read from the index if it exists
+        :type dimension: int
+        :param dtype: 'float16' or 'float32', type vectors are stored in
+        :type dtype: str
+        :param probes: number of clusters searched by default, more probes give better recall and slower queries
+        :type probes: int
+        """
+
+        self._path = path
+        self._probes = probes
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, 'index.json')
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding='utf-8') as file:
+                meta = json.load(file)
+            self._dimension, self._dtype = meta['dimension'], np.dtype(meta['dtype'])
+        else:
+            assert dimension, 'Dimension of a new index must be given'
+            self._dimension, self._dtype = dimension, np.dtype(dtype)
+            with open(meta_path, 'w', encoding='utf-8') as file:
+                json.dump({'dimension': self._dimension, 'dtype': self._dtype.name}, file)
+
+        self._ids = []
+        if os.path.exists(self._file('ids.txt')):
+            with open(self._file('ids.txt'), encoding='utf-8') as file:
+                self._ids = file.read().splitlines()
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        self._vectors = None
+        self._map_vectors()
+
+        self._centroids = None
+        self._lists = []
+        if os.path.exists(self._file('centroids.npy')):
+            self._centroids = np.load(self._file('centroids.npy'))
+            assignments = np.fromfile(self._file('assignments.i32'), dtype=np.int32)
+            self._lists = _group(assignments, len(self._centroids))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """
+        Add embeddings of documents, ids which are already in the index are skipped.
+        :param ids: stable ids of documents, see Document.id
+        :type ids: List[str]
+        :param embeddings: matrix with an L2-normalized embedding of every document in a row
+        :type embeddings: np.ndarray
+        """
+
+        with self._lock:
+            new = []
+            seen = set()
+            for index, doc_id in enumerate(ids):
+                if doc_id not in self._rows and doc_id not in seen:
+                    seen.add(doc_id)
+                    new.append(index)
+            if not new:
+                return
+
+            embeddings = np.asarray(embeddings, dtype=np.float32)[new]
+            ids = [ids[index] for index in new]
+
+            first_row = len(self._ids)
+            with open(self._file('vectors.bin'), 'ab') as file:
+                file.write(embeddings.astype(self._dtype).tobytes())
+            with open(self._file('ids.txt'), 'a', encoding='utf-8') as file:
+                file.write(''.join(f'{doc_id}\n' for doc_id in ids))
+
+            self._ids.extend(ids)
+            self._rows.update((doc_id, first_row + position) for position, doc_id in enumerate(ids))
+            self._map_vectors()
+
+            if self._centroids is not None:
+                assignments = self._assign(embeddings)
+                with open(self._file('assignments.i32'), 'ab') as file:
+                    file.write(assignments.astype(np.int32).tobytes())
+
+                added = _group(assignments, len(self._centroids))
+                self._lists = [np.concatenate((old, new_rows + first_row)) if len(new_rows) else old
+                               for old, new_rows in zip(self._lists, added)]
+            elif len(self._ids) >= MIN_TRAINING_SIZE:
+                self._train()
+
+    def add_documents(self, documents: Iterable[Document], ranker: Ranker):
+        """
+        Embed documents with the ranker and add those which are not in the index yet.
+        """
+
+        documents = [document for document in documents if document.title and document.id not in self._rows]
+        if documents:
+            self.add([document.id for document in documents], ranker.embed(documents))
+
+    def retrain(self, lists: int = None):
+        """
+        Cluster all vectors of the index again.
+        :param lists: number of clusters, about 4 * sqrt(number of vectors) by default
+        :type lists: int
+        """
+
+        with self._lock:
+            self._train(lists)
+
+    def search(self, embedding: np.ndarray, k: int = 10, probes: int = None,
+               exclude: str = None) -> List[Tuple[str, float]]:
+        """
+        :param embedding: L2-normalized query embedding
+        :type embedding: np.ndarray
+        :param k: number of results
+        :type k: int
+        :param probes: number of clusters to search, the default of the index if not set
+        :type probes: int
+        :param exclude: id of a document to leave out of results
+        :type exclude: str
+        :return: ids of the most similar documents with their cosine similarity, most similar first
+        :rtype: List[Tuple[str, float]]
+        """
+
+        embedding = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            if not self._ids:
+                return []
+
+            if self._centroids is None:
+                rows = np.arange(len(self._ids))
+            else:
+                probes = min(probes or self._probes, len(self._centroids))
+                closest = np.argpartition(-(self._centroids @ embedding), probes - 1)[:probes]
+                rows = np.concatenate([self._lists[cluster] for cluster in closest])
+
+            return self._top(rows, embedding, k, exclude)
+
+    def exact_search(self, embedding: np.ndarray, k: int = 10, exclude: str = None) -> List[Tuple[str, float]]:
+        """
+        Compare the query with every vector of the index, e.g. to measure recall of search.
+        """
+
+        with self._lock:
+            return self._top(np.arange(len(self._ids)), np.asarray(embedding, dtype=np.float32), k, exclude)
+
+    def similar(self, doc_id: str, k: int = 10, probes: int = None) -> List[Tuple[str, float]]:
+        """
+        :return: documents most similar to an indexed one, without the document itself
+        :rtype: List[Tuple[str, float]]
+        """
+
+        return self.search(self.embedding(doc_id), k, probes, exclude=doc_id)
+
+    def embedding(self, doc_id: str) -> np.ndarray:
+        return np.asarray(self._vectors[self._rows[doc_id]], dtype=np.float32)
+
+    def _top(self, rows: np.ndarray, embedding: np.ndarray, k: int,
+             exclude: Union[str, None]) -> List[Tuple[str, float]]:
+        if exclude is not None and exclude in self._rows:
+            rows = rows[rows != self._rows[exclude]]
+        if not len(rows):
+            return []
+
+        rows = np.sort(rows)
+        scores = np.asarray(self._vectors[rows], dtype=np.float32) @ embedding
+        if len(rows) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[best], scores[best]
+
+        order = np.argsort(-scores, kind='stable')
+        return [(self._ids[rows[index]], float(scores[index])) for index in order]
+
+    def _train(self, lists: int = None):
+        count = len(self._ids)
+        lists = min(count, lists or max(1, int(4 * np.sqrt(count))))
+
+        generator = np.random.default_rng(0)
+        # centroids are trained on a sample, then all vectors are assigned to them
+        sample = np.sort(generator.choice(count, size=min(count, lists * 64), replace=False))
+        vectors = np.asarray(self._vectors[sample], dtype=np.float32)
+        centroids = vectors[generator.choice(len(vectors), size=lists, replace=False)]
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=lists)
+            filled = np.flatnonzero(counts)
+            # sums of vectors of every non-empty cluster, an empty cluster keeps its centroid
+            sums = centroids.copy()
+            sums[filled] = np.add.reduceat(vectors[order], (np.cumsum(counts) - counts)[filled])
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), np.finfo(np.float32).tiny)
+
+        self._centroids = centroids.astype(np.float32)
+        assignments = np.concatenate([
+            self._assign(np.asarray(self._vectors[start:start + CHUNK_SIZE], dtype=np.float32))
+            for start in range(0, count, CHUNK_SIZE)
+        ])
+        self._lists = _group(assignments, lists)
+
+        assignments.astype(np.int32).tofile(self._file('assignments.i32'))
+        np.save(self._file('centroids.npy'), self._centroids)
+
+    def _assign(self, embeddings: np.ndarray) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(embeddings[start:start + CHUNK_SIZE] @ self._centroids.T, axis=1)
+            for start in range(0, len(embeddings), CHUNK_SIZE)
+        ]) if len(embeddings) else np.zeros(0, dtype=np.int64)
+
+    def _map_vectors(self):
+        if self._ids:
+            self._vectors = np.memmap(self._file('vectors.bin'), dtype=self._dtype, mode='r',
+                                      shape=(len(self._ids), self._dimension))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self._path, name)
+
+
+def _group(assignments: np.ndarray, lists: int) -> List[np.ndarray]:
+    # rows of every cluster, in increasing order
+    order = np.argsort(assignments, kind='stable')
+    bounds = np.cumsum(np.bincount(assignments, minlength=lists))
+    return np.split(order, bounds[:-1])
@@ -0,0 +1,122 @@
+"""
+This module is used for turning texts into embeddings.
+"""
+import importlib.util
+import os
+import re
+import threading
+import zlib
+from typing import List
+
+import numpy as np
+
+HASHING_DIMENSION = 2 ** 10
+SENTENCE_TRANSFORMER_MODEL = 'all-MiniLM-L6-v2'
+
+_TOKEN = re.compile(r'\w+')
+
+
+class EmbeddingBackend:
+    """
+    Base class for models: a backend encodes a batch of texts into L2-normalized float32 vectors,
+    so that the dot product of two embeddings is their cosine similarity.
+    """
+
+    @property
+    def name(self) -> str:
+        """
+        :return: name of the model, embeddings of different backends are cached separately
+        :rtype: str
+        """
+
+        raise NotImplementedError
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        :param texts: texts to encode
+        :type texts: List[str]
+        :return: matrix with an embedding of every text in a row
+        :rtype: np.ndarray
+        """
+
+        raise NotImplementedError
+
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Hashing vectorizer over words and word bigrams, needs no model and works offline. Words are hashed with
+    CRC32, so embeddings are the same in every process and can be cached.
+    """
+
+    def __init__(self, dimension: int = HASHING_DIMENSION):
+        self._dimension = dimension
+
+    @property
+    def name(self) -> str:
+        return f'hashing-{self._dimension}'
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        columns = []
+        for row, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower())
+            features = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+            columns.extend(zlib.crc32(feature.encode('utf-8')) for feature in features)
+            rows.extend([row] * len(features))
+
+        hashes = np.array(columns, dtype=np.uint32)
+        # the highest bit decides the sign, so that collisions cancel out instead of adding up
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+
+        embeddings = np.zeros((len(texts), self._dimension), dtype=np.float32)
+        np.add.at(embeddings, (np.array(rows, dtype=np.int64), hashes % self._dimension), signs)
+
+        return _normalized(embeddings)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """
+    Model of the sentence-transformers package, loaded once on first use, also when several threads encode
+    at the same time. Texts are encoded in batches on the CPU unless the device says otherwise.
+    """
+
+    def __init__(self, model_name: str = SENTENCE_TRANSFORMER_MODEL, batch_size: int = 64, device: str = 'cpu'):
+        self._model_name = model_name
+        self._batch_size = batch_size
+        self._device = device
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._model_name
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self._model_name, device=self._device)
+
+        embeddings = self._model.encode(texts, batch_size=self._batch_size, convert_to_numpy=True,
+                                        normalize_embeddings=True, show_progress_bar=False)
+        return embeddings.astype(np.float32, copy=False)
+
+
+def _normalized(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def default_backend() -> EmbeddingBackend:
+    """
+    Backend used by Ranker unless another one is passed: the sentence-transformers model named by
+    RANKING_MODEL (all-MiniLM-L6-v2 by default) if the package is installed, HashingBackend otherwise
+    or if RANKING_MODEL is 'hashing'.
+    """
+
+    model_name = os.getenv('RANKING_MODEL', SENTENCE_TRANSFORMER_MODEL)
+    if model_name == 'hashing' or importlib.util.find_spec('sentence_transformers') is None:
+        return HashingBackend()
+
+    return SentenceTransformerBackend(model_name)
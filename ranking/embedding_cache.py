@@ -0,0 +1,85 @@
+"""
+This module is used for caching embeddings of documents on disk.
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Union
+
+import numpy as np
+
+# SQLite limits the number of parameters of a query
+_CHUNK_SIZE = 500
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed cache of float32 embeddings keyed by backend name and stable document id, see Document.id.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings (backend TEXT, id TEXT, vector BLOB, PRIMARY KEY (backend, id))'
+        )
+        self._connection.commit()
+
+    def get_many(self, backend: str, ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        :return: cached embeddings by document id, ids without an embedding are missing
+        :rtype: Dict[str, np.ndarray]
+        """
+
+        embeddings = {}
+        with self._lock:
+            for start in range(0, len(ids), _CHUNK_SIZE):
+                chunk = ids[start:start + _CHUNK_SIZE]
+                rows = self._connection.execute(
+                    f'SELECT id, vector FROM embeddings WHERE backend = ? AND id IN ({",".join("?" * len(chunk))})',
+                    (backend, *chunk)
+                )
+                for doc_id, vector in rows:
+                    embeddings[doc_id] = np.frombuffer(vector, dtype=np.float32)
+
+        return embeddings
+
+    def set_many(self, backend: str, ids: List[str], embeddings: np.ndarray):
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)',
+                ((backend, doc_id, embedding.astype(np.float32).tobytes())
+                 for doc_id, embedding in zip(ids, embeddings))
+            )
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM embeddings')
+            self._connection.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_embedding_cache() -> Union[EmbeddingCache, None]:
+    """
+    Cache used by Ranker unless another one is passed. Caching is off unless EMBEDDING_CACHE_PATH is set.
+    """
+
+    global _default_cache
+
+    path = os.getenv('EMBEDDING_CACHE_PATH')
+    if not path:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache(path)
+
+    return _default_cache
@@ -0,0 +1,99 @@
+"""
+This module is used for ranking search results by similarity to the query.
+"""
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from ranking.backends import EmbeddingBackend, default_backend
+from ranking.embedding_cache import EmbeddingCache, default_embedding_cache
+from search_engine.databases.database_client import Document
+
+BATCH_SIZE = 256
+
+
+class Ranker:
+    """
+    Ranks documents, e.g. Search.results(), by cosine similarity of their embeddings to the embedding
+    of the query. Documents are encoded in batches, only those without a cached embedding, and all
+    similarities are one matrix product.
+    """
+
+    def __init__(self, backend: EmbeddingBackend = None, cache: EmbeddingCache = None, batch_size: int = BATCH_SIZE,
+                 fields: tuple = ('title',)):
+        """
+        :param backend: model to encode texts with, see backends.default_backend
+        :type backend: EmbeddingBackend
+        :param cache: cache of document embeddings, see embedding_cache.default_embedding_cache
+        :type cache: EmbeddingCache
+        :param batch_size: number of documents passed to the backend at once
+        :type batch_size: int
+        :param fields: fields of documents to encode, joined with a full stop, e.g. ('title', 'abstract')
+        :type fields: tuple
+        """
+
+        self._backend = backend if backend is not None else default_backend()
+        self._cache = cache if cache is not None else default_embedding_cache()
+        self._batch_size = batch_size
+        self._fields = fields
+        # embeddings of other fields or of another model are cached separately
+        self._cache_key = f'{self._backend.name}:{",".join(fields)}'
+
+    @property
+    def backend(self) -> EmbeddingBackend:
+        return self._backend
+
+    def rank(self, query: str, documents: Iterable[Document], threshold: float = None,
+             limit: int = None) -> List[Tuple[Document, float]]:
+        """
+        :param query: text to compare documents with
+        :type query: str
+        :param documents: documents to rank, documents without a title are skipped
+        :type documents: Iterable[Document]
+        :param threshold: if set, only documents with a greater similarity are returned
+        :type threshold: float
+        :param limit: if set, at most this many documents are returned
+        :type limit: int
+        :return: documents with their similarity to the query, most similar first
+        :rtype: List[Tuple[Document, float]]
+        """
+
+        documents = [document for document in documents if document.title]
+        if not documents:
+            return []
+
+        query_embedding = self._backend.encode([query])[0]
+        scores = self.embed(documents) @ query_embedding
+
+        order = np.argsort(-scores, kind='stable')
+        if threshold is not None:
+            order = order[scores[order] > threshold]
+        if limit is not None:
+            order = order[:limit]
+
+        return [(documents[index], float(scores[index])) for index in order]
+
+    def embed(self, documents: List[Document]) -> np.ndarray:
+        """
+        :return: matrix with an embedding of every document in a row, in the order of documents
+        :rtype: np.ndarray
+        """
+
+        ids = [document.id for document in documents]
+        cached = self._cache.get_many(self._cache_key, ids) if self._cache is not None else {}
+
+        missing = [index for index, doc_id in enumerate(ids) if doc_id not in cached]
+        encoded = {}
+        for start in range(0, len(missing), self._batch_size):
+            batch = missing[start:start + self._batch_size]
+            embeddings = self._backend.encode([self._text(documents[index]) for index in batch])
+            batch_ids = [ids[index] for index in batch]
+
+            if self._cache is not None:
+                self._cache.set_many(self._cache_key, batch_ids, embeddings)
+            encoded.update(zip(batch_ids, embeddings))
+
+        return np.stack([cached[doc_id] if doc_id in cached else encoded[doc_id] for doc_id in ids])
+
+    def _text(self, document: Document) -> str:
+        return '. '.join(value for value in (getattr(document, field) for field in self._fields) if value)
@@ -0,0 +1,53 @@
+"""
+This module is used for stopping a source early once its result pages stop matching the query.
+"""
+from typing import List
+
+import numpy as np
+
+from ranking.backends import EmbeddingBackend, default_backend
+
+
+class RelevanceFilter:
+    """
+    Scores result pages while they are harvested: the relevance of a page is the mean cosine similarity of its
+    titles to the query, a document without a title counts as irrelevant. Sources return results best first,
+    so a source whose page falls below the threshold is stopped and its unused limit goes to other sources.
+    Safe to share between threads, the query is encoded once.
+    """
+
+    def __init__(self, query: str, threshold: float, backend: EmbeddingBackend = None):
+        """
+        :param query: text to compare titles with, usually the query of the search
+        :type query: str
+        :param threshold: pages with a lower relevance stop the source
+        :type threshold: float
+        :param backend: model to encode texts with, see backends.default_backend
+        :type backend: EmbeddingBackend
+        """
+
+        self._backend = backend if backend is not None else default_backend()
+        self._threshold = threshold
+        self._query_embedding = self._backend.encode([query])[0]
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    def score(self, titles: List[str]) -> float:
+        """
+        :param titles: titles of documents of one page
+        :type titles: List[str]
+        :return: relevance of the page
+        :rtype: float
+        """
+
+        present = [title for title in titles if title]
+        if not present:
+            return 0.0
+
+        similarities = self._backend.encode(present) @ self._query_embedding
+        return float(np.sum(similarities)) / len(titles)
+
+    def is_relevant(self, titles: List[str]) -> bool:
+        return not titles or self.score(titles) >= self._threshold
@@ -1 +1,20 @@
-from search_engine.search import Search
+# searches are imported on first access: deduplication and storage import document classes from this package,
+# and importing them must not import the searches, which import deduplication and storage in turn
+import importlib
+
+_SEARCH_MODULES = {
+    'Search': 'search',
+    'AsyncSearch': 'async_search',
+    'BatchSearch': 'batch_search',
+}
+
+__all__ = list(_SEARCH_MODULES)
+
+
+def __getattr__(name: str):
+    if name not in _SEARCH_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(f'{__name__}.{_SEARCH_MODULES[name]}'), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+
+from deduplication import Deduplicator
+from ranking.relevance_filter import RelevanceFilter
+from search_engine.databases.async_database_client import AsyncDatabaseClient
+from search_engine.databases.database_client import SupportedSources, Document, DocumentBatch
+from search_engine.databases import registry
+from storage.publication_store import PublicationStore, default_store
+from utils.transport import transport_stats
+
+
+def create_async_clients(sources: Iterable[SupportedSources]) -> dict:
+    """
+    Create asyncio clients for given sources. Pass the result to several AsyncSearch instances to share
+    connections and per-source concurrency limits between them.
+    :param sources: sources to create clients for, sources of plugins too, see registry
+    :type sources: Iterable[SupportedSources]
+    :return: clients by source, sources without an asyncio client are skipped with a warning
+    :rtype: dict
+    """
+
+    clients = {}
+    for source in sources:
+        try:
+            clients[source] = registry.create_async_client(source)
+        except ValueError as e:
+            logging.warning(f'{e}, skipping it')
+
+    return clients
+
+
+class AsyncSearch:
+    """
+    Asyncio counterpart of Search: all sources are paged from one event loop and the limit of a source
+    which ran out of results is handed to the sources which still have something to return.
+    """
+
+    def __init__(
+            self,
+            query: str,
+            limit: int = 1000,
+            remove_duplicates: bool = True,
+            remove_without_title: bool = True,
+            sources: tuple = (
+                    SupportedSources.ARXIV,
+                    SupportedSources.CORE,
+                    SupportedSources.INTERNET_ARCHIVE,
+                    SupportedSources.SEMANTIC_SCHOLAR,
+                    SupportedSources.UNPAYWALL,
+                    SupportedSources.CROSSREF,
+                    SupportedSources.OPENALEX,
+                    SupportedSources.PAPERS_WITH_CODE,
+            ),
+            clients: dict = None,
+            store: PublicationStore = None,
+            incremental: bool = False,
+            relevance_filter: RelevanceFilter = None,
+            lazy: bool = False
+    ):
+        """
+        :param clients: asyncio clients by source, see create_async_clients; sources without a client are skipped
+        :type clients: dict
+        :param store: store to save results to, see publication_store.default_store; results of a search with
+        a store are all publications the query found in this and previous runs
+        :type store: PublicationStore
+        :param incremental: ask sources only for records newer than the last run of the query saved in the store
+        :type incremental: bool
+        :param relevance_filter: stop a source once a page of its results is not relevant enough and give its
+        unused limit to other sources, see ranking.RelevanceFilter
+        :type relevance_filter: RelevanceFilter
+        :param lazy: yield lazy documents, which are parsed on first access to any field but the title, see Document
+        :type lazy: bool
+        """
+
+        assert query, 'Query cannot be empty'
+        assert limit >= len(sources), 'Limit must be greater then sources number'
+        assert sources, 'Pass at least one source'
+
+        self._store = store if store is not None else default_store()
+        self._incremental = incremental
+        assert not incremental or self._store is not None, 'Incremental search needs a publication store'
+        self._since = {}
+        self._relevance_filter = relevance_filter
+        self._lazy = lazy
+
+        self._remove_without_title = remove_without_title
+        self._search_id = uuid.uuid4()
+
+        logging.info(f'Search {self._search_id} created.')
+        logging.info(f'Search query: {query}')
+        logging.info(f'Search limit: {limit}')
+        logging.info(f'Sources: {",".join([str(source) for source in sources])}')
+
+        self._results = None
+
+        self._query = query.strip()
+        self._remove_duplicates = remove_duplicates
+        self._deduplicator = Deduplicator()
+
+        if clients is None:
+            # sources without a client are reported while they are created
+            clients = create_async_clients(sources)
+        else:
+            for source in dict.fromkeys(sources):
+                if source not in clients:
+                    logging.warning(f'No client was given for source {source}, skipping it')
+        self._clients = [clients[source] for source in dict.fromkeys(sources) if source in clients]
+        assert self._clients, 'No client could be created for given sources'
+
+        # sources without a client and repeated ones don't take a share of the limit
+        self._limit_for_source = limit // len(self._clients)
+        logging.info(f'Initial limit for source: {self._limit_for_source}')
+
+        self._documents_to_pull = {}
+        self._documents_pulled = {}
+        self._active_sources = set()
+        # sources which returned all their results, or stopped on a page which wasn't relevant
+        self._completed_sources = set()
+        self._limits_changed = None
+
+    async def perform(self):
+        started = datetime.now()
+        self._results = DocumentBatch()
+        async for document in self.stream():
+            self._results.append(document)
+
+        for client in self._clients:
+            logging.info(f'{client.name}: {self._documents_pulled[client.name]}')
+        logging.info(f'total documents: {len(self._results)}')
+
+        for host, stats in transport_stats().items():
+            logging.info(f'{host}: {stats["requests"]} requests over {stats["connections"]} connections')
+
+        if self._store is not None:
+            # a source stopped once its limit was used up may have more records since its last run, so the next
+            # incremental run starts from the old date for it
+            runs = {client.name: started for client in self._clients if client.name in self._completed_sources}
+            self._results = await asyncio.to_thread(lambda: DocumentBatch(self._store.update(
+                self._query, self._results, runs,
+                self._deduplicator if self._remove_duplicates else None, self._remove_without_title
+            )))
+        elif self._remove_duplicates:
+            self._results = await asyncio.to_thread(
+                lambda: DocumentBatch(self._deduplicator.deduplicate(self._remove_without_title, self._results))
+            )
+
+    async def stream(self, queue_size: int = 1000) -> AsyncIterator[Document]:
+        """
+        Yield documents as soon as clients pull them. Duplicates are not removed here.
+        :param queue_size: maximum number of documents waiting for the consumer
+        :type queue_size: int
+        :return: documents in the order they arrive from clients
+        :rtype: AsyncIterator[Document]
+        """
+
+        documents = asyncio.Queue(maxsize=queue_size)
+        self._limits_changed = asyncio.Condition()
+
+        if self._incremental:
+            self._since = {client.name: self._store.last_run(self._query, client.name) for client in self._clients}
+
+        for client in self._clients:
+            self._documents_to_pull[client.name] = self._limit_for_source
+            self._documents_pulled[client.name] = 0
+            self._active_sources.add(client.name)
+        self._completed_sources.clear()
+
+        tasks = [asyncio.create_task(self._search(client, documents)) for client in self._clients]
+        finisher = asyncio.create_task(self._finish(tasks, documents))
+
+        try:
+            while True:
+                document = await documents.get()
+                if document is None:
+                    break
+                yield document
+        finally:
+            for task in tasks:
+                task.cancel()
+            finisher.cancel()
+            await asyncio.gather(*tasks, finisher, return_exceptions=True)
+
+    def results(self) -> Iterable[Document]:
+        return self._results
+
+    async def _search(self, client: AsyncDatabaseClient, documents: asyncio.Queue):
+        source = client.name
+        pages = client.pages(self._query, lambda: self._documents_to_pull[source], self._since.get(source))
+
+        try:
+            while True:
+                async with self._limits_changed:
+                    await self._limits_changed.wait_for(
+                        lambda: self._documents_to_pull[source] > 0 or self._all_sources_are_waiting()
+                    )
+
+                if self._documents_to_pull[source] <= 0:
+                    break
+
+                try:
+                    page = await pages.__anext__()
+                except StopAsyncIteration:
+                    self._completed_sources.add(source)
+                    break
+
+                page = page[:self._documents_to_pull[source]]
+                self._documents_to_pull[source] -= len(page)
+                self._documents_pulled[source] += len(page)
+
+                page = await client.to_documents(page, self._lazy)
+                for document in page:
+                    await documents.put(document)
+
+                if self._relevance_filter is not None and \
+                        not self._relevance_filter.is_relevant([document.title for document in page]):
+                    logging.info(f'Page of {source} is not relevant enough, stopping early.')
+                    self._completed_sources.add(source)
+                    break
+
+                if self._documents_to_pull[source] == 0:
+                    logging.info(f'Pulled {self._documents_pulled[source]} docs from {source}.')
+                    async with self._limits_changed:
+                        self._limits_changed.notify_all()
+        finally:
+            await pages.aclose()
+            await self._release(source)
+
+    async def _release(self, source: SupportedSources):
+        async with self._limits_changed:
+            self._active_sources.discard(source)
+            docs_to_distribute = self._documents_to_pull[source]
+            self._documents_to_pull[source] = 0
+            logging.info(f'Terminating {source} client. Docs pulled: {self._documents_pulled[source]}. '
+                         f'Docs left: {docs_to_distribute}')
+
+            if self._active_sources and docs_to_distribute > len(self._active_sources):
+                docs_for_active_source = docs_to_distribute // len(self._active_sources)
+                logging.info(f'Found {docs_to_distribute} docs to distribute. '
+                             f'Docs for each client: {docs_for_active_source}')
+
+                for active_source in self._active_sources:
+                    self._documents_to_pull[active_source] += docs_for_active_source
+
+            self._limits_changed.notify_all()
+
+    def _all_sources_are_waiting(self) -> bool:
+        return all(self._documents_to_pull[source] <= 0 for source in self._active_sources)
+
+    @staticmethod
+    async def _finish(tasks: list, documents: asyncio.Queue):
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(f'Client failed: {result!r}')
+        await documents.put(None)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import AsyncIterator, Iterable, List, Tuple
+
+from deduplication import Deduplicator
+from search_engine.async_search import AsyncSearch, create_async_clients
+from search_engine.databases.database_client import SupportedSources, Document, DocumentBatch
+from utils.transport import transport_stats
+
+# queries paged at the same time, the rest wait for their turn
+CONCURRENT_QUERIES = 16
+
+
+class BatchSearch:
+    """
+    Runs many queries, e.g. synonyms or strings of a systematic review, through one set of asyncio clients.
+    Requests of all queries to a source share its concurrency limit, the rate limiter and the response cache,
+    so the batch is as fast as the APIs allow rather than as fast as queries can be run one by one.
+    Duplicates are removed once, across the results of all queries.
+    """
+
+    def __init__(
+            self,
+            queries: Iterable[str],
+            limit: int = 1000,
+            remove_duplicates: bool = True,
+            remove_without_title: bool = True,
+            sources: tuple = (
+                    SupportedSources.ARXIV,
+                    SupportedSources.CORE,
+                    SupportedSources.INTERNET_ARCHIVE,
+                    SupportedSources.SEMANTIC_SCHOLAR,
+                    SupportedSources.UNPAYWALL,
+                    SupportedSources.CROSSREF,
+                    SupportedSources.OPENALEX,
+                    SupportedSources.PAPERS_WITH_CODE,
+            ),
+            clients: dict = None,
+            concurrent_queries: int = CONCURRENT_QUERIES,
+            lazy: bool = False
+    ):
+        """
+        :param queries: queries to search for, repeated ones are searched once
+        :type queries: Iterable[str]
+        :param limit: limit of every query, see AsyncSearch
+        :type limit: int
+        :param clients: asyncio clients by source, see async_search.create_async_clients
+        :type clients: dict
+        :param concurrent_queries: maximum number of queries paged at the same time
+        :type concurrent_queries: int
+        :param lazy: yield lazy documents, see AsyncSearch
+        :type lazy: bool
+        """
+
+        self._queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+        assert self._queries, 'Pass at least one query'
+        assert limit >= len(sources), 'Limit must be greater then sources number'
+        assert sources, 'Pass at least one source'
+
+        logging.info(f'Batch search of {len(self._queries)} queries created.')
+
+        self._limit = limit
+        self._remove_duplicates = remove_duplicates
+        self._remove_without_title = remove_without_title
+        self._sources = sources
+        self._clients = clients if clients is not None else create_async_clients(sources)
+        self._concurrent_queries = concurrent_queries
+        self._lazy = lazy
+        self._deduplicator = Deduplicator()
+
+        self._results = None
+        self._queries_by_id = defaultdict(set)
+
+    async def perform(self):
+        documents = DocumentBatch()
+        self._queries_by_id.clear()
+
+        async for query, document in self.stream():
+            documents.append(document)
+            self._queries_by_id[document.id].add(query)
+
+        logging.info(f'Batch search of {len(self._queries)} queries pulled {len(documents)} documents.')
+        for host, stats in transport_stats().items():
+            logging.info(f'{host}: {stats["requests"]} requests over {stats["connections"]} connections')
+
+        if self._remove_duplicates:
+            self._results = await asyncio.to_thread(
+                lambda: DocumentBatch(self._deduplicator.deduplicate(self._remove_without_title, documents))
+            )
+        else:
+            self._results = documents
+
+    async def stream(self, queue_size: int = 1000) -> AsyncIterator[Tuple[str, Document]]:
+        """
+        Yield documents of all queries as soon as clients pull them. Duplicates are not removed here.
+        :param queue_size: maximum number of documents waiting for the consumer
+        :type queue_size: int
+        :return: query and a document it found, in the order documents arrive
+        :rtype: AsyncIterator[Tuple[str, Document]]
+        """
+
+        documents = asyncio.Queue(maxsize=queue_size)
+        semaphore = asyncio.Semaphore(self._concurrent_queries)
+
+        async def search(query: str):
+            async with semaphore:
+                async for document in AsyncSearch(query, self._limit, False, self._remove_without_title,
+                                                  self._sources, self._clients, lazy=self._lazy).stream():
+                    await documents.put((query, document))
+
+        tasks = [asyncio.create_task(search(query)) for query in self._queries]
+        finisher = asyncio.create_task(self._finish(tasks, documents))
+
+        try:
+            while True:
+                item = await documents.get()
+                if item is None:
+                    break
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            finisher.cancel()
+            await asyncio.gather(*tasks, finisher, return_exceptions=True)
+
+    def results(self) -> Iterable[Document]:
+        return self._results
+
+    def queries_of(self, document: Document) -> List[str]:
+        """
+        :return: queries which found the publication or any of its merged versions
+        :rtype: List[str]
+        """
+
+        ids = [document.id] + [version.get('id') for version in document.versions]
+        found = set().union(*(self._queries_by_id.get(doc_id, ()) for doc_id in ids))
+        return [query for query in self._queries if query in found]
+
+    @staticmethod
+    async def _finish(tasks: list, documents: asyncio.Queue):
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(f'Query failed: {result!r}')
+        await documents.put(None)
@@ -1,10 +1,35 @@
-# from search_engine.databases.google_scholar_client import GoogleScholarClient
-from search_engine.databases.semantic_scholar_client import SematicScholarClient
-from search_engine.databases.core_client import CoreClient
-from search_engine.databases.arxiv_client import ArXivClient
-from search_engine.databases.unpaywall_client import UnpaywallClient
-from search_engine.databases.internet_archive_client import InternetArchiveClient
-from search_engine.databases.crossref_client import CrossrefClient
-from search_engine.databases.openalex_client import OpenAlexClient
-from search_engine.databases.paperswithcode_client import PapersWithCodeClient
-# from search_engine.databases.dblp_client import DBLPClient
+# clients are imported on first access, so importing the package doesn't import every source's dependencies,
+# searches create clients through the registry
+import importlib
+
+_CLIENT_MODULES = {
+    # 'GoogleScholarClient': 'google_scholar_client',
+    'SematicScholarClient': 'semantic_scholar_client',
+    'AsyncSematicScholarClient': 'semantic_scholar_client',
+    'CoreClient': 'core_client',
+    'AsyncCoreClient': 'core_client',
+    'ArXivClient': 'arxiv_client',
+    'AsyncArXivClient': 'arxiv_client',
+    'UnpaywallClient': 'unpaywall_client',
+    'AsyncUnpaywallClient': 'unpaywall_client',
+    'InternetArchiveClient': 'internet_archive_client',
+    'AsyncInternetArchiveClient': 'internet_archive_client',
+    'CrossrefClient': 'crossref_client',
+    'AsyncCrossrefClient': 'crossref_client',
+    'OpenAlexClient': 'openalex_client',
+    'AsyncOpenAlexClient': 'openalex_client',
+    'PapersWithCodeClient': 'paperswithcode_client',
+    'AsyncPapersWithCodeClient': 'paperswithcode_client',
+    # 'DBLPClient': 'dblp_client',
+}
+
+__all__ = list(_CLIENT_MODULES)
+
+
+def __getattr__(name: str):
+    if name not in _CLIENT_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(f'{__name__}.{_CLIENT_MODULES[name]}'), name)
+    globals()[name] = value
+    return value
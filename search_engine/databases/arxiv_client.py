@@ -1,52 +1,60 @@
 import logging
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
 import arxiv
+import feedparser
+import httpx
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
 
 
 class ArXivClient(DatabaseClient):
+    PAGE_SIZE = 200
+
     def __init__(self):
         super().__init__(SupportedSources.ARXIV)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
+        lazy = self._get_search(search_id).lazy
 
-        search = arxiv.Search(query=query)
-        client = arxiv.Client(num_retries=30, delay_seconds=10, page_size=200)
+        # newest submissions come first, so the search can stop at the first one older than since
+        search = arxiv.Search(query=query, sort_by=arxiv.SortCriterion.SubmittedDate if since else
+                              arxiv.SortCriterion.Relevance)
+        client = arxiv.Client(num_retries=30, delay_seconds=10, page_size=ArXivClient.PAGE_SIZE)
 
         counter = 0
         total_results = 0
+        # results come one by one, relevance is checked for every page the client fetched
+        page = []
         try:
             for publication in client.results(search):
-                yield Document(publication, source=SupportedSources.ARXIV)
+                if since and publication.published.date() < since:
+                    break
+
+                yield Document(publication, source=SupportedSources.ARXIV, lazy=lazy)
                 counter += 1
                 total_results += 1
                 logging.debug(f'arXiv: {total_results}')
 
+                page.append(publication)
+                if len(page) == ArXivClient.PAGE_SIZE:
+                    if not self._page_is_relevant(search_id, page):
+                        break
+                    page = []
+
                 if counter == self.documents_to_pull(search_id):
-                    self._change_status(SearchStatus.WAITING, search_id)
                     self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.WAITING, search_id)
                     logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
 
                     counter = 0
 
-                    kill = False
-
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
-
-                        time.sleep(5)
-
-                    if kill:
+                    if not self._wait_for_limit(search_id):
                         logging.info(f'Kill signal for {self.name} occurred.')
                         break
 
@@ -79,3 +87,54 @@ class ArXivClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(ArXivClient, self).change_limit(search_id, delta)
+
+
+class AsyncArXivClient(AsyncDatabaseClient):
+    MAX_LIMIT = 200
+    # arXiv asks for a single connection and three seconds between requests
+    MAX_CONCURRENCY = 1
+
+    def __init__(self):
+        self._api_endpoint = 'http://export.arxiv.org/api/query'
+        super().__init__(SupportedSources.ARXIV)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        start = 0
+
+        while True:
+            response = await self._get(
+                self._api_endpoint,
+                params={
+                    'search_query': query,
+                    'sortBy': (arxiv.SortCriterion.SubmittedDate if since else arxiv.SortCriterion.Relevance).value,
+                    'sortOrder': arxiv.SortOrder.Descending.value,
+                    'start': start,
+                    'max_results': min(AsyncArXivClient.MAX_LIMIT, page_size())
+                },
+                max_failures=10
+            )
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            feed = feedparser.parse(response.text)
+
+            if not feed.entries:
+                break
+
+            start += len(feed.entries)
+            results = [arxiv.Result._from_feed_entry(entry) for entry in feed.entries]
+
+            if since:
+                # results are sorted by submission date, the first older one ends the search
+                new_results = [result for result in results if result.published.date() >= since]
+                if new_results:
+                    yield new_results
+                if len(new_results) < len(results):
+                    break
+            else:
+                yield results
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date
+from typing import TYPE_CHECKING, AsyncIterator, Callable, List, Union
+
+from search_engine.databases.database_client import Document, SupportedSources
+from search_engine.databases.document_pool import build_documents_async
+from utils.requests_manager import AsyncRequestsManager
+
+if TYPE_CHECKING:
+    import arxiv
+
+
+class AsyncDatabaseClient:
+    """
+    Base class for asyncio clients. Unlike DatabaseClient it keeps no per-search state: a client only knows
+    how to page through its source, and the caller decides how many documents it wants from each page.
+    That is why one client instance can be shared by any number of concurrent searches.
+    """
+
+    MAX_LIMIT = 100
+    # maximum number of requests to the source in flight at the same time, shared by all searches
+    MAX_CONCURRENCY = 2
+
+    def __init__(self, source_name: SupportedSources, requests_manager: AsyncRequestsManager = None):
+        self._name = source_name
+        self._requests_manager = requests_manager if requests_manager is not None else AsyncRequestsManager()
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+    @property
+    def name(self) -> SupportedSources:
+        return self._name
+
+    def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        """
+        Iterate over result pages for the given query.
+        :param query: search query
+        :type query: str
+        :param page_size: called before every request, returns how many documents the caller still wants
+        :type page_size: Callable[[], int]
+        :param since: if set, only records published or indexed since this date; sources which can't filter
+        by date ignore it
+        :type since: date
+        :return: lists of raw results ready to be passed to Document
+        :rtype: AsyncIterator[list]
+        """
+
+        raise NotImplementedError
+
+    def to_document(self, raw_data: Union[dict, 'arxiv.Result']) -> Document:
+        return Document(raw_data, source=self._name)
+
+    async def to_documents(self, page: list, lazy: bool = False) -> List[Document]:
+        """
+        Build documents of a page, in a worker process if there is a document pool, see document_pool.
+        Clients which override to_document build them with it instead and ignore lazy.
+        :param page: raw results of a page
+        :type page: list
+        :param lazy: build lazy documents, see Document
+        :type lazy: bool
+        :rtype: List[Document]
+        """
+
+        if type(self).to_document is not AsyncDatabaseClient.to_document:
+            return [self.to_document(raw_data) for raw_data in page]
+
+        return await build_documents_async(page, self._name, lazy=lazy)
+
+    async def search_publications(self, query: str, limit: int = 100, since: date = None) -> AsyncIterator[Document]:
+        remaining = limit
+        pages = self.pages(query.strip(), lambda: remaining, since)
+
+        try:
+            async for page in pages:
+                for raw_data in page[:remaining]:
+                    yield self.to_document(raw_data)
+                remaining -= min(len(page), remaining)
+
+                if remaining == 0:
+                    break
+        finally:
+            await pages.aclose()
+
+    async def aclose(self):
+        await self._requests_manager.aclose()
+
+    async def _get(self, *args, **kwargs):
+        async with self._semaphore:
+            return await self._requests_manager.get(*args, **kwargs)
+
+    async def _post(self, *args, **kwargs):
+        async with self._semaphore:
+            return await self._requests_manager.post(*args, **kwargs)
@@ -1,14 +1,21 @@
+import asyncio
 import json
 import logging
 import os
 import time
-from datetime import datetime
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
+from utils.rate_limiter import backoff
 from utils.requests_manager import RequestsManager
 
 
@@ -22,27 +29,15 @@ class CoreClient(DatabaseClient):
 
         super().__init__(SupportedSources.CORE)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id=search_id)
-        results = []
+        lazy = self._get_search(search_id).lazy
 
-        for response in responses:
-            results += response.get('results')
+        for page in self.__query_api(query.strip(), search_id=search_id):
+            yield from build_documents(page, SupportedSources.CORE, lazy=lazy)
 
-        if not results:
-            return
-
-        documents_pulled = self._documents_pulled(search_id)
-
-        for n, result in enumerate(results):
-            yield Document(raw_data=dict(result), source=SupportedSources.CORE)
-
-            if n + 1 == documents_pulled:
-                break
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '') -> Iterator[list]:
         headers = {'Authorization': f'Bearer {self.__api_key}'}
         total_results = 0
         failures_number = 0
@@ -51,93 +46,91 @@ class CoreClient(DatabaseClient):
 
         scroll_id = None
         counter = 0
-        while self.documents_to_pull(search_id) > 0:
-            query_data = {'q': query, 'limit': min(max_limit, self.documents_to_pull(search_id) - counter)}
+
+        def request(documents_number: int):
+            query_data = {'q': query, 'limit': min(max_limit, documents_number)}
 
             if not scroll_id:
                 query_data['scroll'] = True
             else:
                 query_data['scrollId'] = scroll_id
 
-            response = self._requests_manager.post(f'{self._api_endpoint}search/works', data=json.dumps(query_data),
-                                                   headers=headers, max_failures=0)
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
+            prefetcher.submit(scroll_id, self._requests_manager.post, f'{self._api_endpoint}search/works',
+                              data=json.dumps(query_data), headers=headers, max_failures=0)
 
-            if response.status_code == 200:
-                result_json = response.json()
-                result_size = len(result_json.get('results', []))
+        # the next page can't be requested before the scroll id is known, but it is requested as soon as it is,
+        # so the request is in flight while the current page is processed
+        with Prefetcher(1, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                if not len(prefetcher):
+                    request(self.documents_to_pull(search_id) - counter)
+                _, response = prefetcher.next()
 
-                if result_size == 0:
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(result_json)
-                total_results += result_size
-                counter += result_size
-                scroll_id = result_json['scrollId']
-
-                if counter >= self.documents_to_pull(search_id):
-                    self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.WAITING, search_id)
-                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                    counter = 0
+                if response.status_code == 200:
+                    result_json = decode_json(response)
+                    result_size = len(result_json.get('results', []))
 
-                    kill = False
+                    if result_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
+                    scroll_id = result_json['scrollId']
+                    if self.documents_to_pull(search_id) - counter - result_size > 0:
+                        request(self.documents_to_pull(search_id) - counter - result_size)
 
-                        time.sleep(5)
+                    yield result_json['results']
+                    total_results += result_size
+                    counter += result_size
 
-                    if kill:
-                        logging.info(f'Kill signal for {self.name} occurred.')
+                    if not self._page_is_relevant(search_id, result_json['results']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
 
-            elif response.status_code == 429:
-                retry_after = response.headers.get('X-RateLimit-Retry-After', '')
-                sleep_time = 60
-                if retry_after:
-                    retry_after = datetime.fromisoformat(retry_after.replace('+0000', '')).replace(
-                        tzinfo=datetime.utcnow().tzinfo)
-                    sleep_time = (retry_after - datetime.utcnow()).seconds + 10  # 10 seconds just in case
-                logging.error(f'Too many requests on Core, waiting {sleep_time} secs...')
-                time.sleep(sleep_time)
-            elif response.status_code == 500 and 'Error: Allowed memory size' in response.text:
-                if max_limit > 20:
-                    logging.error(
-                        f"Can't fetch results with max limit of {max_limit}, setting max limit to {max_limit // 2}")
-                    max_limit //= 2
+                    if counter >= self.documents_to_pull(search_id):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.WAITING, search_id)
+                        logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                        counter = 0
+
+                        if not self._wait_for_limit(search_id):
+                            logging.info(f'Kill signal for {self.name} occurred.')
+                            break
+
+                elif response.status_code == 429:
+                    # the rate limiter has paused requests to Core until X-RateLimit-Retry-After
+                    logging.error('Too many requests on Core, waiting for the rate limit to reset...')
+                elif response.status_code == 500 and 'Error: Allowed memory size' in response.text:
+                    if max_limit > 20:
+                        logging.error(
+                            f"Can't fetch results with max limit of {max_limit}, setting max limit to {max_limit // 2}")
+                        max_limit //= 2
+                    else:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
                 else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+
+                    if failures_number < 5:
+                        failures_number += 1
+                        time.sleep(backoff(failures_number))
+                        continue
+
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-
-                if failures_number < 5:
-                    failures_number += 1
-                    time.sleep(10)
-                    continue
-
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
 
-            logging.debug(f'core: {total_results}')
+                logging.debug(f'core: {total_results}')
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(CoreClient, self)._create_search(search_id, limit)
@@ -163,3 +156,61 @@ class CoreClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(CoreClient, self).change_limit(search_id, delta)
+
+
+class AsyncCoreClient(AsyncDatabaseClient):
+    MAX_LIMIT = 200
+    MAX_CONCURRENCY = 1
+
+    def __init__(self):
+        self.__api_key = os.getenv('CORE_API_KEY')
+        self._api_endpoint = 'https://api.core.ac.uk/v3/'
+        super().__init__(SupportedSources.CORE)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        headers = {'Authorization': f'Bearer {self.__api_key}'}
+        failures_number = 0
+        max_limit = AsyncCoreClient.MAX_LIMIT
+        scroll_id = None
+
+        while True:
+            query_data = {'q': query, 'limit': min(max_limit, page_size())}
+
+            if not scroll_id:
+                query_data['scroll'] = True
+            else:
+                query_data['scrollId'] = scroll_id
+
+            response = await self._post(f'{self._api_endpoint}search/works', content=json.dumps(query_data),
+                                        headers=headers, max_failures=0)
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code == 200:
+                result_json = decode_json(response)
+                results = result_json.get('results', [])
+
+                if not results:
+                    break
+
+                scroll_id = result_json['scrollId']
+                yield results
+            elif response.status_code == 429:
+                # the rate limiter has paused requests to Core until X-RateLimit-Retry-After
+                logging.error('Too many requests on Core, waiting for the rate limit to reset...')
+            elif response.status_code == 500 and 'Error: Allowed memory size' in response.text:
+                if max_limit <= 20:
+                    break
+
+                logging.error(
+                    f"Can't fetch results with max limit of {max_limit}, setting max limit to {max_limit // 2}")
+                max_limit //= 2
+            else:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+
+                if failures_number >= 5:
+                    break
+
+                failures_number += 1
+                await asyncio.sleep(backoff(failures_number))
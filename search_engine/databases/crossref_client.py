@@ -1,11 +1,16 @@
 import logging
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
 from utils.requests_manager import RequestsManager
 
 
@@ -18,93 +23,97 @@ class CrossrefClient(DatabaseClient):
 
         super().__init__(SupportedSources.CROSSREF)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id=search_id)
-        results = []
+        lazy = self._get_search(search_id).lazy
 
-        for response in responses:
-            results += response.get('message', {}).get('items', [])
+        for page in self.__query_api(query.strip(), search_id=search_id, since=since):
+            yield from build_documents(page, SupportedSources.CROSSREF, lazy=lazy)
 
-        if not results:
-            return
-
-        documents_pulled = self._documents_pulled(search_id)
-
-        for n, result in enumerate(results):
-            yield Document(raw_data=dict(result), source=SupportedSources.CROSSREF)
-
-            if n + 1 == documents_pulled:
-                break
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '', since: date = None) -> Iterator[list]:
         total_results = 0
         counter = 0
-
-        while self.documents_to_pull(search_id) > 0:
-            limit_ = min(CrossrefClient.MAX_LIMIT, self.documents_to_pull(search_id) - counter)
-            response = self._requests_manager.get(
-                f'{self._api_endpoint}',
-                params={
-                    'query': query,
-                    'rows': limit_,
-                    'offset': total_results
-                },
-                max_failures=10
-            )
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                result_json = response.json()
-                result_size = len(result_json.get('message', {}).get('items', []))
-
-                if result_size == 0:
+        # offset of the first record which hasn't been requested yet
+        next_offset = 0
+
+        with Prefetcher(self.PREFETCH_PAGES, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                # offsets of pages up to the limit are known in advance, so several of them are requested at once
+                end = total_results + self.documents_to_pull(search_id) - counter
+                while not prefetcher.full and next_offset < end:
+                    limit_ = min(CrossrefClient.MAX_LIMIT, end - next_offset)
+                    prefetcher.submit(
+                        next_offset,
+                        self._requests_manager.get,
+                        f'{self._api_endpoint}',
+                        params={
+                            'query': query,
+                            'rows': limit_,
+                            'offset': next_offset,
+                            # records indexed since the last run, including updates of older ones
+                            'filter': f'from-index-date:{since.isoformat()}' if since else None
+                        },
+                        max_failures=10
+                    )
+                    next_offset += limit_
+
+                if not len(prefetcher):
+                    # all requested pages came back and the last one was shorter than requested
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(result_json)
-                total_results += result_size
-                counter += result_size
+                offset, response = prefetcher.next()
+                if offset != total_results:
+                    # an earlier page was shorter than requested, pages after it are requested again
+                    prefetcher.clear()
+                    next_offset = total_results
+                    continue
 
-                if counter >= self.documents_to_pull(search_id):
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.WAITING, search_id)
-                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                    counter = 0
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-                    kill = False
+                if response.status_code == 200:
+                    result_json = decode_json(response)
+                    result_size = len(result_json.get('message', {}).get('items', []))
 
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
+                    if result_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                        time.sleep(5)
-                    if kill:
-                        logging.info(f'Kill signal for {self.name} occurred.')
+                    yield result_json['message']['items']
+                    total_results += result_size
+                    counter += result_size
+
+                    if not self._page_is_relevant(search_id, result_json['message']['items']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
-            else:
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
 
-                logging.error(f'Error code {response.status_code}, {response.content}')
-                break
+                    if counter >= self.documents_to_pull(search_id):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.WAITING, search_id)
+                        logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                        counter = 0
+
+                        if not self._wait_for_limit(search_id):
+                            logging.info(f'Kill signal for {self.name} occurred.')
+                            break
+                else:
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.FINISHED, search_id)
 
-            logging.debug(f'crossref: {total_results}')
-            time.sleep(1)
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+                    break
+
+                logging.debug(f'crossref: {total_results}')
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(CrossrefClient, self)._create_search(search_id, limit)
@@ -130,3 +139,42 @@ class CrossrefClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(CrossrefClient, self).change_limit(search_id, delta)
+
+
+class AsyncCrossrefClient(AsyncDatabaseClient):
+    MAX_LIMIT = 1000
+    MAX_CONCURRENCY = 4
+
+    def __init__(self):
+        self._api_endpoint = 'https://api.crossref.org/works'
+        super().__init__(SupportedSources.CROSSREF)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        offset = 0
+
+        while True:
+            params = {
+                'query': query,
+                'rows': min(AsyncCrossrefClient.MAX_LIMIT, page_size()),
+                'offset': offset
+            }
+            if since:
+                # records indexed since the last run, including updates of older ones
+                params['filter'] = f'from-index-date:{since.isoformat()}'
+
+            response = await self._get(self._api_endpoint, params=params, max_failures=10)
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            results = decode_json(response).get('message', {}).get('items', [])
+
+            if not results:
+                break
+
+            offset += len(results)
+            yield results
@@ -1,15 +1,17 @@
+import hashlib
 import logging
-import random
-import string
+import queue
+import re
+import sys
 import threading
-from copy import deepcopy
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
-from typing import Iterator, Union
+from typing import TYPE_CHECKING, Iterable, Iterator, Union
 # from googletrans import Translator
 from uuid import UUID
 
-import arxiv
+if TYPE_CHECKING:
+    import arxiv
 
 
 class SupportedSources(Enum):
@@ -32,49 +34,105 @@ class SearchStatus(Enum):
     WAITING = 3
 
 
-class Author:
-    def __init__(self, name: str):
-        self._name = name
+class Document:
+    """
+    Publication loaded from the payload of one of the sources. Documents are created for every result of every
+    search, so they keep only parsed fields in slots: authors are plain strings, repeated journal names are
+    interned and the payload itself is dropped after parsing unless keep_raw_data is set.
 
-    @property
-    def name(self) -> str:
-        return self._name
+    A lazy document keeps the payload and parses it on first access to any field but the title, which is
+    read from the payload directly. Pipelines which only filter by title skip parsing of dropped documents.
 
-    def __str__(self) -> str:
-        return self._name
+    Ids are stable across runs and processes: a SHA-256 of the source and the identifier the source gives the
+    publication, or of the normalized DOI, title, year and authors if the payload has no such identifier.
+    """
 
+    __slots__ = ('_title', '_abstract', '_publication_date', '_authors', '_source', '_raw_data', '_journal',
+                 '_volume', '_doi', '_lang', '_urls', '_versions', '_id', '_keep_raw_data', '_loaded')
 
-class Document:
-    def __init__(self, raw_data: Union[dict, arxiv.Result], source: SupportedSources):
+    def __init__(self, raw_data: Union[dict, 'arxiv.Result'], source: SupportedSources, keep_raw_data: bool = False,
+                 lazy: bool = False):
         assert raw_data is not None, 'Incorrect input data'
 
+        self._source = source
+        # the payload is kept by reference, clients don't change it after yielding a document
+        self._raw_data = raw_data
+        self._keep_raw_data = keep_raw_data
+        self._title = None
+        self._versions = []
+        self._loaded = False
+
+        native_id = Document._load_native_id(raw_data, source)
+        # without a native id the id is derived from parsed fields
+        self._id = Document._content_id(source, native_id) if native_id else None
+
+        if not lazy:
+            self.materialize()
+
+    @classmethod
+    def from_fields(cls, fields: tuple):
+        """
+        Build a document from values of its slots without parsing a payload.
+        :param fields: values in the order of Document.__slots__
+        :type fields: tuple
+        :rtype: Document
+        """
+
+        document = cls.__new__(cls)
+        for slot, value in zip(cls.__slots__, fields):
+            setattr(document, slot, value)
+
+        return document
+
+    def fields(self) -> tuple:
+        """
+        :return: values of the slots in the order of Document.__slots__, fields of a lazy document which
+        wasn't parsed yet are None
+        :rtype: tuple
+        """
+
+        return tuple(getattr(self, slot, None) for slot in self.__slots__)
+
+    def materialize(self):
+        """
+        Parse all fields of a lazy document, does nothing if they are parsed already.
+        :return: the document itself
+        :rtype: Document
+        """
+
+        if self._loaded:
+            return self
+
         self._title = ''
         self._abstract = ''
         self._publication_date = None
         self._authors = []
-        self._source = source
-        self._raw_data = {}
         self._journal = ''
         self._volume = ''
         self._doi = ''
         self._lang = ''
         self._urls = []
 
-        self._versions = []
+        self._load_from(self._raw_data, self._source)
+        self._title = Document._clean_title(self._title)
 
-        self._raw_data = deepcopy(raw_data)
-        self._load_from(raw_data, source)
+        if self._journal:
+            self._journal = sys.intern(self._journal)
 
-        self.__salt = ''.join(random.choices(string.ascii_uppercase + string.digits, k=64))
-        self._id = f'id{hash((self.__salt, self._title, self._doi, self._abstract, self._source))}'
+        if self._id is None:
+            year = self._publication_date.year if self._publication_date else ''
+            self._id = Document._content_id(self._source, _normalized_doi(self._doi) or '', _normalized(self._title),
+                                            year, *map(_normalized, self._authors))
 
-        if self._title is None:
-            self._title = ''
-        self._title.strip()
-        self._title = self._title.replace('\n', ' ')
+        if not self._keep_raw_data:
+            self._raw_data = None
+        self._loaded = True
+
+        return self
 
     @property
     def empty_fields(self) -> int:
+        self.materialize()
         counter = 0
         fields = (
             self._title,
@@ -95,40 +153,60 @@ class Document:
 
     @property
     def title(self) -> str:
+        if self._title is None:
+            self._title = Document._clean_title(Document._load_title(self._raw_data, self._source))
         return self._title
 
+    @property
+    def authors(self) -> list:
+        self.materialize()
+        return self._authors
+
     @property
     def source(self) -> SupportedSources:
         return self._source
 
     @property
     def journal(self) -> str:
+        self.materialize()
         return self._journal
 
+    @property
+    def volume(self) -> str:
+        self.materialize()
+        return self._volume
+
     @property
     def urls(self) -> list:
+        self.materialize()
         return self._urls
 
     @property
     def doi(self) -> str:
+        self.materialize()
         return self._doi
 
     @property
     def abstract(self) -> str:
+        self.materialize()
         return self._abstract
 
     @property
     def year(self) -> int:
+        self.materialize()
         if self._publication_date:
             return self._publication_date.year
         return 0
 
     @property
     def id(self) -> str:
+        if self._id is None:
+            self.materialize()
         return self._id
 
     @property
     def publication_date(self) -> datetime:
+        self.materialize()
         return self._publication_date
 
     # @property
@@ -139,10 +217,20 @@ class Document:
     def versions(self) -> list:
         return self._versions
 
+    @property
+    def raw_data(self) -> Union[dict, 'arxiv.Result', None]:
+        """
+        :return: payload the document was loaded from, None unless the document was created with keep_raw_data
+        or is lazy and wasn't parsed yet
+        """
+
+        return self._raw_data
+
     # returns a dict to dump to csv for deduplication
     def to_csv(self) -> dict:
+        self.materialize()
         return dict(
-            author=','.join([author.name for author in self._authors if author.name]) if self._authors else '',
+            author=','.join([author for author in self._authors if author]) if self._authors else '',
             year=self.year,
             journal=self._journal if self._journal else '',
             doi=self._doi if self._doi else '',
@@ -158,8 +246,9 @@ class Document:
         )
 
     def to_dict(self) -> dict:
+        self.materialize()
         return dict(
-            authors=[str(author) for author in self._authors],
+            authors=list(self._authors),
             title=self._title,
             publication_date=str(self._publication_date),
             source=str(self._source),
@@ -192,6 +281,7 @@ class Document:
     def add_version(self, other):
         self._versions.append(
             {
+                'id': other.id,
                 'year': other.year,
                 'source': other.source,
                 'title': other.title,
@@ -201,8 +291,10 @@ class Document:
                 'publication_date': other.publication_date
             }
         )
+        # versions of a publication merged in an earlier run
+        self._versions.extend(other.versions)
 
-    def _load_from(self, raw_data: Union[dict, arxiv.Result], source: SupportedSources):
+    def _load_from(self, raw_data: Union[dict, 'arxiv.Result'], source: SupportedSources):
         match source:
             case SupportedSources.SEMANTIC_SCHOLAR:
                 self._load_from_semantic_scholar(raw_data)
@@ -225,7 +317,70 @@ class Document:
             case SupportedSources.PAPERS_WITH_CODE:
                 self._load_from_papers_with_code(raw_data)
             case _:
-                raise Exception(f'Unsupported source: {source}')
+                self._load_from_plugin(raw_data, source)
+
+    @staticmethod
+    def _load_title(raw_data: Union[dict, 'arxiv.Result'], source: SupportedSources) -> str:
+        # the same title as _load_from gives, without parsing anything else
+        match source:
+            case SupportedSources.SEMANTIC_SCHOLAR | SupportedSources.UNPAYWALL:
+                return raw_data.get('title', '')
+            case SupportedSources.CORE:
+                title = raw_data.get('title', '')
+                return title.replace('\n', '') if title else title
+            case SupportedSources.ARXIV:
+                return raw_data.title
+            case SupportedSources.GOOGLE_SCHOLAR:
+                bib_info = raw_data.get('bib')
+                return bib_info.get('title', '') if bib_info else ''
+            case SupportedSources.INTERNET_ARCHIVE:
+                return raw_data.get('biblio').get('title', '')
+            case SupportedSources.CROSSREF:
+                return raw_data.get('title', [''])[0]
+            case SupportedSources.OPENALEX:
+                return raw_data.get('title')
+            case SupportedSources.PAPERS_WITH_CODE:
+                return raw_data.get('paper').get('title')
+            case _:
+                return _plugin_source(source).load_title(raw_data)
+
+    @staticmethod
+    def _load_native_id(raw_data: Union[dict, 'arxiv.Result'], source: SupportedSources) -> Union[str, None]:
+        # identifier of the publication in the source, read from the payload without parsing anything else
+        match source:
+            case SupportedSources.SEMANTIC_SCHOLAR:
+                return raw_data.get('paperId')
+            case SupportedSources.CORE:
+                return str(raw_data['id']) if raw_data.get('id') is not None else None
+            case SupportedSources.ARXIV:
+                # the same publication keeps its id when a new version is submitted
+                return re.sub(r'v\d+$', '', raw_data.get_short_id())
+            case SupportedSources.UNPAYWALL:
+                return _normalized_doi(raw_data.get('doi'))
+            case SupportedSources.INTERNET_ARCHIVE:
+                return raw_data.get('key')
+            case SupportedSources.CROSSREF:
+                return _normalized_doi(raw_data.get('DOI'))
+            case SupportedSources.OPENALEX:
+                return raw_data.get('id')
+            case SupportedSources.PAPERS_WITH_CODE:
+                paper_info = raw_data.get('paper')
+                return paper_info.get('id') if paper_info else None
+            case SupportedSources.GOOGLE_SCHOLAR:
+                return None
+            case _:
+                return _plugin_source(source).load_native_id(raw_data)
+
+    @staticmethod
+    def _content_id(source: SupportedSources, *parts) -> str:
+        key = '\x1f'.join(str(part) for part in (source.value, *parts))
+        return 'id' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def _clean_title(title: Union[str, None]) -> str:
+        if title is None:
+            return ''
+        return title.replace('\n', ' ')
 
     def _load_from_semantic_scholar(self, raw_data: dict):
         self._source = SupportedSources.SEMANTIC_SCHOLAR
@@ -248,7 +403,7 @@ class Document:
             self._publication_date = datetime.strptime(raw_pub_date, "%Y-%m-%d")
 
         for raw_author in raw_data['authors']:
-            self._authors.append(Author(raw_author['name']))
+            self._authors.append(raw_author['name'])
 
     def _load_from_core(self, raw_data: dict):
         self._source = SupportedSources.CORE
@@ -267,14 +422,14 @@ class Document:
             self._publication_date = datetime.strptime(raw_pub_date, "%Y-%m-%d")
 
         for raw_author in raw_data['authors']:
-            self._authors.append(Author(raw_author['name']))
+            self._authors.append(raw_author['name'])
 
         raw_journal = raw_data.get('journals')
 
         if raw_journal and 'title' in raw_journal[0]:
             self._journal = raw_journal[0].get('title')
 
-    def _load_from_arxiv(self, raw_data: arxiv.Result):
+    def _load_from_arxiv(self, raw_data: 'arxiv.Result'):
         self._source = SupportedSources.ARXIV
         self._title = raw_data.title
         self._abstract = raw_data.summary
@@ -284,7 +439,7 @@ class Document:
         self._journal = raw_data.journal_ref
 
         for raw_author in raw_data.authors:
-            self._authors.append(Author(raw_author.name))
+            self._authors.append(raw_author.name)
 
     def _load_from_unpaywall(self, raw_data: dict):
         self._source = SupportedSources.UNPAYWALL
@@ -303,13 +458,13 @@ class Document:
 
         for raw_author in raw_authors:
             if 'family' in raw_author and 'given' in raw_author:
-                self._authors.append(Author(f'{raw_author["family"]}, {raw_author["given"][0]}.'))
+                self._authors.append(f'{raw_author["family"]}, {raw_author["given"][0]}.')
             elif 'given' in raw_author and 'family' not in raw_author:
-                self._authors.append(Author(raw_author['given']))
+                self._authors.append(raw_author['given'])
             elif 'family' in raw_author and 'given' not in raw_author:
-                self._authors.append(Author(raw_author['family']))
+                self._authors.append(raw_author['family'])
             elif 'name' in raw_author:
-                self._authors.append(Author(raw_author['name']))
+                self._authors.append(raw_author['name'])
             # else:
             #     print(raw_author)
 
@@ -321,7 +476,7 @@ class Document:
         if bib_info:
             self._title = bib_info.get('title', '')
             self._abstract = bib_info.get('abstract', '')
-            self._authors = [Author(author) for author in bib_info.get('author')]
+            self._authors = list(bib_info.get('author'))
             pub_year = bib_info.get('pub_year')
             if pub_year and pub_year != 'NA':
                 self._publication_date = datetime.strptime(pub_year, '%Y')
@@ -344,7 +499,7 @@ class Document:
         self._journal = biblio_data.get('publisher', '')
 
         for raw_author in biblio_data.get('contrib_names', []):
-            self._authors.append(Author(raw_author))
+            self._authors.append(raw_author)
 
     def _load_from_crossref(self, raw_data: dict):
         self._source = SupportedSources.CROSSREF
@@ -363,13 +518,13 @@ class Document:
 
         for raw_author in raw_authors:
             if 'family' in raw_author and 'given' in raw_author:
-                self._authors.append(Author(f'{raw_author["family"]}, {raw_author["given"][0]}.'))
+                self._authors.append(f'{raw_author["family"]}, {raw_author["given"][0]}.')
             elif 'given' in raw_author and 'family' not in raw_author:
-                self._authors.append(Author(raw_author['given']))
+                self._authors.append(raw_author['given'])
             elif 'family' in raw_author and 'given' not in raw_author:
-                self._authors.append(Author(raw_author['family']))
+                self._authors.append(raw_author['family'])
             elif 'name' in raw_author:
-                self._authors.append(Author(raw_author['name']))
+                self._authors.append(raw_author['name'])
 
     # def _load_from_dblp(self, raw_data: dict):
     #     pass
@@ -397,7 +552,7 @@ class Document:
             self._urls.append(open_access['oa_url'])
 
         for author in raw_data.get('authorships'):
-            self._authors.append(Author(author['author']['display_name']))
+            self._authors.append(author['author']['display_name'])
 
         biblio = raw_data.get('biblio')
         if biblio and biblio.get('volume'):
@@ -425,79 +580,355 @@ class Document:
         if published:
             self._publication_date = datetime.strptime(published, "%Y-%m-%d")
         for author in paper_info.get('authors', []):
-            self._authors.append(Author(author))
+            self._authors.append(author)
+
+    def _load_from_plugin(self, raw_data, source: Enum):
+        fields = _plugin_source(source).load(raw_data)
+        self._source = source
+        self._title = fields.get('title', '')
+        self._abstract = fields.get('abstract', '')
+        self._publication_date = fields.get('publication_date')
+        self._authors = list(fields.get('authors', []))
+        self._journal = fields.get('journal', '')
+        self._volume = fields.get('volume', '')
+        self._doi = fields.get('doi', '')
+        self._urls = list(fields.get('urls', []))
 
     def __str__(self) -> str:
-        return self._title
+        return self.title
 
     def __repr__(self) -> str:
         return self.title
 
 
+def _normalized(value: Union[str, None]) -> str:
+    # lower-cased words of letters and digits, so formatting differences don't change ids
+    if not value:
+        return ''
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in value.lower()).split())
+
+
+def _plugin_source(source: Enum):
+    # sources of plugins are looked up in the registry, which imports this module
+    from search_engine.databases.registry import get_source
+    return get_source(source)
+
+
+def _normalized_doi(doi: Union[str, None]) -> Union[str, None]:
+    if not doi or not doi.strip():
+        return None
+    return doi.strip().lower()
+
+
+class DocumentBatch:
+    """
+    Results of a search. The documents themselves are kept, so changes of a returned document, e.g. parsing
+    of a lazy one or merged versions, stay in the batch. Documents are compact already: fields are in slots
+    and payloads are dropped after parsing.
+    """
+
+    def __init__(self, documents: Iterable[Document] = ()):
+        self._documents = list(documents)
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __iter__(self) -> Iterator[Document]:
+        return iter(self._documents)
+
+    def __getitem__(self, index: int) -> Document:
+        return self._documents[index]
+
+    def append(self, document: Document):
+        self._documents.append(document)
+
+    def extend(self, documents: Iterable[Document]):
+        self._documents.extend(documents)
+
+    def column(self, name: str) -> list:
+        """
+        :param name: name of a Document property backed by a slot, e.g. 'title' or 'doi'
+        :type name: str
+        :return: values of the field for all documents; values of lazy documents which weren't parsed yet
+        are None, call materialize first if they are needed
+        :rtype: list
+        """
+
+        slot = f'_{name}'
+        if slot not in Document.__slots__:
+            raise ValueError(f'Unknown field: {name}')
+
+        return [getattr(document, slot, None) for document in self._documents]
+
+    def materialize(self):
+        """
+        Parse all lazy documents of the batch at once, e.g. before exporting it.
+        :return: the batch itself
+        :rtype: DocumentBatch
+        """
+
+        for document in self._documents:
+            document.materialize()
+
+        return self
+
+
+class SearchState:
+    """
+    Progress of one search in one client. Every method is atomic, so the client thread and the coordinator
+    can read and change the state at the same time.
+    """
+
+    def __init__(self, limit: int, events: queue.Queue = None, relevance_filter=None, client=None,
+                 lazy: bool = False):
+        self._status = SearchStatus.WORKING
+        self._documents_to_pull = limit
+        self._documents_pulled = 0
+        self._kill_signal_occurred = False
+        # killed before the client finished on its own, e.g. while it was waiting for a limit
+        self._killed = False
+        # the client is put to events every time the state changes, see DatabaseClient.watch
+        self._events = events
+        self._client = client
+        self.relevance_filter = relevance_filter
+        # documents of the search are parsed on first access, see DatabaseClient.parse_lazily
+        self.lazy = lazy
+        # guards the fields above, a client waiting for a new limit or a kill signal waits on it
+        self._condition = threading.Condition()
+
+    @property
+    def status(self) -> SearchStatus:
+        with self._condition:
+            return self._status
+
+    @property
+    def documents_to_pull(self) -> int:
+        with self._condition:
+            return self._documents_to_pull
+
+    @property
+    def documents_pulled(self) -> int:
+        with self._condition:
+            return self._documents_pulled
+
+    @property
+    def kill_signal_occurred(self) -> bool:
+        with self._condition:
+            return self._kill_signal_occurred
+
+    @property
+    def completed(self) -> bool:
+        """
+        :return: True if the client finished on its own, e.g. the source ran out of results, rather than
+        being killed
+        :rtype: bool
+        """
+
+        with self._condition:
+            return self._status == SearchStatus.FINISHED and not self._killed
+
+    def change_status(self, status: SearchStatus):
+        with self._condition:
+            self._status = status
+
+    def terminate(self):
+        with self._condition:
+            self._kill_signal_occurred = True
+            self._status = SearchStatus.FINISHED
+            self._condition.notify_all()
+
+    def kill(self):
+        with self._condition:
+            self._kill_signal_occurred = True
+            self._killed = self._killed or self._status != SearchStatus.FINISHED
+            self._condition.notify_all()
+
+    def change_limit(self, delta: int):
+        """
+        Move documents between "to pull" and "pulled" counters: a negative delta marks -delta documents as
+        pulled, a positive one allows the client to pull delta more documents.
+        """
+
+        with self._condition:
+            self._documents_to_pull = max(0, self._documents_to_pull + delta)
+
+            if delta < 0:
+                self._documents_pulled -= delta
+
+            self._condition.notify_all()
+
+        # the coordinator decides on the limits as well as on statuses, so it is woken up by both
+        self.notify()
+
+    def wait_for_limit(self) -> bool:
+        """
+        Block until the limit is increased or the kill signal occurs.
+        :return: True if there are new documents to pull, False if the search was killed
+        :rtype: bool
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._kill_signal_occurred or self._documents_to_pull > 0)
+            return not self._kill_signal_occurred
+
+    def notify(self):
+        if self._events is not None:
+            self._events.put(self._client)
+
+
 class DatabaseClient:
+    # maximum number of page requests in flight for sources whose pages are known in advance
+    PREFETCH_PAGES = 4
+
     def __init__(self, source_name: SupportedSources):
         self._searches = {}
+        self._listeners = {}
+        self._relevance_filters = {}
+        self._lazy_searches = set()
         self._name = source_name
+        # guards only the dicts above, the state of each search has a lock of its own
+        self._searches_lock = threading.Lock()
 
     @property
     def name(self) -> SupportedSources:
         return self._name
 
+    def watch(self, search_id: UUID, events: queue.Queue):
+        """
+        Subscribe to changes of the search: the client is put to the given queue every time the status or the
+        limit of the search changes, so the caller doesn't need to poll search_status.
+        :param search_id: id of the search to watch
+        :type search_id: UUID
+        :param events: queue to put the client to
+        :type events: queue.Queue
+        """
+
+        with self._searches_lock:
+            self._listeners[search_id] = events
+
+    def filter_pages(self, search_id: UUID, relevance_filter):
+        """
+        Stop the search early once a result page is not relevant enough, the rest of its limit is left
+        to be distributed to other clients.
+        :param search_id: id of the search to filter
+        :type search_id: UUID
+        :param relevance_filter: filter with is_relevant(titles) method, see ranking.RelevanceFilter
+        """
+
+        with self._searches_lock:
+            self._relevance_filters[search_id] = relevance_filter
+
+    def parse_lazily(self, search_id: UUID):
+        """
+        Yield lazy documents in the search, see Document, e.g. when most of them are dropped by title.
+        :param search_id: id of the search
+        :type search_id: UUID
+        """
+
+        with self._searches_lock:
+            self._lazy_searches.add(search_id)
+
+    def _get_search(self, search_id: UUID) -> SearchState:
+        with self._searches_lock:
+            return self._searches[search_id]
+
     def _create_search(self, search_id: UUID, limit: int):
-        with threading.Lock():
-            self._searches[search_id] = {
-                'status': SearchStatus.WORKING,
-                'documents_to_pull': limit,
-                'documents_pulled': 0,
-                'kill_signal_occurred': False
-            }
+        with self._searches_lock:
+            lazy = search_id in self._lazy_searches
+            self._lazy_searches.discard(search_id)
+            self._searches[search_id] = SearchState(limit, self._listeners.pop(search_id, None),
+                                                    self._relevance_filters.pop(search_id, None), self, lazy)
 
     def _change_status(self, status: SearchStatus, search_id: UUID):
-        with threading.Lock():
-            self._searches[search_id]['status'] = status
+        search = self._get_search(search_id)
+        search.change_status(status)
         logging.info(f'Status for {self.name} changed to {status}.')
+        search.notify()
 
     def _terminate(self, search_id: UUID):
-        with threading.Lock():
-            self._searches[search_id]['kill_signal_occurred'] = True
-            self._searches[search_id]['status'] = SearchStatus.FINISHED
+        search = self._get_search(search_id)
+        search.terminate()
+        search.notify()
 
     def _documents_pulled(self, search_id: UUID) -> int:
-        with threading.Lock():
-            return self._searches[search_id]['documents_pulled']
+        return self._get_search(search_id).documents_pulled
+
+    def _page_is_relevant(self, search_id: UUID, page: list) -> bool:
+        """
+        :param page: raw results of one page, as passed to Document
+        :type page: list
+        :return: False if the search has a relevance filter and the page doesn't pass it
+        :rtype: bool
+        """
+
+        relevance_filter = self._get_search(search_id).relevance_filter
+        if relevance_filter is None:
+            return True
+
+        titles = [Document._clean_title(Document._load_title(raw_data, self.name)) for raw_data in page]
+        if relevance_filter.is_relevant(titles):
+            return True
+
+        logging.info(f'Page of {self.name} is not relevant enough, stopping early.')
+        return False
 
     def _kill_signal_occurred(self, search_id: UUID):
-        with threading.Lock():
-            return self._searches[search_id]['kill_signal_occurred']
+        return self._get_search(search_id).kill_signal_occurred
+
+    def _wait_for_limit(self, search_id: UUID) -> bool:
+        """
+        Block until the limit of the search is increased or the kill signal occurs.
+        :param search_id: id of the waiting search
+        :type search_id: UUID
+        :return: True if there are new documents to pull, False if the search was killed
+        :rtype: bool
+        """
+
+        if not self._get_search(search_id).wait_for_limit():
+            return False
+
+        self._change_status(SearchStatus.WORKING, search_id)
+        return True
 
     # note: don't call this manually
     def send_kill_signal(self, search_id: UUID):
-        with threading.Lock():
-            self._searches[search_id]['kill_signal_occurred'] = True
+        self._get_search(search_id).kill()
 
     def documents_to_pull(self, search_id: UUID) -> int:
-        with threading.Lock():
-            return self._searches[search_id]['documents_to_pull']
+        return self._get_search(search_id).documents_to_pull
 
-    def change_limit(self, search_id: UUID, delta: int):
-        with threading.Lock():
-            self._searches[search_id]['documents_to_pull'] = max(
-                0,
-                self._searches[search_id]['documents_to_pull'] + delta
-            )
+    def search_completed(self, search_id: UUID) -> bool:
+        """
+        :return: True if the search finished without being killed, so nothing the source returns for the query
+        was left unpulled, False if it was killed, e.g. once its limit was used up, or never started
+        :rtype: bool
+        """
 
-            if delta < 0:
-                self._searches[search_id]['documents_pulled'] -= delta
+        with self._searches_lock:
+            search = self._searches.get(search_id)
+
+        return search is not None and search.completed
+
+    def change_limit(self, search_id: UUID, delta: int):
+        self._get_search(search_id).change_limit(delta)
 
         if delta > 0:
             logging.info(f'Limit for {self.name} increased for {delta} documents.')
 
     def search_status(self, search_id: UUID) -> Union[SearchStatus, None]:
-        with threading.Lock():
-            search_info = self._searches.get(search_id)
-            if not search_info:
-                return
-            return search_info['status']
+        with self._searches_lock:
+            search = self._searches.get(search_id)
+
+        if not search:
+            return
+        return search.status
+
+    def search_publications(self, query: str, search_id: UUID, imit: int = 100,
+                            since: date = None) -> Iterator[Document]:
+        """
+        :param since: if set, pull only records published or indexed since this date; sources which can't
+        filter by date ignore it
+        :type since: date
+        """
 
-    def search_publications(self, query: str, search_id: UUID, imit: int = 100) -> Iterator[Document]:
         pass
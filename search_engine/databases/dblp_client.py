@@ -9,6 +9,7 @@ from uuid import UUID
 import requests
 
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources
+from utils.json_decoding import decode_json
 from utils.requests_manager import RequestsManager
 
 # TODO
@@ -32,7 +33,7 @@ class DBLPClient(DatabaseClient):
             return
 
         for n, result in enumerate(results):
-            yield Document(raw_data=dict(result), source=SupportedSources.DBLP)
+            yield Document(raw_data=result, source=SupportedSources.DBLP)
 
             if n + 1 == limit:
                 break
@@ -59,7 +60,7 @@ class DBLPClient(DatabaseClient):
                 return responses
 
             if response.status_code == 200:
-                response_json = response.json()
+                response_json = decode_json(response)
                 results_size = len(response_json['results'])
 
                 if results_size == 0:
@@ -0,0 +1,98 @@
+"""
+This module is used for parsing result pages into documents in worker processes.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Union
+
+from search_engine.databases.database_client import Document, SupportedSources
+
+# shipping a small page to a worker costs more than parsing it in place
+MIN_PAGE_SIZE = 20
+# payloads of these sources aren't plain JSON and are always parsed in place
+_IN_PLACE_SOURCES = frozenset({SupportedSources.ARXIV, SupportedSources.GOOGLE_SCHOLAR})
+
+
+def build_records(page: list, source: SupportedSources) -> List[tuple]:
+    """
+    Parse raw results of one page, runs in a worker process.
+    :return: compact picklable record of every result, see Document.fields
+    :rtype: List[tuple]
+    """
+
+    return [Document(raw_data, source).fields() for raw_data in page]
+
+
+def build_documents(page: list, source: SupportedSources, pool: ProcessPoolExecutor = None,
+                    lazy: bool = False) -> List[Document]:
+    """
+    Build documents of one page in a worker process of the pool, or in the calling thread if there is no pool.
+    The calling thread doesn't hold the GIL while it waits, so other clients keep working.
+    :param page: raw results as passed to Document
+    :type page: list
+    :param source: source of the results
+    :type source: SupportedSources
+    :param pool: pool to use, see default_document_pool
+    :type pool: ProcessPoolExecutor
+    :param lazy: build lazy documents, see Document; nothing is parsed up front, so they are built in place
+    :type lazy: bool
+    :rtype: List[Document]
+    """
+
+    if lazy:
+        return [Document(raw_data, source, lazy=True) for raw_data in page]
+
+    pool = pool if pool is not None else default_document_pool()
+    if pool is None or len(page) < MIN_PAGE_SIZE or source in _IN_PLACE_SOURCES:
+        return [Document(raw_data, source) for raw_data in page]
+
+    return [Document.from_fields(record) for record in pool.submit(build_records, page, source).result()]
+
+
+async def build_documents_async(page: list, source: SupportedSources, pool: ProcessPoolExecutor = None,
+                                lazy: bool = False) -> List[Document]:
+    """
+    Same as build_documents, but the event loop keeps running while the page is parsed.
+    """
+
+    if lazy:
+        return [Document(raw_data, source, lazy=True) for raw_data in page]
+
+    pool = pool if pool is not None else default_document_pool()
+    if pool is None or len(page) < MIN_PAGE_SIZE or source in _IN_PLACE_SOURCES:
+        return [Document(raw_data, source) for raw_data in page]
+
+    records = await asyncio.get_running_loop().run_in_executor(pool, build_records, page, source)
+    return [Document.from_fields(record) for record in records]
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_document_pool() -> Union[ProcessPoolExecutor, None]:
+    """
+    Pool used by all clients, created on first use. Documents are built in place unless DOCUMENT_WORKERS is set
+    to the number of worker processes, 0 means one per core.
+
+    Workers are started by a fork server where there is one and spawned elsewhere, never forked from the caller,
+    which runs client threads by then. Like spawned workers, they import the __main__ module of the caller, so
+    scripts using the pool have to guard their code with if __name__ == '__main__'.
+    """
+
+    global _default_pool
+
+    workers = os.getenv('DOCUMENT_WORKERS')
+    if workers is None or workers == '':
+        return None
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            workers = int(workers) or os.cpu_count()
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _default_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+    return _default_pool
@@ -1,9 +1,15 @@
 import logging
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
+
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
 from utils.requests_manager import RequestsManager
 
 
@@ -17,83 +23,85 @@ class InternetArchiveClient(DatabaseClient):
 
         super().__init__(SupportedSources.INTERNET_ARCHIVE)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query, search_id=search_id)
-
-        documents_pulled = self._documents_pulled(search_id)
-        counter = 0
+        lazy = self._get_search(search_id).lazy
 
-        for response in responses:
-            for raw_pub in response.get('results'):
-                yield Document(raw_pub, source=SupportedSources.INTERNET_ARCHIVE)
-                counter += 1
+        for page in self.__query_api(query, search_id=search_id):
+            yield from build_documents(page, SupportedSources.INTERNET_ARCHIVE, lazy=lazy)
 
-                if counter == documents_pulled:
-                    return
-
-    def __query_api(self, query: str, search_id: UUID = ''):
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '') -> Iterator[list]:
         offset = 0
         counter = 0
-
-        while self.documents_to_pull(search_id) > 0:
-            limit_ = min(InternetArchiveClient.MAX_LIMIT, self.documents_to_pull(search_id) - counter)
-            query_params = {'q': query, 'limit': limit_, 'offset': offset}
-
-            response = self._requests_manager.get(self._api_endpoint, params=query_params, headers=self._headers,
-                                                  max_failures=10)
-
-            if not response:
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                response_json = response.json()
-                results_size = len(response_json.get('results', []))
-                if results_size == 0:
+        # offset of the first record which hasn't been requested yet
+        next_offset = 0
+
+        with Prefetcher(self.PREFETCH_PAGES, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                # offsets of pages up to the limit are known in advance, so several of them are requested at once
+                end = offset + self.documents_to_pull(search_id) - counter
+                while not prefetcher.full and next_offset < end:
+                    limit_ = min(InternetArchiveClient.MAX_LIMIT, end - next_offset)
+                    query_params = {'q': query, 'limit': limit_, 'offset': next_offset}
+                    prefetcher.submit(next_offset, self._requests_manager.get, self._api_endpoint, params=query_params,
+                                      headers=self._headers, max_failures=10)
+                    next_offset += limit_
+
+                if not len(prefetcher):
+                    # all requested pages came back and the last one was shorter than requested
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(response_json)
-                offset += results_size
-                counter += results_size
+                page_offset, response = prefetcher.next()
+                if page_offset != offset:
+                    # an earlier page was shorter than requested, pages after it are requested again
+                    prefetcher.clear()
+                    next_offset = offset
+                    continue
 
-                if counter >= self.documents_to_pull(search_id):
+                if not response:
                     self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.WAITING, search_id)
-                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                    counter = 0
-
-                    kill = False
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
+                if response.status_code == 200:
+                    response_json = decode_json(response)
+                    results_size = len(response_json.get('results', []))
+                    if results_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                        time.sleep(5)
+                    yield response_json['results']
+                    offset += results_size
+                    counter += results_size
 
-                    if kill:
-                        logging.info(f'Kill signal for {self.name} occurred.')
+                    if not self._page_is_relevant(search_id, response_json['results']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
 
-            time.sleep(2)
-            logging.debug(f'internet archive: {offset}')
+                    if counter >= self.documents_to_pull(search_id):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.WAITING, search_id)
+                        logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                        counter = 0
+
+                        if not self._wait_for_limit(search_id):
+                            logging.info(f'Kill signal for {self.name} occurred.')
+                            break
+                else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
+
+                logging.debug(f'internet archive: {offset}')
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(InternetArchiveClient, self)._create_search(search_id, limit)
@@ -119,3 +127,36 @@ class InternetArchiveClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(InternetArchiveClient, self).change_limit(search_id, delta)
+
+
+class AsyncInternetArchiveClient(AsyncDatabaseClient):
+    MAX_LIMIT = 500
+    MAX_CONCURRENCY = 2
+
+    def __init__(self):
+        self._headers = {'accept': 'application/json'}
+        self._api_endpoint = 'https://scholar.archive.org/search'
+        super().__init__(SupportedSources.INTERNET_ARCHIVE)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        offset = 0
+
+        while True:
+            query_params = {'q': query, 'limit': min(AsyncInternetArchiveClient.MAX_LIMIT, page_size()), 'offset': offset}
+            response = await self._get(self._api_endpoint, params=query_params, headers=self._headers,
+                                       max_failures=10)
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            results = decode_json(response).get('results', [])
+
+            if not results:
+                break
+
+            offset += len(results)
+            yield results
@@ -1,11 +1,18 @@
 import logging
 import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
+from utils.rate_limiter import backoff
 from utils.requests_manager import RequestsManager
 
 
@@ -18,100 +25,94 @@ class OpenAlexClient(DatabaseClient):
 
         super().__init__(SupportedSources.OPENALEX)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id=search_id)
-        results = []
+        lazy = self._get_search(search_id).lazy
 
-        for response in responses:
-            results += response.get('results')
+        for page in self.__query_api(query.strip(), search_id=search_id, since=since):
+            yield from build_documents(page, SupportedSources.OPENALEX, lazy=lazy)
 
-        if not results:
-            return
-
-        documents_pulled = self._documents_pulled(search_id)
-
-        for n, result in enumerate(results):
-            yield Document(raw_data=dict(result), source=SupportedSources.OPENALEX)
-
-            if n + 1 == documents_pulled:
-                break
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '', since: date = None) -> Iterator[list]:
         total_results = 0
         counter = 0
         failures_number = 0
 
         max_limit = OpenAlexClient.MAX_LIMIT
         cursor = '*'
-        while self.documents_to_pull(search_id) > 0:
-            query_data = {'search': query, 'per-page': min(max_limit, self.documents_to_pull(search_id) - counter),
-                          'cursor': cursor}
-            response = self._requests_manager.get(self._api_endpoint, params=query_data, max_failures=10)
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                result_json = response.json()
-                result_size = len(result_json.get('results', []))
 
-                if result_size == 0:
+        def request(documents_number: int):
+            query_data = {'search': query, 'per-page': min(max_limit, documents_number), 'cursor': cursor}
+            if since:
+                query_data['filter'] = f'from_publication_date:{since.isoformat()}'
+            prefetcher.submit(cursor, self._requests_manager.get, self._api_endpoint, params=query_data,
+                              max_failures=10)
+
+        # the next page can't be requested before the cursor is known, but it is requested as soon as it is,
+        # so the request is in flight while the current page is processed
+        with Prefetcher(1, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                if not len(prefetcher):
+                    request(self.documents_to_pull(search_id) - counter)
+                _, response = prefetcher.next()
+
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(result_json)
-                total_results += result_size
-                counter += result_size
-                cursor = result_json['meta'].get('next_cursor')
+                if response.status_code == 200:
+                    result_json = decode_json(response)
+                    result_size = len(result_json.get('results', []))
 
-                if counter >= self.documents_to_pull(search_id):
-                    self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.WAITING, search_id)
-                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                    counter = 0
+                    if result_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                    kill = False
+                    cursor = result_json['meta'].get('next_cursor')
+                    if cursor and self.documents_to_pull(search_id) - counter - result_size > 0:
+                        request(self.documents_to_pull(search_id) - counter - result_size)
 
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
+                    yield result_json['results']
+                    total_results += result_size
+                    counter += result_size
+
+                    if not self._page_is_relevant(search_id, result_json['results']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                        time.sleep(5)
+                    if counter >= self.documents_to_pull(search_id):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.WAITING, search_id)
+                        logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                        counter = 0
+
+                        if not self._wait_for_limit(search_id):
+                            logging.info(f'Kill signal for {self.name} occurred.')
+                            break
 
-                    if kill:
-                        logging.info(f'Kill signal for {self.name} occurred.')
+                    if not cursor:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
+                else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+
+                    if failures_number < 20:
+                        failures_number += 1
+                        time.sleep(backoff(failures_number))
+                        continue
 
-                if not cursor:
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-
-                if failures_number < 20:
-                    failures_number += 1
-                    time.sleep(10)
-                    continue
-
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
 
-            logging.debug(f'openalex: {total_results}')
+                logging.debug(f'openalex: {total_results}')
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(OpenAlexClient, self)._create_search(search_id, limit)
@@ -137,3 +138,37 @@ class OpenAlexClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(OpenAlexClient, self).change_limit(search_id, delta)
+
+
+class AsyncOpenAlexClient(AsyncDatabaseClient):
+    MAX_LIMIT = 200
+    MAX_CONCURRENCY = 4
+
+    def __init__(self):
+        self._api_endpoint = 'https://api.openalex.org/works'
+        super().__init__(SupportedSources.OPENALEX)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        cursor = '*'
+
+        while cursor:
+            query_data = {'search': query, 'per-page': min(AsyncOpenAlexClient.MAX_LIMIT, page_size()), 'cursor': cursor}
+            if since:
+                query_data['filter'] = f'from_publication_date:{since.isoformat()}'
+            response = await self._get(self._api_endpoint, params=query_data, max_failures=10)
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            result_json = decode_json(response)
+            results = result_json.get('results', [])
+
+            if not results:
+                break
+
+            cursor = result_json['meta'].get('next_cursor')
+            yield results
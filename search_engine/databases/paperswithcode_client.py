@@ -1,11 +1,16 @@
 import logging
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
 from utils.requests_manager import RequestsManager
 
 
@@ -18,99 +23,93 @@ class PapersWithCodeClient(DatabaseClient):
 
         super().__init__(SupportedSources.PAPERS_WITH_CODE)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id)
+        lazy = self._get_search(search_id).lazy
 
-        counter = 0
-        documents_pulled = self._documents_pulled(search_id)
-
-        for response in responses:
-            for pub in response['results']:
-                yield Document(pub, source=SupportedSources.PAPERS_WITH_CODE)
-                counter += 1
+        for page in self.__query_api(query.strip(), search_id):
+            yield from build_documents(page, SupportedSources.PAPERS_WITH_CODE, lazy=lazy)
 
-                if counter == documents_pulled:
-                    return
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '') -> Iterator[list]:
 
         page = 1
         total_results = 0
         counter = 0
-
-        while self.documents_to_pull(search_id) > 0:
-            request_limit = min(self.documents_to_pull(search_id) - counter, PapersWithCodeClient.MAX_LIMIT)
-            response = self._requests_manager.get(
-                self._api_endpoint,
-                headers={'accept': 'application/json'},
-                params={
-                    'q': query,
-                    'page': page,
-                    'items_per_page': request_limit
-                },
-                max_failures=10
-            )
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                response_json = response.json()
-                results_size = len(response_json['results'])
-
-                if results_size == 0:
-                    self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.FINISHED, search_id)
-                    break
-
-                responses.append(response_json)
-                total_results += results_size
-                counter += results_size
-
-                if results_size < request_limit:
+        # number of the first page which hasn't been requested yet
+        next_page = 1
+        # pages are numbered by their size, so it stays the same for the whole search
+        request_limit = min(self.documents_to_pull(search_id), PapersWithCodeClient.MAX_LIMIT)
+
+        with Prefetcher(self.PREFETCH_PAGES, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                # all pages up to the limit are known in advance, so several of them are requested at once
+                end = page + -(-(self.documents_to_pull(search_id) - counter) // request_limit)
+                while not prefetcher.full and next_page < end:
+                    prefetcher.submit(
+                        next_page,
+                        self._requests_manager.get,
+                        self._api_endpoint,
+                        headers={'accept': 'application/json'},
+                        params={
+                            'q': query,
+                            'page': next_page,
+                            'items_per_page': request_limit
+                        },
+                        max_failures=10
+                    )
+                    next_page += 1
+
+                _, response = prefetcher.next()
+
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
 
-            page += 1
-            logging.debug(f'papers_with_code: {total_results}')
+                if response.status_code == 200:
+                    response_json = decode_json(response)
+                    results_size = len(response_json['results'])
 
-            if counter >= self.documents_to_pull(search_id):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.WAITING, search_id)
-                logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                counter = 0
+                    if results_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                kill = False
+                    yield response_json['results']
+                    total_results += results_size
+                    counter += results_size
 
-                while True:
-                    if self._kill_signal_occurred(search_id):
-                        kill = True
+                    if not self._page_is_relevant(search_id, response_json['results']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
-                    if self.documents_to_pull(search_id) > 0:
-                        self._change_status(SearchStatus.WORKING, search_id)
+
+                    if results_size < request_limit:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
+                else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-                    time.sleep(5)
+                page += 1
+                logging.debug(f'papers_with_code: {total_results}')
 
-                if kill:
-                    logging.info(f'Kill signal for {self.name} occurred.')
-                    break
+                if counter >= self.documents_to_pull(search_id):
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.WAITING, search_id)
+                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                    counter = 0
 
-            time.sleep(2)
+                    if not self._wait_for_limit(search_id):
+                        logging.info(f'Kill signal for {self.name} occurred.')
+                        break
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(PapersWithCodeClient, self)._create_search(search_id, limit)
@@ -136,3 +135,47 @@ class PapersWithCodeClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(PapersWithCodeClient, self).change_limit(search_id, delta)
+
+
+class AsyncPapersWithCodeClient(AsyncDatabaseClient):
+    MAX_LIMIT = 500
+    MAX_CONCURRENCY = 2
+
+    def __init__(self):
+        self._api_endpoint = 'https://paperswithcode.com/api/v1/search/'
+        super().__init__(SupportedSources.PAPERS_WITH_CODE)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        # page numbers only make sense with a fixed page size
+        request_limit = min(page_size(), AsyncPapersWithCodeClient.MAX_LIMIT)
+        page = 1
+
+        while True:
+            response = await self._get(
+                self._api_endpoint,
+                headers={'accept': 'application/json'},
+                params={
+                    'q': query,
+                    'page': page,
+                    'items_per_page': request_limit
+                },
+                max_failures=10
+            )
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            results = decode_json(response)['results']
+
+            if not results:
+                break
+
+            page += 1
+            yield results
+
+            if len(results) < request_limit:
+                break
@@ -0,0 +1,217 @@
+"""
+This module is used for finding clients of sources, including sources added by plugins.
+"""
+import importlib
+import logging
+import threading
+from enum import Enum
+from typing import Any, Callable, Dict, List, Union
+
+from search_engine.databases.database_client import SupportedSources
+
+# plugins register sources under this entry point group, the name of an entry point is the value of its source
+ENTRY_POINT_GROUP = 'scientific_knowledge_distiller.sources'
+
+
+class Source:
+    """
+    Everything the search needs to know about a source. Clients are given as 'module:attribute' paths and
+    imported when the first client is created, so only modules of requested sources are loaded.
+
+    Payloads of built-in sources are parsed by Document itself. A plugin source passes a loader, which returns
+    fields of the document, i.e. a dict with any of title, abstract, publication_date, authors, journal,
+    volume, doi and urls, and optionally quicker loaders of the title and of the identifier of the publication
+    in the source.
+    """
+
+    def __init__(self, source: Enum, client: str = None, async_client: str = None,
+                 loader: Callable[[Any], dict] = None, title_loader: Callable[[Any], str] = None,
+                 native_id_loader: Callable[[Any], Union[str, None]] = None):
+        """
+        :param source: member of SupportedSources, or of an enum of the plugin
+        :type source: Enum
+        :param client: path of the DatabaseClient subclass, e.g. 'package.module:Client'
+        :type client: str
+        :param async_client: path of the AsyncDatabaseClient subclass
+        :type async_client: str
+        :param loader: builds fields of a document from a payload, required for sources of plugins
+        :type loader: Callable[[Any], dict]
+        :param title_loader: reads the title from a payload, the loader is used if not set
+        :type title_loader: Callable[[Any], str]
+        :param native_id_loader: reads the identifier of the publication in the source from a payload
+        :type native_id_loader: Callable[[Any], Union[str, None]]
+        """
+
+        assert isinstance(source, SupportedSources) or loader is not None, \
+            f'Source {source} of a plugin needs a loader'
+
+        self.source = source
+        self.client = client
+        self.async_client = async_client
+        self._loader = loader
+        self._title_loader = title_loader
+        self._native_id_loader = native_id_loader
+
+    def load(self, raw_data) -> dict:
+        return self._loader(raw_data)
+
+    def load_title(self, raw_data) -> str:
+        if self._title_loader is not None:
+            return self._title_loader(raw_data)
+        return self.load(raw_data).get('title', '')
+
+    def load_native_id(self, raw_data) -> Union[str, None]:
+        return self._native_id_loader(raw_data) if self._native_id_loader is not None else None
+
+
+_BUILTIN_SOURCES = {
+    spec.source: spec for spec in (
+        Source(SupportedSources.ARXIV,
+               'search_engine.databases.arxiv_client:ArXivClient',
+               'search_engine.databases.arxiv_client:AsyncArXivClient'),
+        Source(SupportedSources.CORE,
+               'search_engine.databases.core_client:CoreClient',
+               'search_engine.databases.core_client:AsyncCoreClient'),
+        Source(SupportedSources.INTERNET_ARCHIVE,
+               'search_engine.databases.internet_archive_client:InternetArchiveClient',
+               'search_engine.databases.internet_archive_client:AsyncInternetArchiveClient'),
+        Source(SupportedSources.SEMANTIC_SCHOLAR,
+               'search_engine.databases.semantic_scholar_client:SematicScholarClient',
+               'search_engine.databases.semantic_scholar_client:AsyncSematicScholarClient'),
+        Source(SupportedSources.UNPAYWALL,
+               'search_engine.databases.unpaywall_client:UnpaywallClient',
+               'search_engine.databases.unpaywall_client:AsyncUnpaywallClient'),
+        Source(SupportedSources.CROSSREF,
+               'search_engine.databases.crossref_client:CrossrefClient',
+               'search_engine.databases.crossref_client:AsyncCrossrefClient'),
+        Source(SupportedSources.OPENALEX,
+               'search_engine.databases.openalex_client:OpenAlexClient',
+               'search_engine.databases.openalex_client:AsyncOpenAlexClient'),
+        Source(SupportedSources.PAPERS_WITH_CODE,
+               'search_engine.databases.paperswithcode_client:PapersWithCodeClient',
+               'search_engine.databases.paperswithcode_client:AsyncPapersWithCodeClient'),
+        # the scraping client is disabled, payloads stored earlier can still be loaded
+        Source(SupportedSources.GOOGLE_SCHOLAR),
+    )
+}
+
+_plugin_sources: Dict[str, Source] = {}
+_plugins_lock = threading.Lock()
+
+
+def register_source(spec: Source):
+    """
+    Add a source, or replace the one with the same value. Plugins installed as packages don't need to call it,
+    their entry points are loaded when their source is requested.
+    :param spec: the source
+    :type spec: Source
+    """
+
+    with _plugins_lock:
+        _plugin_sources[spec.source.value] = spec
+
+
+def get_source(source: Union[Enum, str]) -> Source:
+    """
+    :param source: member of SupportedSources or of an enum of a plugin, or its value
+    :type source: Union[Enum, str]
+    :rtype: Source
+    """
+
+    value = source.value if isinstance(source, Enum) else source
+    with _plugins_lock:
+        spec = _plugin_sources.get(value)
+    if spec is not None:
+        return spec
+
+    try:
+        return _BUILTIN_SOURCES[SupportedSources(value)]
+    except ValueError:
+        pass
+
+    _load_plugin(value)
+    with _plugins_lock:
+        spec = _plugin_sources.get(value)
+    if spec is None:
+        raise ValueError(f'Unsupported source: {source}')
+    return spec
+
+
+def resolve_source(value: str) -> Enum:
+    """
+    :param value: value of a source, e.g. as stored in a publication store
+    :type value: str
+    :return: member of SupportedSources or of an enum of a plugin
+    :rtype: Enum
+    """
+
+    return get_source(value).source
+
+
+def available_sources() -> List[Enum]:
+    """
+    :return: all sources which have a client, plugins are loaded to find them
+    :rtype: List[Enum]
+    """
+
+    for entry_point in _entry_points():
+        if entry_point.name not in _plugin_sources:
+            _load_plugin(entry_point.name)
+
+    with _plugins_lock:
+        # a plugin may replace a built-in source
+        specs = {**{source.value: spec for source, spec in _BUILTIN_SOURCES.items()}, **_plugin_sources}
+    return [spec.source for spec in specs.values() if spec.client is not None or spec.async_client is not None]
+
+
+def create_client(source: Union[Enum, str]):
+    """
+    Create a synchronous client, its module is imported on first use.
+    :rtype: DatabaseClient
+    """
+
+    spec = get_source(source)
+    if spec.client is None:
+        raise ValueError(f'Source {spec.source} has no client')
+    return _import(spec.client)()
+
+
+def create_async_client(source: Union[Enum, str]):
+    """
+    Create an asyncio client, its module is imported on first use.
+    :rtype: AsyncDatabaseClient
+    """
+
+    spec = get_source(source)
+    if spec.async_client is None:
+        raise ValueError(f'Source {spec.source} has no asyncio client')
+    return _import(spec.async_client)()
+
+
+def _import(path: str):
+    module_name, _, attribute = path.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def _entry_points():
+    # importing metadata of installed packages is slow, it is only needed when a source isn't built in
+    from importlib.metadata import entry_points
+    return entry_points(group=ENTRY_POINT_GROUP)
+
+
+def _load_plugin(value: str):
+    for entry_point in _entry_points():
+        if entry_point.name != value:
+            continue
+
+        try:
+            spec = entry_point.load()
+        except Exception as e:
+            logging.error(f'Could not load source {value} from {entry_point.value}: {e}')
+            return
+
+        # an entry point may also name a function which builds the source
+        spec = spec if isinstance(spec, Source) else spec()
+        register_source(spec)
+        logging.info(f'Source {value} loaded from {entry_point.value}')
+        return
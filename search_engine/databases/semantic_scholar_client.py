@@ -1,12 +1,17 @@
 import logging
 import os
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
 from utils.requests_manager import RequestsManager
 
 
@@ -20,106 +25,103 @@ class SematicScholarClient(DatabaseClient):
         self._api_key = os.getenv('SEMANTIC_SCHOLAR_API_KEY')
         super().__init__(SupportedSources.SEMANTIC_SCHOLAR)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id=search_id)
-        results = []
+        lazy = self._get_search(search_id).lazy
 
-        for response in responses:
-            results += response.get('data', [])
+        for page in self.__query_api(query.strip(), search_id=search_id):
+            yield from build_documents(page, SupportedSources.SEMANTIC_SCHOLAR, lazy=lazy)
 
-        if not results:
-            return
-
-        documents_pulled = self._documents_pulled(search_id)
-
-        for n, result in enumerate(results):
-            yield Document(raw_data=dict(result), source=SupportedSources.SEMANTIC_SCHOLAR)
-
-            if n + 1 == documents_pulled:
-                break
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
-        responses = []
+    def __query_api(self, query: str, search_id: UUID = '') -> Iterator[list]:
         total_results = 0
         counter = 0
-
-        while self.documents_to_pull(search_id) > 0:
-            limit_ = min(self.documents_to_pull(search_id) - counter, SematicScholarClient.MAX_LIMIT)
-
-            if total_results + limit_ >= 10000:
-                limit_ = 9999 - total_results
-
-            response = self._requests_manager.get(
-                f'{self._api_endpoint}',
-                params={
-                    'query': query,
-                    'limit': limit_,
-                    'offset': total_results,
-                    'fields': 'externalIds,url,title,abstract,venue,publicationVenue,year,referenceCount,'
-                              'isOpenAccess,openAccessPdf,publicationDate,authors,journal'
-                },
-                headers={
-                    'api-key': self._api_key
-                },
-                max_failures=10
-            )
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                result_json = response.json()
-                result_size = len(result_json.get('data', []))
-
-                if result_size == 0:
+        # offset of the first record which hasn't been requested yet
+        next_offset = 0
+
+        with Prefetcher(self.PREFETCH_PAGES, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                # offsets of pages up to the limit are known in advance, so several of them are requested at once;
+                # the API returns no more than 9999 records for a query
+                end = min(total_results + self.documents_to_pull(search_id) - counter, 9999)
+                while not prefetcher.full and next_offset < end:
+                    limit_ = min(end - next_offset, SematicScholarClient.MAX_LIMIT)
+                    prefetcher.submit(
+                        next_offset,
+                        self._requests_manager.get,
+                        f'{self._api_endpoint}',
+                        params={
+                            'query': query,
+                            'limit': limit_,
+                            'offset': next_offset,
+                            'fields': 'externalIds,url,title,abstract,venue,publicationVenue,year,referenceCount,'
+                                      'isOpenAccess,openAccessPdf,publicationDate,authors,journal'
+                        },
+                        headers={
+                            'api-key': self._api_key
+                        },
+                        max_failures=10
+                    )
+                    next_offset += limit_
+
+                if not len(prefetcher):
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(result_json)
-                total_results += result_size
-                counter += result_size
+                offset, response = prefetcher.next()
+                if offset != total_results:
+                    # a page was shorter than requested or has to be requested again, so are pages after it
+                    prefetcher.clear()
+                    next_offset = total_results
+                    continue
 
-                if counter >= self.documents_to_pull(search_id):
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
-                    self._change_status(SearchStatus.WAITING, search_id)
-                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                    counter = 0
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-                    kill = False
+                if response.status_code == 200:
+                    result_json = decode_json(response)
+                    result_size = len(result_json.get('data', []))
 
-                    while True:
-                        if self._kill_signal_occurred(search_id):
-                            kill = True
-                            break
-                        if self.documents_to_pull(search_id) > 0:
-                            self._change_status(SearchStatus.WORKING, search_id)
-                            break
+                    if result_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                        time.sleep(5)
+                    yield result_json['data']
+                    total_results += result_size
+                    counter += result_size
 
-                    if kill:
-                        logging.info(f'Kill signal for {self.name} occurred.')
+                    if not self._page_is_relevant(search_id, result_json['data']):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
 
-            elif response.status_code == 429:
-                print('Too many requests, waiting 15 secs...')
-                time.sleep(15)
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
+                    if counter >= self.documents_to_pull(search_id):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.WAITING, search_id)
+                        logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                        counter = 0
+
+                        if not self._wait_for_limit(search_id):
+                            logging.info(f'Kill signal for {self.name} occurred.')
+                            break
+
+                elif response.status_code == 429:
+                    # the rate limiter has paused requests to Semantic Scholar for as long as the API asked
+                    logging.error('Too many requests on Semantic Scholar, waiting for the rate limit to reset...')
+                else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-            logging.debug(f'semantic scholar: {total_results}')
-            time.sleep(1)
+                logging.debug(f'semantic scholar: {total_results}')
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(SematicScholarClient, self)._create_search(search_id, limit)
@@ -145,3 +147,50 @@ class SematicScholarClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(SematicScholarClient, self).change_limit(search_id, delta)
+
+
+class AsyncSematicScholarClient(AsyncDatabaseClient):
+    MAX_LIMIT = 100
+    MAX_CONCURRENCY = 1
+    # the search endpoint refuses offsets past this number
+    MAX_OFFSET = 9999
+
+    def __init__(self):
+        self._api_endpoint = 'https://api.semanticscholar.org/graph/v1/paper/search'
+        self._api_key = os.getenv('SEMANTIC_SCHOLAR_API_KEY')
+        super().__init__(SupportedSources.SEMANTIC_SCHOLAR)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        offset = 0
+
+        while offset < AsyncSematicScholarClient.MAX_OFFSET:
+            limit_ = min(page_size(), AsyncSematicScholarClient.MAX_LIMIT, AsyncSematicScholarClient.MAX_OFFSET - offset)
+            response = await self._get(
+                self._api_endpoint,
+                params={
+                    'query': query,
+                    'limit': limit_,
+                    'offset': offset,
+                    'fields': 'externalIds,url,title,abstract,venue,publicationVenue,year,referenceCount,'
+                              'isOpenAccess,openAccessPdf,publicationDate,authors,journal'
+                },
+                headers={
+                    'api-key': self._api_key
+                },
+                max_failures=10
+            )
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            results = decode_json(response).get('data', [])
+
+            if not results:
+                break
+
+            offset += len(results)
+            yield results
@@ -1,12 +1,17 @@
 import logging
 import os
-import time
-from typing import Iterator
+from datetime import date
+from typing import AsyncIterator, Callable, Iterator
 from uuid import UUID
 
+import httpx
 import requests
 
+from search_engine.databases.async_database_client import AsyncDatabaseClient
 from search_engine.databases.database_client import DatabaseClient, Document, SupportedSources, SearchStatus
+from search_engine.databases.document_pool import build_documents
+from utils.json_decoding import decode_json
+from utils.prefetch import Prefetcher
 from utils.requests_manager import RequestsManager
 
 
@@ -20,93 +25,86 @@ class UnpaywallClient(DatabaseClient):
 
         super().__init__(SupportedSources.UNPAYWALL)
 
-    def search_publications(self, query: str, search_id: UUID, limit: int = 100) -> Iterator[Document]:
+    def search_publications(self, query: str, search_id: UUID, limit: int = 100,
+                            since: date = None) -> Iterator[Document]:
         self._create_search(search_id, limit)
-        responses = self.__query_api(query.strip(), search_id=search_id)
+        lazy = self._get_search(search_id).lazy
 
-        documents_pulled = self._documents_pulled(search_id)
+        for page in self.__query_api(query.strip(), search_id=search_id):
+            yield from build_documents([pub['response'] for pub in page], SupportedSources.UNPAYWALL, lazy=lazy)
 
-        counter = 0
-        for response in responses:
-            for pub in response['results']:
-                yield Document(pub['response'], source=SupportedSources.UNPAYWALL)
-                counter += 1
-
-                if counter == documents_pulled:
-                    return
-
-    def __query_api(self, query: str, search_id: UUID = '') -> list:
+    def __query_api(self, query: str, search_id: UUID = '') -> Iterator[list]:
         endpoint = f'{self._api_endpoint}v2/search'
-        responses = []
 
         page = 1
         total_results = 0
         counter = 0
-
-        while self.documents_to_pull(search_id) > 0:
-            response = self._requests_manager.get(
-                endpoint,
-                params={
-                    'email': self.__auth_email,
-                    'query': query,
-                    'page': page
-                },
-                max_failures=10
-            )
-
-            if not isinstance(response, requests.Response):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
-
-            if response.status_code == 200:
-                response_json = response.json()
-                results_size = len(response_json['results'])
-
-                if results_size == 0:
+        # number of the first page which hasn't been requested yet
+        next_page = 1
+
+        with Prefetcher(self.PREFETCH_PAGES, str(self.name)) as prefetcher:
+            while self.documents_to_pull(search_id) > 0:
+                # pages have a fixed size, so all pages up to the limit are known in advance
+                end = page + -(-(self.documents_to_pull(search_id) - counter) // UnpaywallClient.MAX_LIMIT)
+                while not prefetcher.full and next_page < end:
+                    prefetcher.submit(
+                        next_page,
+                        self._requests_manager.get,
+                        endpoint,
+                        params={
+                            'email': self.__auth_email,
+                            'query': query,
+                            'page': next_page
+                        },
+                        max_failures=10
+                    )
+                    next_page += 1
+
+                _, response = prefetcher.next()
+
+                if not isinstance(response, requests.Response):
                     self.change_limit(search_id, -counter)
                     self._change_status(SearchStatus.FINISHED, search_id)
                     break
 
-                responses.append(response_json)
-                total_results += results_size
-                counter += results_size
-            else:
-                logging.error(f'Error code {response.status_code}, {response.content}')
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.FINISHED, search_id)
-                break
+                if response.status_code == 200:
+                    response_json = decode_json(response)
+                    results_size = len(response_json['results'])
 
-            page += 1
-            logging.debug(f'unpaywall: {total_results}')
-
-            if counter >= self.documents_to_pull(search_id):
-                self.change_limit(search_id, -counter)
-                self._change_status(SearchStatus.WAITING, search_id)
-                logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
-                counter = 0
+                    if results_size == 0:
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
+                        break
 
-                kill = False
+                    yield response_json['results']
+                    total_results += results_size
+                    counter += results_size
 
-                while True:
-                    if self._kill_signal_occurred(search_id):
-                        kill = True
-                        break
-                    if self.documents_to_pull(search_id) > 0:
-                        self._change_status(SearchStatus.WORKING, search_id)
+                    if not self._page_is_relevant(search_id, [pub['response'] for pub in response_json['results']]):
+                        self.change_limit(search_id, -counter)
+                        self._change_status(SearchStatus.FINISHED, search_id)
                         break
+                else:
+                    logging.error(f'Error code {response.status_code}, {response.content}')
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.FINISHED, search_id)
+                    break
 
-                    time.sleep(5)
+                page += 1
+                logging.debug(f'unpaywall: {total_results}')
 
-                if kill:
-                    logging.info(f'Kill signal for {self.name} occurred.')
-                    break
+                if counter >= self.documents_to_pull(search_id):
+                    self.change_limit(search_id, -counter)
+                    self._change_status(SearchStatus.WAITING, search_id)
+                    logging.info(f'Pulled {counter} docs from {self.name}. Total docs pulled: {self._documents_pulled(search_id)}')
+                    counter = 0
 
-            time.sleep(2)
+                    if not self._wait_for_limit(search_id):
+                        logging.info(f'Kill signal for {self.name} occurred.')
+                        break
 
         logging.info(f'Terminating {self.name} client. Docs pulled: {self._documents_pulled(search_id)}. Docs left: {self.documents_to_pull(search_id)}')
         self._terminate(search_id)
-        return responses
 
     def _create_search(self, search_id: UUID, limit: int):
         super(UnpaywallClient, self)._create_search(search_id, limit)
@@ -132,3 +130,43 @@ class UnpaywallClient(DatabaseClient):
 
     def change_limit(self, search_id: UUID, delta: int):
         super(UnpaywallClient, self).change_limit(search_id, delta)
+
+
+class AsyncUnpaywallClient(AsyncDatabaseClient):
+    MAX_LIMIT = 50
+    MAX_CONCURRENCY = 2
+
+    def __init__(self):
+        self.__auth_email = os.getenv('UNPAYWALL_EMAIL')
+        self._api_endpoint = 'https://api.unpaywall.org/'
+        super().__init__(SupportedSources.UNPAYWALL)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since: date = None) -> AsyncIterator[list]:
+        endpoint = f'{self._api_endpoint}v2/search'
+        page = 1
+
+        while True:
+            response = await self._get(
+                endpoint,
+                params={
+                    'email': self.__auth_email,
+                    'query': query,
+                    'page': page
+                },
+                max_failures=10
+            )
+
+            if not isinstance(response, httpx.Response):
+                break
+
+            if response.status_code != 200:
+                logging.error(f'Error code {response.status_code}, {response.content}')
+                break
+
+            results = decode_json(response)['results']
+
+            if not results:
+                break
+
+            page += 1
+            yield [pub['response'] for pub in results]
@@ -1,12 +1,16 @@
 import logging
+import queue
 import threading
-import time
 import uuid
-from typing import Iterable
+from datetime import datetime
+from typing import Iterable, Iterator
 
 from deduplication import Deduplicator
-from search_engine import databases
-from search_engine.databases.database_client import SupportedSources, Document, SearchStatus
+from ranking.relevance_filter import RelevanceFilter
+from search_engine.databases.database_client import SupportedSources, Document, DocumentBatch, SearchStatus
+from search_engine.databases import registry
+from storage.publication_store import PublicationStore, default_store
+from utils.transport import transport_stats
 
 logging.basicConfig(
     level=logging.INFO,
@@ -34,12 +38,38 @@ class Search:
                     SupportedSources.OPENALEX,
                     SupportedSources.PAPERS_WITH_CODE,
                     # SupportedSources.GOOGLE_SCHOLAR
-            )
+            ),
+            store: PublicationStore = None,
+            incremental: bool = False,
+            relevance_filter: RelevanceFilter = None,
+            lazy: bool = False
     ):
+        """
+        :param sources: members of SupportedSources, or of enums of plugins, see databases.registry
+        :type sources: tuple
+        :param store: store to save results to, see publication_store.default_store; results of a search with
+        a store are all publications the query found in this and previous runs
+        :type store: PublicationStore
+        :param incremental: ask sources only for records newer than the last run of the query saved in the store
+        :type incremental: bool
+        :param relevance_filter: stop a source once a page of its results is not relevant enough and give its
+        unused limit to other sources, see ranking.RelevanceFilter
+        :type relevance_filter: RelevanceFilter
+        :param lazy: yield lazy documents, which are parsed on first access to any field but the title, see Document
+        :type lazy: bool
+        """
+
         assert query, 'Query cannot be empty'
         assert limit >= len(sources), 'Limit must be greater then sources number'
         assert sources, 'Pass at least one source'
 
+        self._store = store if store is not None else default_store()
+        self._incremental = incremental
+        assert not incremental or self._store is not None, 'Incremental search needs a publication store'
+        self._since = {}
+        self._relevance_filter = relevance_filter
+        self._lazy = lazy
+
         self._remove_without_title = remove_without_title
         self._search_id = uuid.uuid4()
 
@@ -49,80 +79,128 @@ class Search:
         logging.info(f'Sources: {",".join([str(source) for source in sources])}')
 
         self._results = None
-        self._results_list = []
 
         self._query = query
         self._remove_duplicates = remove_duplicates
         self._deduplicator = Deduplicator()
 
         self._clients = []
-        if SupportedSources.ARXIV in sources:
-            self._clients.append(databases.ArXivClient())
-        if SupportedSources.CORE in sources:
-            self._clients.append(databases.CoreClient())
-        if SupportedSources.INTERNET_ARCHIVE in sources:
-            self._clients.append(databases.InternetArchiveClient())
-        if SupportedSources.SEMANTIC_SCHOLAR in sources:
-            self._clients.append(databases.SematicScholarClient())
-        if SupportedSources.UNPAYWALL in sources:
-            self._clients.append(databases.UnpaywallClient())
-        if SupportedSources.CROSSREF in sources:
-            self._clients.append(databases.CrossrefClient())
-        # if SupportedSources.DBLP in sources:
-        #     self._clients.append(databases.DBLPClient())
-        if SupportedSources.OPENALEX in sources:
-            self._clients.append(databases.OpenAlexClient())
-        if SupportedSources.PAPERS_WITH_CODE in sources:
-            self._clients.append(databases.PapersWithCodeClient())
-
-        self._limit_for_source = limit // len(sources)
+        for source in dict.fromkeys(sources):
+            try:
+                self._clients.append(registry.create_client(source))
+            except ValueError as e:
+                logging.warning(f'{e}, skipping it')
+        assert self._clients, 'No client could be created for given sources'
+
+        # sources without a client and repeated ones don't take a share of the limit
+        self._limit_for_source = limit // len(self._clients)
         logging.info(f'Initial limit for source: {self._limit_for_source}')
 
     def perform(self):
+        started = datetime.now()
+        self._results = DocumentBatch(self.stream())
+
+        total_documents = 0
+        for client in self._clients:
+            pulled = client._documents_pulled(self._search_id)
+            logging.info(f'{client.name}: {pulled}')
+            total_documents += pulled
+        logging.info(f'total documents: {total_documents}')
+
+        for host, stats in transport_stats().items():
+            logging.info(f'{host}: {stats["requests"]} requests over {stats["connections"]} connections')
+
+        if self._store is not None:
+            # a source killed once its limit was used up may have more records since its last run, so the next
+            # incremental run starts from the old date for it
+            runs = {client.name: started for client in self._clients if client.search_completed(self._search_id)}
+            self._results = DocumentBatch(self._store.update(
+                self._query, self._results, runs,
+                self._deduplicator if self._remove_duplicates else None, self._remove_without_title
+            ))
+        elif self._remove_duplicates:
+            self._deduplicate()
+
+    def stream(self, queue_size: int = 1000) -> Iterator[Document]:
+        """
+        Yield documents as soon as clients pull them, without waiting for the whole search to finish.
+        Documents are passed from client threads through a bounded queue, so slow consumers make
+        clients wait instead of piling up results in memory. Duplicates are not removed here.
+        :param queue_size: maximum number of documents waiting for the consumer
+        :type queue_size: int
+        :return: documents in the order they arrive from clients
+        :rtype: Iterator[Document]
+        """
+
+        if self._incremental:
+            self._since = {client.name: self._store.last_run(self._query, client.name) for client in self._clients}
+
+        documents = queue.Queue(maxsize=queue_size)
+        events = queue.Queue()
+        stopped = threading.Event()
+
+        coordinator = threading.Thread(target=self._coordinate, args=(documents, events, stopped), name='coordinator')
+        coordinator.start()
+
+        try:
+            while True:
+                document = documents.get()
+                if document is None:
+                    break
+                yield document
+        finally:
+            stopped.set()
+            # wake the coordinator up, it may be waiting for a status change
+            events.put(None)
+            coordinator.join()
+
+    def results(self) -> Iterable[Document]:
+        return self._results
+
+    def _coordinate(self, documents: queue.Queue, events: queue.Queue, stopped: threading.Event):
         threads = {}
         active_clients = {}
 
         for n, client in enumerate(self._clients):
             active_clients[n] = client
-            threads[n] = threading.Thread(target=self._search, args=(client,), name=str(client.name))
+            client.watch(self._search_id, events)
+            if self._relevance_filter is not None:
+                client.filter_pages(self._search_id, self._relevance_filter)
+            if self._lazy:
+                client.parse_lazily(self._search_id)
+            threads[n] = threading.Thread(target=self._search, args=(client, documents, events, stopped),
+                                          name=str(client.name))
 
         for thread_index in threads:
             threads[thread_index].start()
 
         while True:
-            clients_to_remove = []
-            threads_to_remove = []
-            docs_to_distribute = 0
-
-            if len(active_clients) == 0:
-                for thread_index in threads:
-                    while threads[thread_index].is_alive():
-                        time.sleep(1)
-                    threads[thread_index].join()
-                break
-            all_active_clients_are_waiting = True
-            for client_index in active_clients:
-                if active_clients[client_index].search_status(self._search_id) != SearchStatus.WAITING:
-                    all_active_clients_are_waiting = False
-            if all_active_clients_are_waiting:
+            if stopped.is_set():
                 for client_index in active_clients:
-                    active_clients[client_index].send_kill_signal(self._search_id)
+                    if active_clients[client_index].search_status(self._search_id) is not None:
+                        active_clients[client_index].send_kill_signal(self._search_id)
 
                 for thread_index in threads:
-                    while threads[thread_index].is_alive():
-                        time.sleep(1)
                     threads[thread_index].join()
-                break
+                return
+
+            clients_to_remove = []
+            docs_to_distribute = 0
 
             for index in active_clients:
                 status = active_clients[index].search_status(self._search_id)
 
-                if status == SearchStatus.FINISHED:
-                    docs_to_distribute += active_clients[index].documents_to_pull(self._search_id)
+                # a client which died without finishing the search won't change its status anymore
+                if status == SearchStatus.FINISHED or not threads[index].is_alive():
+                    if status is not None:
+                        docs_to_distribute += active_clients[index].documents_to_pull(self._search_id)
                     clients_to_remove.append(index)
             for index in clients_to_remove:
                 del active_clients[index]
 
+            if len(active_clients) == 0:
+                break
+
             if docs_to_distribute > len(active_clients):
                 docs_for_active_client = docs_to_distribute // len(active_clients)
                 logging.info(f'Found {docs_to_distribute} docs to distribute. Docs for each client: {docs_for_active_client}')
@@ -130,35 +208,48 @@ class Search:
                 for client_index in active_clients:
                     active_clients[client_index].change_limit(self._search_id, docs_for_active_client)
 
-            for thread_index in threads:
-                if not threads[thread_index].is_alive():
-                    threads[thread_index].join()
-                    threads_to_remove.append(thread_index)
-            for index in threads_to_remove:
-                del threads[index]
-
-            time.sleep(2)
-
-        self._results = self._results_list
-
-        total_documents = 0
-        for client in self._clients:
-            pulled = client._documents_pulled(self._search_id)
-            logging.info(f'{client.name}: {pulled}')
-            total_documents += pulled
-        logging.info(f'total documents: {total_documents}')
-
-        if self._remove_duplicates:
-            self._deduplicate()
-
-    def results(self) -> Iterable[Document]:
-        return self._results
+            all_active_clients_are_waiting = True
+            for client_index in active_clients:
+                if active_clients[client_index].search_status(self._search_id) != SearchStatus.WAITING or \
+                        active_clients[client_index].documents_to_pull(self._search_id) > 0:
+                    all_active_clients_are_waiting = False
+            if all_active_clients_are_waiting:
+                for client_index in active_clients:
+                    active_clients[client_index].send_kill_signal(self._search_id)
+                break
 
-    def _search(self, client):
-        result = list(client.search_publications(self._query, self._search_id, self._limit_for_source))
+            # block until some client changes its status instead of polling all of them
+            events.get()
 
-        with threading.Lock():
-            self._results_list.extend(result)
+        for thread_index in threads:
+            threads[thread_index].join()
+
+        Search._put(documents, None, stopped)
+
+    def _search(self, client, documents: queue.Queue, events: queue.Queue, stopped: threading.Event):
+        publications = client.search_publications(self._query, self._search_id, self._limit_for_source,
+                                                  since=self._since.get(client.name))
+
+        try:
+            for document in publications:
+                if not Search._put(documents, document, stopped):
+                    publications.close()
+                    break
+        finally:
+            # let the coordinator notice the thread is gone even if the client failed
+            events.put(client)
+
+    @staticmethod
+    def _put(documents: queue.Queue, item, stopped: threading.Event) -> bool:
+        # give up as soon as the consumer stops reading, otherwise client threads would hang on a full queue
+        while not stopped.is_set():
+            try:
+                documents.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
 
     def _deduplicate(self):
-        self._results = self._deduplicator.deduplicate(self._remove_without_title, self._results)
+        self._results = DocumentBatch(self._deduplicator.deduplicate(self._remove_without_title, self._results))
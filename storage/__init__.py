@@ -0,0 +1,20 @@
+# modules are imported on first access, so the index can be used without importing the store and its
+# dependencies, and the other way round
+import importlib
+
+_STORAGE_MODULES = {
+    'PublicationStore': 'publication_store',
+    'default_store': 'publication_store',
+    'InvertedIndex': 'inverted_index',
+}
+
+__all__ = list(_STORAGE_MODULES)
+
+
+def __getattr__(name: str):
+    if name not in _STORAGE_MODULES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    value = getattr(importlib.import_module(f'{__name__}.{_STORAGE_MODULES[name]}'), name)
+    globals()[name] = value
+    return value
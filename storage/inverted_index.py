@@ -0,0 +1,337 @@
+"""
+This module is used for querying harvested publications offline.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+from search_engine.databases.database_client import Document
+
+# weight of a term occurrence in every indexed field of Document.to_dict()
+FIELD_WEIGHTS = {'title': 2.0, 'abstract': 1.0, 'authors': 1.0, 'journal': 1.0}
+K1 = 1.2
+B = 0.75
+# segments are merged into one once there are more of them
+MAX_SEGMENTS = 8
+
+_TOKEN = re.compile(r'\w+')
+
+
+class InvertedIndex:
+    """
+    BM25 index over titles, abstracts, authors and journals of publications, kept in a directory.
+    Every call of add writes a new immutable segment: a JSON file with the vocabulary and ids of documents
+    and .npy files with postings, which are memory-mapped when the index is opened. Adding a document with
+    an id which is already indexed hides the older copy, and segments are merged once there are too many.
+    Term statistics are computed over all live documents, so scores don't depend on how documents are
+    split into segments.
+    """
+
+    def __init__(self, path: str, field_weights: dict = None, k1: float = K1, b: float = B):
+        self._path = path
+        self._field_weights = field_weights or FIELD_WEIGHTS
+        self._k1 = k1
+        self._b = b
+
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        manifest_path = os.path.join(path, 'index.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as file:
+                self._manifest = json.load(file)
+        else:
+            self._manifest = {'segments': [], 'next_segment': 0}
+
+        self._segments = [_Segment.load(path, name) for name in self._manifest['segments']]
+        # segment and position of the live copy of every indexed document
+        self._locations = {}
+        for segment in self._segments:
+            for position, doc_id in enumerate(segment.ids):
+                if segment.live[position]:
+                    self._locations[doc_id] = (segment, position)
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._locations
+
+    def add(self, documents: Iterable[Union[Document, dict]]):
+        """
+        Index documents as a new segment.
+        :param documents: documents or dicts returned by Document.to_dict
+        :type documents: Iterable[Union[Document, dict]]
+        """
+
+        ids = []
+        lengths = []
+        vocabulary = {}
+        # one entry per posting
+        term_indices = []
+        positions = []
+        frequencies = []
+        for document in documents:
+            if isinstance(document, Document):
+                document = document.to_dict()
+
+            term_frequencies = self._term_frequencies(document)
+            position = len(ids)
+            ids.append(document['id'])
+            lengths.append(sum(term_frequencies.values()))
+            term_indices.extend([vocabulary.setdefault(term, len(vocabulary)) for term in term_frequencies])
+            positions.extend([position] * len(term_frequencies))
+            frequencies.extend(term_frequencies.values())
+
+        if not ids:
+            return
+
+        # a document indexed twice in one call is kept in its last version
+        last_positions = {doc_id: position for position, doc_id in enumerate(ids)}
+
+        with self._lock:
+            name = f'segment-{self._manifest["next_segment"]:06d}'
+            segment = _Segment.write(self._path, name, ids, lengths, list(vocabulary), np.array(term_indices),
+                                     np.array(positions), np.array(frequencies))
+            segment.live[:] = [last_positions[doc_id] == position for position, doc_id in enumerate(ids)]
+
+            self._replace_documents(segment)
+            segment.save_live()
+
+            self._segments.append(segment)
+            self._manifest['segments'].append(name)
+            self._manifest['next_segment'] += 1
+
+            if len(self._segments) > MAX_SEGMENTS:
+                self._merge()
+            self._save_manifest()
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        :param query: words to look for, a document matches if it has any of them
+        :type query: str
+        :param limit: maximum number of results
+        :type limit: int
+        :return: ids of the best matching documents with their BM25 scores, best first
+        :rtype: List[Tuple[str, float]]
+        """
+
+        terms = set(_tokens(query))
+
+        # merging removes files of segments, so queries don't run at the same time as adding
+        with self._lock:
+            if not terms or not self._locations:
+                return []
+
+            return self._search(terms, limit)
+
+    def merge(self):
+        """
+        Merge all segments into one, dropping hidden copies of documents.
+        """
+
+        with self._lock:
+            self._merge()
+            self._save_manifest()
+
+    def _search(self, terms: set, limit: int) -> List[Tuple[str, float]]:
+        documents_number = len(self._locations)
+        average_length = sum(float(segment.lengths[segment.live].sum()) for segment in self._segments) / \
+            documents_number
+
+        # document frequencies over live documents of all segments
+        frequencies = {term: sum(segment.document_frequency(term) for segment in self._segments) for term in terms}
+
+        results = []
+        for segment in self._segments:
+            scores = np.zeros(len(segment.ids), dtype=np.float32)
+            norms = self._k1 * (1 - self._b + self._b * segment.lengths / average_length)
+
+            for term in terms:
+                if not frequencies[term]:
+                    continue
+
+                positions, term_frequencies = segment.postings(term)
+                if not len(positions):
+                    continue
+
+                idf = np.log(1 + (documents_number - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+                scores[positions] += idf * term_frequencies * (self._k1 + 1) / (term_frequencies + norms[positions])
+
+            scores[~segment.live] = 0
+            matched = np.flatnonzero(scores)
+            if len(matched) > limit:
+                matched = matched[np.argpartition(-scores[matched], limit)[:limit]]
+            results.extend((segment.ids[position], float(scores[position])) for position in matched)
+
+        results.sort(key=lambda result: -result[1])
+        return results[:limit]
+
+    def _term_frequencies(self, document: dict) -> dict:
+        frequencies = {}
+        for field, weight in self._field_weights.items():
+            value = document.get(field)
+            if not value:
+                continue
+
+            text = ' '.join(str(item) for item in value) if isinstance(value, (list, tuple)) else str(value)
+            for term, count in Counter(_tokens(text)).items():
+                frequencies[term] = frequencies.get(term, 0) + count * weight
+
+        return frequencies
+
+    def _replace_documents(self, segment):
+        for position, doc_id in enumerate(segment.ids):
+            if not segment.live[position]:
+                continue
+
+            location = self._locations.get(doc_id)
+            if location is not None:
+                old_segment, old_position = location
+                old_segment.live[old_position] = False
+                old_segment.changed = True
+
+            self._locations[doc_id] = (segment, position)
+
+        for old_segment in self._segments:
+            if old_segment.changed:
+                old_segment.save_live()
+
+    def _merge(self):
+        if len(self._segments) < 2:
+            return
+
+        ids = []
+        lengths = []
+        vocabulary = {}
+        term_indices = []
+        positions = []
+        frequencies = []
+        for segment in self._segments:
+            # positions of live documents in the merged segment, -1 for hidden ones
+            new_positions = np.full(len(segment.ids), -1, dtype=np.int64)
+            live = np.flatnonzero(segment.live)
+            new_positions[live] = np.arange(len(ids), len(ids) + len(live))
+
+            ids.extend(segment.ids[position] for position in live)
+            lengths.append(segment.lengths[live])
+
+            # index of the term in the merged vocabulary for every posting of the segment
+            terms = sorted(segment.terms.items(), key=lambda item: item[1][0])
+            mapping = np.array([vocabulary.setdefault(term, len(vocabulary)) for term, _ in terms], dtype=np.int64)
+            segment_term_indices = np.repeat(mapping, [count for _, (_, count) in terms])
+
+            segment_positions = new_positions[segment.positions]
+            kept = segment_positions >= 0
+            term_indices.append(segment_term_indices[kept])
+            positions.append(segment_positions[kept])
+            frequencies.append(segment.frequencies[kept])
+
+        name = f'segment-{self._manifest["next_segment"]:06d}'
+        merged = _Segment.write(self._path, name, ids, np.concatenate(lengths), list(vocabulary),
+                                np.concatenate(term_indices), np.concatenate(positions), np.concatenate(frequencies))
+        merged.save_live()
+
+        old_segments = self._segments
+        self._segments = [merged]
+        self._manifest['segments'] = [name]
+        self._manifest['next_segment'] += 1
+        self._locations = {doc_id: (merged, position) for position, doc_id in enumerate(ids)}
+
+        # the manifest must point to the merged segment before files of the old ones are removed
+        self._save_manifest()
+        for segment in old_segments:
+            segment.remove()
+
+    def _save_manifest(self):
+        manifest_path = os.path.join(self._path, 'index.json')
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self._manifest, file)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+
+class _Segment:
+    """
+    Immutable part of the index: postings of every term are a slice of two arrays with positions of documents
+    in the segment and weighted term frequencies. Only the mask of live documents changes after writing.
+    """
+
+    def __init__(self, path: str, name: str, ids: list, terms: dict, lengths: np.ndarray, positions: np.ndarray,
+                 frequencies: np.ndarray, live: np.ndarray):
+        self.path = path
+        self.name = name
+        self.ids = ids
+        # offset and number of postings by term
+        self.terms = terms
+        self.lengths = lengths
+        self.positions = positions
+        self.frequencies = frequencies
+        self.live = live
+        self.changed = False
+
+    @classmethod
+    def write(cls, path: str, name: str, ids: list, lengths, terms: list, term_indices: np.ndarray,
+              positions: np.ndarray, frequencies: np.ndarray):
+        """
+        :param terms: vocabulary of the segment
+        :param term_indices: index of the term in terms for every posting
+        :param positions: position of the document in ids for every posting
+        :param frequencies: weighted frequency of the term in the document for every posting
+        """
+
+        # postings are grouped by term, in the order of terms
+        order = np.lexsort((positions, term_indices))
+        counts = np.bincount(term_indices.astype(np.int64), minlength=len(terms))
+        offsets = np.cumsum(counts) - counts
+        terms = {term: (int(offsets[index]), int(counts[index])) for index, term in enumerate(terms) if counts[index]}
+
+        prefix = os.path.join(path, name)
+        np.save(prefix + '.lengths.npy', np.asarray(lengths, dtype=np.float32))
+        np.save(prefix + '.positions.npy', positions[order].astype(np.int32))
+        np.save(prefix + '.frequencies.npy', frequencies[order].astype(np.float32))
+        with open(prefix + '.json', 'w', encoding='utf-8') as file:
+            json.dump({'ids': ids, 'terms': terms}, file, ensure_ascii=False)
+
+        return cls.load(path, name, np.ones(len(ids), dtype=bool))
+
+    @classmethod
+    def load(cls, path: str, name: str, live: np.ndarray = None):
+        prefix = os.path.join(path, name)
+        with open(prefix + '.json', encoding='utf-8') as file:
+            data = json.load(file)
+
+        if live is None:
+            live = np.load(prefix + '.live.npy')
+
+        return cls(path, name, data['ids'], data['terms'], np.load(prefix + '.lengths.npy', mmap_mode='r'),
+                   np.load(prefix + '.positions.npy', mmap_mode='r'),
+                   np.load(prefix + '.frequencies.npy', mmap_mode='r'), live)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        offset, count = self.terms.get(term, (0, 0))
+        return self.positions[offset:offset + count], self.frequencies[offset:offset + count]
+
+    def document_frequency(self, term: str) -> int:
+        positions, _ = self.postings(term)
+        return int(self.live[positions].sum())
+
+    def save_live(self):
+        np.save(os.path.join(self.path, self.name + '.live.npy'), self.live)
+        self.changed = False
+
+    def remove(self):
+        # memory maps keep the files open, they are dropped first
+        self.lengths = self.positions = self.frequencies = None
+        for suffix in ('.json', '.lengths.npy', '.positions.npy', '.frequencies.npy', '.live.npy'):
+            file_path = os.path.join(self.path, self.name + suffix)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
@@ -0,0 +1,342 @@
+"""
+This module is used for keeping deduplicated publications between runs of a search.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Iterable, List, Union
+
+from deduplication import Deduplicator, blocking
+from search_engine.databases.database_client import Document, SupportedSources
+from search_engine.databases.registry import resolve_source
+
+# ids or keys looked up in one query, stays below the limit of SQLite on the number of query parameters
+LOOKUP_CHUNK_SIZE = 500
+# version of the tables, older stores are migrated when opened
+SCHEMA_VERSION = 1
+
+
+class PublicationStore:
+    """
+    SQLite-backed store of merged, deduplicated publications. Every stored publication is a cluster: versions
+    merged into it are kept with it, and ids of versions are remembered, so records pulled again by a later
+    run are recognised without deduplication. The store also remembers which publications every query found
+    and when every source was last searched for it, which is what incremental searches start from.
+    Blocking keys of stored publications are kept too, so new records are deduplicated only against stored
+    publications they share a key with, not against the whole store.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS publications (id TEXT PRIMARY KEY, data TEXT)')
+        # ids of versions merged into stored publications
+        self._connection.execute('CREATE TABLE IF NOT EXISTS aliases (id TEXT PRIMARY KEY, publication_id TEXT)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS query_publications (query TEXT, publication_id TEXT, '
+            'PRIMARY KEY (query, publication_id))'
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs (query TEXT, source TEXT, started TEXT, PRIMARY KEY (query, source))'
+        )
+        # see Deduplicator.blocking_keys
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS blocking_keys (key TEXT, publication_id TEXT, '
+            'PRIMARY KEY (key, publication_id))'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS blocking_keys_publication_id ON blocking_keys (publication_id)'
+        )
+        if self._connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            # stores saved before blocking keys were kept
+            self._save_blocking_keys(list(self.publications()))
+            self._connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM publications').fetchone()[0]
+
+    def last_run(self, query: str, source: SupportedSources) -> Union[date, None]:
+        """
+        :return: date the last saved run of the query started searching the source, None if there was no run
+        :rtype: Union[date, None]
+        """
+
+        with self._lock:
+            row = self._connection.execute('SELECT started FROM runs WHERE query = ? AND source = ?',
+                                           (query.strip(), source.value)).fetchone()
+
+        return datetime.fromisoformat(row[0]).date() if row else None
+
+    def known_ids(self) -> set:
+        """
+        :return: ids of stored publications and of all their versions
+        :rtype: set
+        """
+
+        with self._lock:
+            ids = {row[0] for row in self._connection.execute('SELECT id FROM publications')}
+            ids.update(row[0] for row in self._connection.execute('SELECT id FROM aliases'))
+
+        return ids
+
+    def publications(self, query: str = None) -> Iterable[Document]:
+        """
+        :param query: if set, only publications found by this query
+        :type query: str
+        :return: stored publications
+        :rtype: Iterable[Document]
+        """
+
+        with self._lock:
+            if query is None:
+                rows = self._connection.execute('SELECT data FROM publications').fetchall()
+            else:
+                rows = self._connection.execute(
+                    'SELECT data FROM publications JOIN query_publications ON id = publication_id WHERE query = ?',
+                    (query.strip(),)
+                ).fetchall()
+
+        for row in rows:
+            yield _from_record(json.loads(row[0]))
+
+    def save(self, query: str, publications: Iterable[Document], found_ids: Iterable[str] = (),
+             runs: dict = None):
+        """
+        Store merged publications and link them to the query. Stored publications which were merged into one
+        of the given publications are replaced by it.
+        :param query: query which found the publications
+        :type query: str
+        :param publications: merged publications, as returned by Deduplicator.deduplicate_new
+        :type publications: Iterable[Document]
+        :param found_ids: ids of already stored publications or versions the query found again
+        :type found_ids: Iterable[str]
+        :param runs: start time of the run by searched source
+        :type runs: dict
+        """
+
+        query = query.strip()
+        publications = list(publications)
+
+        with self._lock:
+            for publication in publications:
+                self._save(query, publication)
+            self._save_blocking_keys(publications)
+
+            for found_id in found_ids:
+                row = self._connection.execute('SELECT publication_id FROM aliases WHERE id = ?',
+                                               (found_id,)).fetchone()
+                self._connection.execute('INSERT OR IGNORE INTO query_publications VALUES (?, ?)',
+                                         (query, row[0] if row else found_id))
+
+            for source, started in (runs or {}).items():
+                self._connection.execute('INSERT OR REPLACE INTO runs VALUES (?, ?, ?)',
+                                         (query, source.value, started.isoformat()))
+
+            self._connection.commit()
+
+    def update(self, query: str, documents: Iterable[Document], runs: dict = None,
+               deduplicator: Deduplicator = None, remove_without_title: bool = True) -> List[Document]:
+        """
+        Save results of a run of the query. Records stored before are only linked to the query, the others are
+        deduplicated against stored publications and saved.
+        :param query: search query
+        :type query: str
+        :param documents: documents pulled by the run
+        :type documents: Iterable[Document]
+        :param runs: start time of the run by searched source, only for sources which returned all their results,
+        the others are searched from the date of their previous run again by the next incremental run
+        :type runs: dict
+        :param deduplicator: deduplicator to merge new documents with, they are saved as they are if None
+        :type deduplicator: Deduplicator
+        :param remove_without_title: passed to the deduplicator
+        :type remove_without_title: bool
+        :return: publications found by the query in this and all previous runs
+        :rtype: List[Document]
+        """
+
+        documents = list(documents)
+        known_ids = self._stored_ids([document.id for document in documents])
+        found_ids = []
+        new = []
+        for document in documents:
+            (found_ids if document.id in known_ids else new).append(document)
+        logging.info(f'{len(found_ids)} documents are already stored, {len(new)} are new.')
+
+        if deduplicator is not None and new:
+            keys = set().union(*Deduplicator.blocking_keys(new))
+            candidates = self._publications_by_keys(keys)
+            logging.info(f'{len(candidates)} stored publications share blocking keys with new documents.')
+            new = list(deduplicator.deduplicate_new(new, candidates, remove_without_title))
+
+        self.save(query, new, [document.id for document in found_ids], runs)
+
+        return list(self.publications(query))
+
+    def clear(self):
+        with self._lock:
+            for table in ('publications', 'aliases', 'query_publications', 'runs', 'blocking_keys'):
+                self._connection.execute(f'DELETE FROM {table}')
+            self._connection.commit()
+
+    def _save(self, query: str, publication: Document):
+        self._connection.execute('INSERT OR REPLACE INTO publications VALUES (?, ?)',
+                                 (publication.id, json.dumps(_to_record(publication), ensure_ascii=False)))
+        self._connection.execute('INSERT OR IGNORE INTO query_publications VALUES (?, ?)', (query, publication.id))
+
+        for version in publication.versions:
+            version_id = version.get('id')
+            if not version_id or version_id == publication.id:
+                continue
+
+            self._connection.execute('INSERT OR REPLACE INTO aliases VALUES (?, ?)', (version_id, publication.id))
+            # the version may be a stored publication merged into this one by the last run
+            self._connection.execute('DELETE FROM publications WHERE id = ?', (version_id,))
+            self._connection.execute('UPDATE aliases SET publication_id = ? WHERE publication_id = ?',
+                                     (publication.id, version_id))
+            self._connection.execute('UPDATE OR IGNORE query_publications SET publication_id = ? '
+                                     'WHERE publication_id = ?', (publication.id, version_id))
+            self._connection.execute('DELETE FROM query_publications WHERE publication_id = ?', (version_id,))
+            self._connection.execute('UPDATE OR IGNORE blocking_keys SET publication_id = ? WHERE publication_id = ?',
+                                     (publication.id, version_id))
+            self._connection.execute('DELETE FROM blocking_keys WHERE publication_id = ?', (version_id,))
+
+    def _save_blocking_keys(self, publications: List[Document]):
+        if not publications:
+            return
+
+        self._connection.executemany(
+            'INSERT OR IGNORE INTO blocking_keys VALUES (?, ?)',
+            ((key, publication.id) for publication, keys in zip(publications, Deduplicator.blocking_keys(publications))
+             for key in keys)
+        )
+
+    def _stored_ids(self, ids: List[str]) -> set:
+        """
+        :return: those of given ids which are ids of stored publications or of their versions
+        :rtype: set
+        """
+
+        stored = set()
+        with self._lock:
+            for chunk in _chunks(list(dict.fromkeys(ids))):
+                placeholders = ', '.join('?' * len(chunk))
+                for table in ('publications', 'aliases'):
+                    stored.update(row[0] for row in self._connection.execute(
+                        f'SELECT id FROM {table} WHERE id IN ({placeholders})', chunk))
+
+        return stored
+
+    def _publications_by_keys(self, keys: Iterable[str]) -> List[Document]:
+        """
+        :return: stored publications with at least one of given blocking keys, keys of more publications
+        than blocking.max_key_block_size are skipped, as deduplication only chains such blocks
+        :rtype: List[Document]
+        """
+
+        ids_by_key = defaultdict(list)
+        with self._lock:
+            for chunk in _chunks(list(keys)):
+                for key, publication_id in self._connection.execute(
+                        f'SELECT key, publication_id FROM blocking_keys WHERE key IN ({", ".join("?" * len(chunk))})',
+                        chunk):
+                    ids_by_key[key].append(publication_id)
+
+            publication_ids = set()
+            for key, ids in ids_by_key.items():
+                max_block_size = blocking.max_key_block_size(key)
+                if max_block_size is None or len(ids) <= max_block_size:
+                    publication_ids.update(ids)
+
+            rows = []
+            for chunk in _chunks(sorted(publication_ids)):
+                rows.extend(self._connection.execute(
+                    f'SELECT data FROM publications WHERE id IN ({", ".join("?" * len(chunk))})', chunk))
+
+        return [_from_record(json.loads(row[0])) for row in rows]
+
+
+def _chunks(values: list) -> Iterable[list]:
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+def _to_record(document: Document) -> dict:
+    document.materialize()
+
+    return dict(
+        id=document.id,
+        source=document.source.value,
+        title=document.title,
+        abstract=document.abstract,
+        publication_date=_to_iso(document.publication_date),
+        authors=document.authors,
+        journal=document.journal,
+        volume=document.volume,
+        doi=document.doi,
+        urls=document.urls,
+        versions=[dict(version, source=version['source'].value,
+                       publication_date=_to_iso(version['publication_date'])) for version in document.versions]
+    )
+
+
+def _from_record(record: dict) -> Document:
+    fields = dict(
+        _title=record['title'],
+        _abstract=record['abstract'],
+        _publication_date=_from_iso(record['publication_date']),
+        _authors=record['authors'],
+        _source=resolve_source(record['source']),
+        _raw_data=None,
+        _journal=record['journal'],
+        _volume=record['volume'],
+        _doi=record['doi'],
+        _lang='',
+        _urls=record['urls'],
+        _versions=[dict(version, source=resolve_source(version['source']),
+                        publication_date=_from_iso(version['publication_date'])) for version in record['versions']],
+        _id=record['id'],
+        _keep_raw_data=False,
+        _loaded=True
+    )
+
+    return Document.from_fields(tuple(fields[slot] for slot in Document.__slots__))
+
+
+def _to_iso(value: Union[datetime, None]) -> Union[str, None]:
+    return value.isoformat() if value else None
+
+
+def _from_iso(value: Union[str, None]) -> Union[datetime, None]:
+    return datetime.fromisoformat(value) if value else None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store() -> Union[PublicationStore, None]:
+    """
+    Store used by searches unless another one is passed. Storing is off unless PUBLICATION_STORE_PATH is set.
+    """
+
+    global _default_store
+
+    path = os.getenv('PUBLICATION_STORE_PATH')
+    if not path:
+        return None
+
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PublicationStore(path)
+
+    return _default_store
@@ -0,0 +1,160 @@
+"""
+This module is used for answering requests of clients in tests, without network.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterator
+
+import arxiv
+import requests
+
+from search_engine.databases.async_database_client import AsyncDatabaseClient
+from search_engine.databases.database_client import DatabaseClient, Document, SearchStatus, SupportedSources
+
+
+def json_response(body: dict, status_code: int = 200) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = 'https://fake.api/'
+    response._content = json.dumps(body).encode('utf-8')
+    return response
+
+
+class FakeRequestsManager:
+    """
+    Stands in for RequestsManager: every request is answered by a function of its parameters.
+    """
+
+    def __init__(self, respond: Callable[[dict], dict]):
+        """
+        :param respond: returns the body of the response to a request with given parameters
+        :type respond: Callable[[dict], dict]
+        """
+
+        self._respond = respond
+        self._lock = threading.Lock()
+        self.requests = []
+
+    def get(self, url, params: dict = None, **kwargs) -> requests.Response:
+        with self._lock:
+            self.requests.append(params)
+        return json_response(self._respond(params or {}))
+
+
+def crossref_works(hits: int) -> Callable[[dict], dict]:
+    """
+    :param hits: number of records the query finds
+    :return: responder of the Crossref works API
+    """
+
+    def respond(params: dict) -> dict:
+        offset, rows = params['offset'], params['rows']
+        items = [{
+            'DOI': f'10.1000/crossref.{n}',
+            'title': [f'Crossref record {n}'],
+            'author': [{'family': f'Author{n}', 'given': 'Jane'}],
+            'published': {'date-parts': [[2020, 1, 1]]},
+            'URL': f'https://doi.org/10.1000/crossref.{n}'
+        } for n in range(offset, min(offset + rows, hits))]
+        return {'message': {'items': items}}
+
+    return respond
+
+
+def internet_archive_releases(hits: int) -> Callable[[dict], dict]:
+    """
+    :param hits: number of records the query finds
+    :return: responder of the scholar.archive.org search API
+    """
+
+    def respond(params: dict) -> dict:
+        offset, limit = params['offset'], params['limit']
+        results = [{
+            'key': f'work_{n}',
+            'biblio': {'title': f'Archived record {n}', 'release_year': 2019, 'contrib_names': [f'Author{n}']},
+            'access': []
+        } for n in range(offset, min(offset + limit, hits))]
+        return {'results': results}
+
+    return respond
+
+
+def arxiv_results(hits: int) -> Callable[..., Iterator[arxiv.Result]]:
+    """
+    :param hits: number of records the query finds
+    :return: replacement of arxiv.Client.results
+    """
+
+    def results(client, search, offset: int = 0) -> Iterator[arxiv.Result]:
+        for n in range(offset, hits):
+            yield arxiv.Result(
+                entry_id=f'http://arxiv.org/abs/2101.{n:05d}v1',
+                published=datetime(2021, 1, 1),
+                title=f'arXiv record {n}',
+                authors=[arxiv.Result.Author(f'Author{n}')],
+                summary='',
+            )
+
+    return results
+
+
+class WaitingFirstClient(DatabaseClient):
+    """
+    Client of Crossref-like records which reports it is waiting before it counts the documents it pulled,
+    with a pause in between.
+    """
+
+    def __init__(self, source: SupportedSources, hits: int, delay: float = 0.0):
+        super().__init__(source)
+        self._pages = crossref_works(hits)
+        self._hits = hits
+        self._delay = delay
+
+    def search_publications(self, query, search_id, limit=100, since=None):
+        self._create_search(search_id, limit)
+        pulled = 0
+
+        while self.documents_to_pull(search_id) > 0:
+            time.sleep(self._delay)
+            size = min(self.documents_to_pull(search_id), self._hits - pulled)
+            for raw_data in self._pages({'offset': pulled, 'rows': size})['message']['items']:
+                yield Document(raw_data, SupportedSources.CROSSREF)
+            pulled += size
+
+            if pulled == self._hits:
+                self.change_limit(search_id, -size)
+                self._change_status(SearchStatus.FINISHED, search_id)
+                break
+
+            self._change_status(SearchStatus.WAITING, search_id)
+            time.sleep(0.05)
+            self.change_limit(search_id, -size)
+
+            if not self._wait_for_limit(search_id):
+                break
+
+        self._terminate(search_id)
+
+
+class FakeAsyncClient(AsyncDatabaseClient):
+    """
+    Asyncio client of Crossref-like records.
+    """
+
+    def __init__(self, source: SupportedSources, hits: int):
+        super().__init__(source, requests_manager=object())
+        self._pages = crossref_works(hits)
+
+    async def pages(self, query: str, page_size: Callable[[], int], since=None) -> AsyncIterator[list]:
+        offset = 0
+        while True:
+            items = self._pages({'offset': offset, 'rows': min(100, page_size())})['message']['items']
+            if not items:
+                break
+            offset += len(items)
+            yield items
+
+    def to_document(self, raw_data: dict) -> Document:
+        return Document(raw_data, SupportedSources.CROSSREF)
@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from ranking import ann_index
+from ranking.ann_index import IVFIndex
+
+DIMENSION = 32
+QUERIES = 100
+K = 10
+
+
+def vectors(count: int, seed: int, centers: int = 50) -> np.ndarray:
+    # L2-normalized points around a few centers, as embeddings of documents on a few topics are
+    generator = np.random.default_rng(seed)
+    topics = np.random.default_rng(0).normal(size=(centers, DIMENSION))
+    points = topics[generator.integers(0, centers, count)] + 0.25 * generator.normal(size=(count, DIMENSION))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def ids(start: int, count: int) -> list:
+    return [f'doc{n}' for n in range(start, start + count)]
+
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.index = IVFIndex(self.path, DIMENSION)
+        self.queries = vectors(QUERIES, seed=1)
+
+    def recall(self, index: IVFIndex, probes: int = None) -> float:
+        found = 0
+        for query in self.queries:
+            exact = {doc_id for doc_id, _ in index.exact_search(query, K)}
+            found += len(exact & {doc_id for doc_id, _ in index.search(query, K, probes)})
+        return found / (K * QUERIES)
+
+    def test_recall_against_exact_search(self):
+        self.index.add(ids(0, 5000), vectors(5000, seed=0))
+        lists = len(self.index._centroids)
+
+        self.assertGreaterEqual(self.recall(self.index), 0.85)
+        self.assertGreaterEqual(self.recall(self.index, 4 * ann_index.PROBES), 0.98)
+        self.assertEqual(self.recall(self.index, lists), 1.0)
+
+    def test_small_index_is_searched_exhaustively(self):
+        self.index.add(ids(0, ann_index.MIN_TRAINING_SIZE - 1), vectors(ann_index.MIN_TRAINING_SIZE - 1, seed=0))
+
+        self.assertIsNone(self.index._centroids)
+        self.assertEqual(self.recall(self.index), 1.0)
+
+    def test_vectors_added_after_training_are_found(self):
+        self.index.add(ids(0, 2000), vectors(2000, seed=0))
+        added = vectors(500, seed=2)
+        self.index.add(ids(2000, 500), added)
+
+        for doc_id, embedding in zip(ids(2000, 500), added):
+            self.assertEqual(self.index.search(embedding, 1)[0][0], doc_id)
+
+    def test_reopened_index_gives_same_results(self):
+        self.index.add(ids(0, 2000), vectors(2000, seed=0))
+
+        reopened = IVFIndex(self.path)
+
+        for query in self.queries[:10]:
+            self.assertEqual(reopened.search(query, K), self.index.search(query, K))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from ranking.backends import SentenceTransformerBackend
+
+THREADS = 8
+
+
+class FakeSentenceTransformer:
+    loaded = 0
+
+    def __init__(self, model_name: str, device: str = 'cpu'):
+        # loading a model takes a while, which leaves room for other threads to start loading it too
+        time.sleep(0.1)
+        FakeSentenceTransformer.loaded += 1
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+class SentenceTransformerBackendTest(unittest.TestCase):
+    def test_model_is_loaded_once_by_concurrent_threads(self):
+        FakeSentenceTransformer.loaded = 0
+        module = types.ModuleType('sentence_transformers')
+        module.SentenceTransformer = FakeSentenceTransformer
+        backend = SentenceTransformerBackend('model')
+
+        with mock.patch.dict(sys.modules, sentence_transformers=module):
+            threads = [threading.Thread(target=backend.encode, args=(['text'],)) for _ in range(THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(FakeSentenceTransformer.loaded, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import asyncio
+import unittest
+from collections import Counter
+from unittest import mock
+
+from deduplication import Deduplicator
+from search_engine import batch_search
+from search_engine.async_search import AsyncSearch
+from search_engine.batch_search import BatchSearch
+from search_engine.databases.database_client import SupportedSources
+from tests.fakes import FakeAsyncClient
+
+SOURCES = (SupportedSources.CROSSREF, SupportedSources.OPENALEX)
+HITS = 50
+
+
+class QueryWorks(FakeAsyncClient):
+    """
+    Asyncio client of Crossref-like records which counts the queries it is asked for.
+    The query 'preprints' finds the same works without DOIs.
+    """
+
+    def __init__(self, source: SupportedSources, hits: int):
+        super().__init__(source, hits)
+        self.queries = Counter()
+
+    async def pages(self, query, page_size, since=None):
+        self.queries[query] += 1
+        async for items in super().pages(query, page_size, since):
+            yield [dict(item, DOI=None, URL=None) for item in items] if query == 'preprints' else items
+
+
+class BatchSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.clients = {source: QueryWorks(source, HITS) for source in SOURCES}
+
+    def search(self, queries, sources: tuple = (SupportedSources.CROSSREF,), **kwargs) -> BatchSearch:
+        search = BatchSearch(queries, HITS, sources=sources, **kwargs)
+        asyncio.run(search.perform())
+        return search
+
+    def test_clients_are_shared_between_queries(self):
+        with mock.patch.object(batch_search, 'create_async_clients', return_value=self.clients) as create, \
+                mock.patch.object(batch_search, 'AsyncSearch', side_effect=AsyncSearch) as searches:
+            self.search(['works', 'other works', 'more works'], SOURCES)
+
+        create.assert_called_once_with(SOURCES)
+        self.assertEqual(searches.call_count, 3)
+        for call in searches.call_args_list:
+            self.assertIs(call.args[5], self.clients)
+        for client in self.clients.values():
+            self.assertEqual(client.queries, Counter(['works', 'other works', 'more works']))
+
+    def test_repeated_queries_are_collapsed(self):
+        search = self.search(['works', ' works ', '', 'preprints', 'works', '  '], clients=self.clients)
+
+        self.assertEqual(search._queries, ['works', 'preprints'])
+        self.assertEqual(self.clients[SupportedSources.CROSSREF].queries, Counter(['works', 'preprints']))
+
+    def test_duplicates_are_removed_once_across_queries(self):
+        with mock.patch.object(Deduplicator, 'deduplicate', autospec=True,
+                               side_effect=Deduplicator.deduplicate) as deduplicate:
+            search = self.search(['works', 'other works', 'preprints'], clients=self.clients)
+
+        deduplicate.assert_called_once()
+        pulled = list(deduplicate.call_args.args[2])
+        # every query finds every work, in documents of its own
+        self.assertEqual(len(pulled), 3 * HITS)
+        self.assertEqual(len({document.id for document in pulled}), 2 * HITS)
+        self.assertEqual(len(list(search.results())), HITS)
+
+    def test_duplicates_are_kept_if_asked(self):
+        with mock.patch.object(Deduplicator, 'deduplicate') as deduplicate:
+            search = self.search(['works', 'preprints'], clients=self.clients, remove_duplicates=False)
+
+        deduplicate.assert_not_called()
+        self.assertEqual(len(list(search.results())), 2 * HITS)
+
+    def test_merged_versions_map_back_to_every_query_which_found_them(self):
+        search = self.search(['works', 'other works', 'preprints'], clients=self.clients)
+
+        for publication in search.results():
+            with self.subTest(doi=publication.doi):
+                self.assertTrue(publication.versions)
+                self.assertEqual(search.queries_of(publication), ['works', 'other works', 'preprints'])
+
+    def test_documents_map_back_only_to_queries_which_found_them(self):
+        search = self.search(['works', 'preprints'], clients=self.clients, remove_duplicates=False)
+
+        for document in search.results():
+            with self.subTest(document=document.id):
+                self.assertEqual(search.queries_of(document), ['preprints'] if document.doi is None else ['works'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+Benchmarks of the optimizations against the approaches they replaced. They take a while and print their timings,
+so they run only if BENCHMARKS is set, e.g. BENCHMARKS=1 python -m unittest tests.test_benchmarks
+"""
+import gc
+import os
+import queue
+import random
+import statistics
+import string
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from copy import deepcopy
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from ranking.ann_index import IVFIndex
+from search_engine import Search
+from search_engine.databases import registry
+from search_engine.databases.database_client import Document, DocumentBatch, SearchStatus, SupportedSources
+from tests.fakes import WaitingFirstClient, crossref_works
+from tests.test_search import perform
+
+benchmark = unittest.skipUnless(os.getenv('BENCHMARKS'), 'set BENCHMARKS=1 to run benchmarks')
+
+
+class PollingEvents(queue.Queue):
+    """
+    Events of the coordinator which it only notices on its next poll, as the coordinator
+    read the status of every client every two seconds before it was woken by events.
+    """
+
+    INTERVAL = 2
+
+    def get(self, block=True, timeout=None):
+        time.sleep(self.INTERVAL)
+        while not self.empty():
+            super().get()
+
+
+@benchmark
+class CoordinatorWakeUpBenchmark(unittest.TestCase):
+    # sources finishing one after another, each of them leaves a part of its limit to the others
+    HITS = {
+        SupportedSources.CROSSREF: 50,
+        SupportedSources.OPENALEX: 100,
+        SupportedSources.CORE: 150,
+        SupportedSources.SEMANTIC_SCHOLAR: 10000,
+    }
+    ROUNDS = 3
+
+    def latencies(self, polling: bool) -> list:
+        """
+        :return: seconds from a source finishing to the coordinator giving its unused limit to other sources
+        """
+
+        finished, redistributed = [], []
+        change_status, change_limit = WaitingFirstClient._change_status, WaitingFirstClient.change_limit
+
+        def record_status(client, status, search_id):
+            change_status(client, status, search_id)
+            if status == SearchStatus.FINISHED:
+                finished.append(time.perf_counter())
+
+        def record_limit(client, search_id, amount):
+            change_limit(client, search_id, amount)
+            if threading.current_thread().name == 'coordinator':
+                redistributed.append(time.perf_counter())
+
+        def events_queue(maxsize=0):
+            # only the queue of events is created without a size
+            return PollingEvents() if polling and not maxsize else queue.Queue(maxsize)
+
+        latencies = []
+        for _ in range(self.ROUNDS):
+            finished.clear()
+            redistributed.clear()
+            clients = {source: WaitingFirstClient(source, hits, delay=0.01) for source, hits in self.HITS.items()}
+
+            with mock.patch.object(registry, 'create_client', clients.get), \
+                    mock.patch.object(WaitingFirstClient, '_change_status', record_status), \
+                    mock.patch.object(WaitingFirstClient, 'change_limit', record_limit), \
+                    mock.patch('search_engine.search.queue', SimpleNamespace(Queue=events_queue, Full=queue.Full)):
+                search = Search('query', 1200, remove_duplicates=False, sources=tuple(self.HITS), store=None)
+                self.assertTrue(perform(search), 'search hung')
+
+            for finished_at in finished:
+                woken_at = min((at for at in redistributed if at >= finished_at), default=None)
+                if woken_at is not None:
+                    latencies.append(woken_at - finished_at)
+
+        return latencies
+
+    def test_events_wake_the_coordinator_sooner_than_polling(self):
+        polled, woken = self.latencies(polling=True), self.latencies(polling=False)
+
+        print(f'\ncoordinator wake-up latency over {len(polled)} and {len(woken)} redistributions: '
+              f'polling median {statistics.median(polled) * 1000:.1f} ms, '
+              f'events median {statistics.median(woken) * 1000:.1f} ms')
+        self.assertLess(statistics.median(woken) * 10, statistics.median(polled))
+
+
+class Author:
+    def __init__(self, name: str):
+        self._name = name
+
+
+class DictDocument:
+    """
+    Layout of a document before it had slots: fields in the instance dict, authors as objects,
+    a deep copy of the payload and a random salt of the id.
+    """
+
+    def __init__(self, raw_data: dict, source: SupportedSources):
+        parsed = Document(raw_data, source)
+
+        self._title = parsed.title
+        self._abstract = parsed.abstract
+        self._publication_date = parsed.publication_date
+        self._authors = [Author(author) for author in parsed.authors]
+        self._source = source
+        self._journal = parsed.journal
+        self._volume = parsed.volume
+        self._doi = parsed.doi
+        self._lang = ''
+        self._urls = list(parsed.urls)
+        self._versions = []
+        self._raw_data = deepcopy(raw_data)
+        self.__salt = ''.join(random.choices(string.ascii_uppercase + string.digits, k=64))
+        self._id = f'id{hash((self.__salt, self._title, self._doi, self._abstract, self._source))}'
+
+
+@benchmark
+class DocumentMemoryBenchmark(unittest.TestCase):
+    DOCUMENTS = 20000
+
+    @staticmethod
+    def memory(build) -> tuple:
+        """
+        :return: peak and retained bytes per document while the documents are built and kept
+        """
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            documents = build()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return peak / len(documents), retained / len(documents)
+
+    def test_slotted_documents_take_less_memory_than_dicts(self):
+        random.seed(0)
+        # payloads are there in both cases, only what the documents add is measured
+        payloads = crossref_works(self.DOCUMENTS)({'offset': 0, 'rows': self.DOCUMENTS})['message']['items']
+
+        layouts = {
+            'dict': lambda: [DictDocument(payload, SupportedSources.CROSSREF) for payload in payloads],
+            'slots': lambda: [Document(payload, SupportedSources.CROSSREF) for payload in payloads],
+            'batch': lambda: DocumentBatch(Document(payload, SupportedSources.CROSSREF) for payload in payloads),
+        }
+        memory = {name: self.memory(build) for name, build in layouts.items()}
+
+        print(f'\nmemory per document over {self.DOCUMENTS} Crossref records:')
+        for name, (peak, retained) in memory.items():
+            print(f'{name}: peak {peak:.0f} B, retained {retained:.0f} B')
+        self.assertLess(memory['slots'][0] * 2, memory['dict'][0])
+
+
+@benchmark
+class IVFSearchBenchmark(unittest.TestCase):
+    VECTORS = 200000
+    # dimension of all-MiniLM-L6-v2 embeddings
+    DIMENSION = 384
+    QUERIES = 100
+    K = 10
+
+    @staticmethod
+    def vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+        # L2-normalized points around a few hundred topics
+        generator = np.random.default_rng(seed)
+        topics = np.random.default_rng(0).normal(size=(500, dimension)).astype(np.float32)
+        points = topics[generator.integers(0, len(topics), count)]
+        points += 0.25 * generator.normal(size=(count, dimension)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    @staticmethod
+    def seconds_per_query(search, queries: np.ndarray) -> float:
+        start = time.perf_counter()
+        for query in queries:
+            search(query)
+        return (time.perf_counter() - start) / len(queries)
+
+    def test_ivf_search_is_faster_than_exact_search(self):
+        embeddings = self.vectors(self.VECTORS, self.DIMENSION, seed=1)
+        queries = self.vectors(self.QUERIES, self.DIMENSION, seed=2)
+        ids = [f'doc{n}' for n in range(self.VECTORS)]
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index = IVFIndex(directory.name, self.DIMENSION)
+        index.add(ids, embeddings)
+
+        def exact(query: np.ndarray) -> list:
+            # brute force over all embeddings in memory
+            scores = embeddings @ query
+            top = np.argpartition(-scores, self.K)[:self.K]
+            return [ids[row] for row in top[np.argsort(-scores[top])]]
+
+        exact_time = self.seconds_per_query(exact, queries)
+        ivf_time = self.seconds_per_query(lambda query: index.search(query, self.K), queries)
+        recall = np.mean([len(set(exact(query)) & {doc_id for doc_id, _ in index.search(query, self.K)}) / self.K
+                          for query in queries])
+
+        print(f'\nsearch over {self.VECTORS} vectors of {self.DIMENSION} dimensions: '
+              f'exact {exact_time * 1000:.2f} ms, IVF {ivf_time * 1000:.2f} ms per query, recall@{self.K} {recall:.3f}')
+        self.assertLess(ivf_time, exact_time)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import unittest
+from itertools import combinations
+from string import ascii_lowercase
+
+from deduplication import blocking, engine
+
+
+def citations(count: int, **fields) -> list:
+    return engine.format_citations(dict(
+        dict.fromkeys(engine.FIELDS),
+        author=f'Author{n}, A.',
+        title=f'Publication number {n} about {"abcdefghijklmnopqrstuvwxyz"[n % 26] * 5}',
+        year=str(2000 + n % 20),
+        record_id=n, label='', source='test'
+    ) | fields for n in range(count))
+
+
+def chain(records: list) -> set:
+    # pairs of neighbours in title order
+    order = sorted(range(len(records)), key=lambda n: records[n]['title'])
+    return {(min(pair), max(pair)) for pair in zip(order, order[1:])}
+
+
+def library(count: int, seed: int) -> list:
+    # a third of the records have no authors and some are untitled editorials, a few dozen years and journals
+    generator = random.Random(seed)
+    words = [''.join(random.Random(n).choices(ascii_lowercase, k=7)) for n in range(2000)]
+    return engine.format_citations(dict(
+        dict.fromkeys(engine.FIELDS),
+        author=None if n % 3 == 0 else f'Author{generator.randrange(count)}, A.',
+        title='Editorial' if n % 20 == 0 else ' '.join(generator.choices(words, k=8)),
+        year=str(1990 + generator.randrange(30)),
+        journal=f'Journal {generator.randrange(40)}',
+        record_id=n, label='', source='test'
+    ) for n in range(count))
+
+
+class BlockingTest(unittest.TestCase):
+    def test_exact_blocks_within_the_limit_are_compared_pairwise(self):
+        size = 3 * blocking.MAX_BLOCK_SIZE
+        pairs = set(blocking.candidate_pairs(citations(size, doi='10.1000/same')))
+
+        self.assertTrue(set(combinations(range(size), 2)) <= pairs)
+
+    def test_exact_blocks_over_the_limit_are_chained(self):
+        records = citations(2 * blocking.MAX_EXACT_BLOCK_SIZE, doi='10.1000/same')
+
+        pairs = blocking.key_pairs(records, (('doi',),), blocking.MAX_EXACT_BLOCK_SIZE)
+
+        self.assertEqual(pairs, chain(records))
+
+    def test_placeholders_never_match(self):
+        records = citations(10, author='Anonymous', year='2020')
+        records[3]['title'] = records[7]['title'] = 'UNTITLED'
+
+        self.assertEqual(blocking.key_pairs(records, (('author', 'year'), ('title',))), set())
+        self.assertFalse(any(key.startswith(('author+year:', 'title:')) for key in blocking.blocking_keys(records)[3]))
+
+    def test_pairs_grow_linearly_with_records(self):
+        small, large = len(blocking.candidate_pairs(library(1000, 0))), len(blocking.candidate_pairs(library(8000, 1)))
+
+        # eight times as many records, comparing all pairs of blocks would give about 64 times as many pairs
+        self.assertLess(large / small, 12)
+
+    def test_fuzzy_blocks_over_the_limit_are_chained(self):
+        size = 3 * blocking.MAX_BLOCK_SIZE
+        records = citations(size, year='2020')
+        for n, record in enumerate(records):
+            record['author'] = f'{"ABCDEFGHIJ"[n % 10] * 3} SMITH'
+
+        pairs = blocking.key_pairs(records, blocking.FUZZY_ROUNDS, blocking.MAX_BLOCK_SIZE)
+
+        self.assertEqual(pairs, chain(records))
+
+    def test_fuzzy_blocks_within_the_limit_are_compared_pairwise(self):
+        records = citations(10, year='2020')
+        for record in records:
+            record['author'] = 'JOHN SMITH'
+
+        pairs = blocking.key_pairs(records, blocking.FUZZY_ROUNDS, blocking.MAX_BLOCK_SIZE)
+
+        self.assertEqual(pairs, set(combinations(range(10), 2)))
+
+    def test_missing_values_never_match(self):
+        self.assertEqual(blocking.key_pairs(citations(5), (('doi',),)), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
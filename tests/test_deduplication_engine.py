@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import time
+import unittest
+from datetime import datetime
+
+import numpy as np
+
+from deduplication import Deduplicator, blocking, engine
+from search_engine.databases.database_client import Document, SupportedSources
+
+CASES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deduplication', 'cases')
+ABSTRACT = 'We study how duplicate records of publications can be found in results of several bibliographic databases.'
+
+
+def citation(record_id: int, **fields) -> dict:
+    values = dict(
+        author='Smith, J.; Doe, A.',
+        title='Finding duplicate publications in bibliographic databases',
+        year='2020',
+        journal='Journal of Bibliometrics',
+        abstract=ABSTRACT,
+        doi='10.1000/jb.2020.001',
+        number='3',
+        pages='101-110',
+        volume='12',
+        isbn=None,
+    )
+    values.update(fields)
+    return dict(values, record_id=record_id, label='', source='test')
+
+
+def synthetic_citation(record_id: int, generator: random.Random) -> dict:
+    words = [f'word{n}' for n in generator.choices(range(400), k=220)]
+    authors = '; '.join(f'Author{generator.randrange(2000)}, {generator.choice("ABCDEFGH")}.' for _ in range(3))
+    return citation(record_id, author=authors, title=' '.join(words[:10]), abstract=' '.join(words[10:]),
+                    year=str(1990 + generator.randrange(30)), journal=f'Journal {generator.randrange(100)}',
+                    doi=f'10.1000/{record_id}', number=str(generator.randrange(12)),
+                    pages=f'{generator.randrange(500)}-{generator.randrange(500)}', volume=str(generator.randrange(50)))
+
+
+def case_publications(case: str) -> list:
+    # results of a case are written with Document.to_dict
+    with open(os.path.join(CASES, case, 'result.json'), encoding='utf-8') as file:
+        records = json.load(file)
+
+    publications = []
+    for record in records:
+        fields = dict(
+            _title=record['title'],
+            _abstract=record['abstract'],
+            _publication_date=(datetime.fromisoformat(record['publication_date'])
+                               if record['publication_date'] != 'None' else None),
+            _authors=record['authors'],
+            _source=SupportedSources[record['source'].split('.')[-1]],
+            _raw_data=None,
+            _journal=record['journal'],
+            _volume=record['volume'],
+            _doi=record['doi'],
+            _lang='',
+            _urls=record['urls'],
+            _versions=[],
+            _id=record['id'],
+            _keep_raw_data=False,
+            _loaded=True
+        )
+        publications.append(Document.from_fields(tuple(fields[slot] for slot in Document.__slots__)))
+
+    return publications
+
+
+def classify(*citations) -> tuple:
+    formatted = engine.format_citations(citations)
+    pairs = engine.match_citations(formatted, [(0, 1)])
+    true_pairs, maybe_pairs = engine.identify_true_matches(pairs, formatted)
+    return bool(true_pairs[0]), bool(maybe_pairs[0])
+
+
+class JaroWinklerTest(unittest.TestCase):
+    def test_values_of_record_linkage(self):
+        # RecordLinkage::jarowinkler of the same strings
+        for string_1, string_2, similarity in (
+                ('MARTHA', 'MARHTA', 0.9611111),
+                ('DWAYNE', 'DUANE', 0.8400000),
+                ('DIXON', 'DICKSONX', 0.8133333),
+                ('JELLYFISH', 'SMELLYFISH', 0.8962963),
+        ):
+            with self.subTest(string_1=string_1, string_2=string_2):
+                self.assertAlmostEqual(engine.jaro_winkler(string_1, string_2), similarity, places=6)
+                self.assertAlmostEqual(engine.jaro_winkler(string_2, string_1), similarity, places=6)
+
+    def test_edge_cases(self):
+        self.assertEqual(engine.jaro_winkler('SAME', 'SAME'), 1.0)
+        self.assertEqual(engine.jaro_winkler('ABC', 'XYZ'), 0.0)
+        self.assertEqual(engine.jaro_winkler('', 'ABC'), 0.0)
+
+
+class MatchCitationsTest(unittest.TestCase):
+    def test_pairs_are_compared_like_single_strings(self):
+        generator = random.Random(1)
+        formatted = engine.format_citations([synthetic_citation(n, generator) for n in range(20)])
+        formatted[3]['abstract'] = None
+        pairs = [(n, (7 * n + 3) % 20) for n in range(20)]
+
+        columns = engine.match_citations(formatted, pairs)
+
+        for n, (id_1, id_2) in enumerate(pairs):
+            for field in ('author', 'title', 'abstract', 'pages'):
+                value_1, value_2 = formatted[id_1][field], formatted[id_2][field]
+                if value_1 is None or value_2 is None:
+                    self.assertTrue(np.isnan(columns[field][n]))
+                else:
+                    self.assertAlmostEqual(columns[field][n], engine.jaro_winkler(value_1, value_2))
+
+    def test_thousands_of_records_are_compared_within_seconds(self):
+        # comparing one pair of abstracts took 45 ms in Python, so these pairs would have taken tens of minutes
+        generator = random.Random(0)
+        citations = [synthetic_citation(n, generator) for n in range(3000)]
+
+        start = time.perf_counter()
+        formatted = engine.format_citations(citations)
+        pairs = blocking.candidate_pairs(formatted)
+        columns = engine.match_citations(formatted, pairs)
+        engine.identify_true_matches(columns, formatted)
+        elapsed = time.perf_counter() - start
+
+        self.assertGreater(len(pairs), 20000)
+        self.assertLess(elapsed, 20)
+
+
+class IdentifyTrueMatchesTest(unittest.TestCase):
+    def test_identical_records_are_true_pair(self):
+        self.assertEqual(classify(citation(1), citation(2)), (True, False))
+
+    def test_mismatching_doi_with_good_match_is_true_pair(self):
+        # title, abstract and journal agree, so the DOI of one of the records is taken as wrong
+        self.assertEqual(classify(citation(1), citation(2, doi='10.5555/other.987')), (True, False))
+
+    def test_mismatching_doi_without_good_match_is_left_for_manual_check(self):
+        other = citation(2, doi='10.5555/other.987', abstract='A completely different text about something else.')
+        self.assertEqual(classify(citation(1), other), (False, True))
+
+    def test_matching_or_missing_doi_keeps_true_pair(self):
+        self.assertEqual(classify(citation(1, doi=None), citation(2, doi=None)), (True, False))
+        self.assertEqual(classify(citation(1, doi='https://doi.org/10.1000/jb.2020.001'), citation(2)), (True, False))
+
+    def test_years_one_apart_are_true_pair(self):
+        self.assertEqual(classify(citation(1), citation(2, year='2021')), (True, False))
+
+    def test_years_further_apart_are_left_for_manual_check(self):
+        self.assertEqual(classify(citation(1), citation(2, year='2015')), (False, True))
+
+    def test_different_publications_are_not_pairs(self):
+        other = citation(2, author='Brown, K.', title='Measuring citation impact of conference papers',
+                         abstract='Conference papers are cited differently than journal articles.', doi=None,
+                         journal='Scientometrics', pages='1-20', volume='99', number='1')
+        self.assertEqual(classify(citation(1), other), (False, False))
+
+    def test_missing_values(self):
+        formatted = engine.format_citations([citation(1, abstract=None, pages=None), citation(2, abstract=None)])
+        pairs = engine.match_citations(formatted, [(0, 1)])
+
+        # missing on one side is unknown
+        self.assertTrue(np.isnan(pairs['pages'][0]))
+        # missing on both sides is a disagreement for abstracts and an agreement for pages, volumes and numbers
+        self.assertEqual(pairs['abstract'][0], 0)
+        self.assertEqual(engine.match_citations(engine.format_citations(
+            [citation(1, pages=None), citation(2, pages=None)]), [(0, 1)])['pages'][0], 1)
+
+
+class CaseTest(unittest.TestCase):
+    """
+    case-1 holds the 942 publications the R pipeline of ASySD left out of 1028 results, none of them
+    are duplicates of each other according to R.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.publications = case_publications('case-1')
+
+    def test_rules_of_asysd_find_no_pairs_r_did_not_find(self):
+        formatted = engine.format_citations(publication.to_csv() for publication in self.publications)
+        pairs = sorted(blocking.key_pairs(formatted, blocking.EXACT_ROUNDS))
+
+        true_pairs, _ = engine.identify_true_matches(engine.match_citations(formatted, pairs), formatted)
+
+        self.assertTrue(pairs)
+        self.assertFalse(true_pairs.any())
+
+    def test_pipeline_only_merges_publications_with_nearly_equal_titles(self):
+        # R's manual review list comes from its own rounds, the rest are found by the rounds and
+        # exact DOI and title matching which ASySD doesn't have
+        publications = list(Deduplicator(report=None).deduplicate(False, self.publications))
+
+        self.assertEqual(len(publications), 929)
+        for publication in publications:
+            for version in publication.versions:
+                with self.subTest(title=publication.title):
+                    similarity = engine.jaro_winkler(engine.normalized_title(version['title']),
+                                                     engine.normalized_title(publication.title))
+                    self.assertGreater(similarity, 0.95)
+
+
+if __name__ == '__main__':
+    unittest.main()
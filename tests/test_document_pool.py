@@ -0,0 +1,100 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+from search_engine import AsyncSearch, Search
+from search_engine.batch_search import BatchSearch
+from search_engine.databases import document_pool
+from search_engine.databases.async_database_client import AsyncDatabaseClient
+from search_engine.databases.database_client import Document, SupportedSources
+from tests.fakes import FakeAsyncClient, FakeRequestsManager, crossref_works
+
+
+class CrossrefPages(FakeAsyncClient):
+    # documents are built by AsyncDatabaseClient.to_documents
+    to_document = AsyncDatabaseClient.to_document
+
+
+class DefaultDocumentPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(self.shutdown)
+
+    @staticmethod
+    def shutdown():
+        if document_pool._default_pool is not None:
+            document_pool._default_pool.shutdown()
+        document_pool._default_pool = None
+
+    def test_documents_are_built_in_place_by_default(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DOCUMENT_WORKERS', None)
+            self.assertIsNone(document_pool.default_document_pool())
+
+    def test_search_does_not_start_the_pool(self):
+        with mock.patch.dict(os.environ, DOCUMENT_WORKERS='2'):
+            Search('query', 100, sources=(SupportedSources.CROSSREF,))
+
+        self.assertIsNone(document_pool._default_pool)
+
+    def test_workers_build_same_documents(self):
+        page = crossref_works(100)({'offset': 0, 'rows': 100})['message']['items']
+
+        with mock.patch.dict(os.environ, DOCUMENT_WORKERS='2'):
+            pool = document_pool.default_document_pool()
+            documents = document_pool.build_documents(page, SupportedSources.CROSSREF)
+
+        self.assertNotEqual(pool._mp_context.get_start_method(), 'fork')
+        self.assertEqual([document.fields() for document in documents],
+                         [Document(raw_data, SupportedSources.CROSSREF).fields() for raw_data in page])
+
+
+class LazyDocumentsTest(unittest.TestCase):
+    def assertLazy(self, documents: list, count: int):
+        self.assertEqual(len(documents), count)
+        self.assertFalse(any(document._loaded for document in documents))
+        self.assertTrue(all(document.title for document in documents))
+
+    def test_lazy_documents_are_built_in_place(self):
+        page = crossref_works(100)({'offset': 0, 'rows': 100})['message']['items']
+
+        with mock.patch.dict(os.environ, DOCUMENT_WORKERS='2'):
+            documents = document_pool.build_documents(page, SupportedSources.CROSSREF, lazy=True)
+            async_documents = asyncio.run(
+                document_pool.build_documents_async(page, SupportedSources.CROSSREF, lazy=True))
+
+        self.assertIsNone(document_pool._default_pool)
+        self.assertLazy(documents, 100)
+        self.assertLazy(async_documents, 100)
+        self.assertEqual([document.materialize().fields() for document in documents],
+                         [Document(raw_data, SupportedSources.CROSSREF).fields() for raw_data in page])
+
+    def test_search_yields_lazy_documents(self):
+        with mock.patch('search_engine.databases.crossref_client.RequestsManager',
+                        lambda: FakeRequestsManager(crossref_works(300))):
+            search = Search('query', 200, sources=(SupportedSources.CROSSREF,), lazy=True)
+            self.assertLazy(list(search.stream()), 200)
+
+    def test_async_search_yields_lazy_documents(self):
+        async def stream(search) -> list:
+            return [document async for document in search.stream()]
+
+        search = AsyncSearch('query', 200, sources=(SupportedSources.CROSSREF,),
+                             clients={SupportedSources.CROSSREF: CrossrefPages(SupportedSources.CROSSREF, 300)},
+                             lazy=True)
+
+        self.assertLazy(asyncio.run(stream(search)), 200)
+
+    def test_batch_search_yields_lazy_documents(self):
+        async def stream(search) -> list:
+            return [document async for _, document in search.stream()]
+
+        search = BatchSearch(['query', 'other query'], 200, sources=(SupportedSources.CROSSREF,),
+                             clients={SupportedSources.CROSSREF: CrossrefPages(SupportedSources.CROSSREF, 300)},
+                             lazy=True)
+
+        self.assertLazy(asyncio.run(stream(search)), 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
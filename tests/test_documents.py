@@ -0,0 +1,88 @@
+import gc
+import tracemalloc
+import unittest
+from unittest import mock
+
+from search_engine.databases.database_client import Document, DocumentBatch, SupportedSources
+from tests.fakes import crossref_works
+
+
+def payloads(count: int, offset: int = 0) -> list:
+    return crossref_works(offset + count)({'offset': offset, 'rows': count})['message']['items']
+
+
+class DocumentTest(unittest.TestCase):
+    def test_fields_round_trip(self):
+        document = Document(payloads(1)[0], SupportedSources.CROSSREF)
+        copy = Document.from_fields(document.fields())
+
+        self.assertEqual(copy.fields(), document.fields())
+        self.assertEqual((copy.id, copy.title, copy.doi, copy.authors),
+                         (document.id, document.title, document.doi, document.authors))
+
+    def test_lazy_document_is_parsed_once(self):
+        document = Document(payloads(1)[0], SupportedSources.CROSSREF, lazy=True)
+
+        with mock.patch.object(Document, '_load_from', autospec=True, side_effect=Document._load_from) as load:
+            self.assertEqual(document.title, 'Crossref record 0')
+            self.assertEqual(load.call_count, 0)
+            for _ in range(3):
+                self.assertEqual(document.doi, '10.1000/crossref.0')
+
+        self.assertEqual(load.call_count, 1)
+
+    def test_parsed_documents_dont_keep_payloads(self):
+        count = 2000
+        # a large part of every payload isn't used by documents
+        references = [{'key': f'ref{n}', 'unstructured': 'A cited publication. ' * 5} for n in range(50)]
+
+        gc.collect()
+        tracemalloc.start()
+        documents = [Document(dict(payload, reference=list(references)), SupportedSources.CROSSREF)
+                     for payload in payloads(count)]
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        self.assertEqual(len(documents), count)
+        # the documents take ~550 bytes each, without the payloads dropped after parsing they'd be over 5 KB
+        self.assertLess(size / count, 1024)
+
+
+class DocumentBatchTest(unittest.TestCase):
+    def test_documents_round_trip(self):
+        documents = [Document(payload, SupportedSources.CROSSREF) for payload in payloads(10)]
+        batch = DocumentBatch(documents[:5])
+        batch.extend(documents[5:9])
+        batch.append(documents[9])
+
+        self.assertEqual(len(batch), 10)
+        self.assertEqual(list(batch), documents)
+        self.assertEqual([batch[n] for n in range(10)], documents)
+        self.assertEqual(DocumentBatch(batch).column('id'), [document.id for document in documents])
+
+    def test_changes_of_documents_are_kept(self):
+        batch = DocumentBatch([Document(payload, SupportedSources.CROSSREF, lazy=True) for payload in payloads(3)])
+
+        batch[0].add_version(batch[1])
+        self.assertEqual(len(batch[0].versions), 1)
+        self.assertIs(next(iter(batch)), batch[0])
+
+    def test_materialize_parses_lazy_documents(self):
+        batch = DocumentBatch([Document(payload, SupportedSources.CROSSREF, lazy=True) for payload in payloads(3)])
+        self.assertEqual(batch.column('doi'), [None] * 3)
+
+        batch.materialize()
+
+        self.assertEqual(batch.column('doi'), [f'10.1000/crossref.{n}' for n in range(3)])
+        with mock.patch.object(Document, '_load_from') as load:
+            [document.doi for document in batch]
+        load.assert_not_called()
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            DocumentBatch().column('colour')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ImportTest(unittest.TestCase):
+    def assert_imports(self, statement: str):
+        # every statement runs in a fresh interpreter, so it is the first import of its package
+        result = subprocess.run([sys.executable, '-c', statement], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+    def test_packages_import_on_their_own(self):
+        for statement in (
+                'import storage',
+                'from storage import InvertedIndex',
+                'from storage.inverted_index import InvertedIndex',
+                'from storage.publication_store import PublicationStore',
+                'import deduplication',
+                'from deduplication.engine import jaro_winkler',
+                'import ranking',
+                'from search_engine import Search, AsyncSearch, BatchSearch',
+        ):
+            with self.subTest(statement=statement):
+                self.assert_imports(statement)
+
+
+if __name__ == '__main__':
+    unittest.main()
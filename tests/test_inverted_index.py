@@ -0,0 +1,112 @@
+import random
+import tempfile
+import unittest
+
+from storage import inverted_index
+from storage.inverted_index import InvertedIndex
+
+WORDS = ('effect', 'model', 'analysis', 'network', 'protein', 'climate', 'learning', 'graph', 'soil', 'cell',
+         'energy', 'market', 'language', 'signal', 'quantum', 'urban', 'memory', 'vaccine', 'river', 'policy')
+QUERIES = ('graph network', 'soil climate river', 'protein', 'quantum memory signal', 'vaccine policy urban')
+
+
+def document(n: int, version: int = 0) -> dict:
+    generator = random.Random(f'{n}-{version}')
+    return {
+        'id': f'doc{n}',
+        'title': ' '.join(generator.sample(WORDS, 4)),
+        'abstract': ' '.join(generator.choices(WORDS, k=30)),
+        'authors': [f'Author{n} Smith'],
+        'journal': f'Journal of {generator.choice(WORDS)}',
+    }
+
+
+def scores(results: list) -> dict:
+    return {doc_id: round(score, 4) for doc_id, score in results}
+
+
+class InvertedIndexTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        self.index = InvertedIndex(self.path)
+
+    def single_segment(self, documents: list) -> InvertedIndex:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        index = InvertedIndex(directory.name)
+        index.add(documents)
+        return index
+
+    def test_adding_a_document_again_hides_the_older_copy(self):
+        old = dict(document(1), title='Graph networks', abstract='')
+        new = dict(document(1), title='Soil climate', abstract='')
+        self.index.add([old, document(2)])
+
+        self.index.add([new])
+
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn('doc1', scores(self.index.search('graph networks', 10)))
+        self.assertIn('doc1', scores(self.index.search('soil', 10)))
+        self.assertEqual(scores(self.index.search('soil climate', 10)),
+                         scores(self.single_segment([new, document(2)]).search('soil climate', 10)))
+
+    def test_last_copy_of_a_document_added_twice_at_once_is_kept(self):
+        self.index.add([{'id': 'doc1', 'title': 'Graph'}, {'id': 'doc1', 'title': 'Soil'}])
+
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.search('graph', 10), [])
+        self.assertEqual(scores(self.index.search('soil', 10)).keys(), {'doc1'})
+
+    def test_merging_keeps_scores(self):
+        # every document in a segment of its own, a few of them added again
+        documents = {n: document(n) for n in range(3 * inverted_index.MAX_SEGMENTS)}
+        for n in documents:
+            self.index.add([documents[n]])
+        for n in range(0, len(documents), 5):
+            documents[n] = document(n, version=1)
+            self.index.add([documents[n]])
+
+        self.assertLessEqual(len(self.index._segments), inverted_index.MAX_SEGMENTS)
+        expected = self.single_segment(list(documents.values()))
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(scores(self.index.search(query, 100)), scores(expected.search(query, 100)))
+
+    def test_scores_do_not_depend_on_segments(self):
+        documents = [document(n) for n in range(20)]
+        for start in range(0, 20, 5):
+            self.index.add(documents[start:start + 5])
+        unmerged = {query: scores(self.index.search(query, 100)) for query in QUERIES}
+
+        self.index.merge()
+
+        self.assertEqual(len(self.index._segments), 1)
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(scores(self.index.search(query, 100)), unmerged[query])
+
+    def test_reopened_index_returns_same_results(self):
+        for start in range(0, 30, 10):
+            self.index.add([document(n) for n in range(start, start + 10)])
+        self.index.add([document(3, version=1), document(17, version=1)])
+
+        reopened = InvertedIndex(self.path)
+
+        self.assertEqual(len(reopened), 30)
+        for query in QUERIES:
+            with self.subTest(query=query):
+                self.assertEqual(reopened.search(query, 100), self.index.search(query, 100))
+
+    def test_empty_query_returns_nothing(self):
+        self.assertEqual(self.index.search('graph'), [])
+
+        self.index.add([document(n) for n in range(5)])
+
+        self.assertEqual(self.index.search(''), [])
+        self.assertEqual(self.index.search(' ,.; '), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
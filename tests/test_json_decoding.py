@@ -0,0 +1,18 @@
+import math
+import unittest
+
+from utils import json_decoding
+
+
+class LoadsTest(unittest.TestCase):
+    def test_bytes_and_str_are_decoded(self):
+        for content in (b'{"items": [1, "\\u00e9"]}', '{"items": [1, "\\u00e9"]}'):
+            with self.subTest(content=content):
+                self.assertEqual(json_decoding.loads(content), {'items': [1, 'é']})
+
+    def test_documents_orjson_rejects_are_decoded_with_json(self):
+        self.assertTrue(math.isnan(json_decoding.loads(b'{"score": NaN}')['score']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+from unittest import mock
+
+from deduplication import Deduplicator
+from search_engine import AsyncSearch, Search
+from search_engine.databases import registry
+from search_engine.databases.database_client import Document, SupportedSources
+from storage.publication_store import PublicationStore
+from tests.fakes import FakeAsyncClient, WaitingFirstClient
+from tests.test_search import perform
+
+SOURCES = (SupportedSources.CROSSREF, SupportedSources.OPENALEX)
+
+
+WORDS = ('effect', 'model', 'analysis', 'network', 'protein', 'climate', 'learning', 'graph', 'soil', 'cell',
+         'energy', 'market', 'language', 'signal', 'quantum', 'urban', 'memory', 'vaccine', 'river', 'policy')
+
+
+def title(n: int) -> str:
+    words = random.Random(n).sample(WORDS, 6)
+    return ' '.join(words).capitalize()
+
+
+def work(n: int, **fields) -> Document:
+    return Document(dict({
+        'DOI': f'10.1000/work.{n}',
+        'title': [title(n)],
+        'author': [{'family': f'Author{n}', 'given': 'Jane'}],
+        'published': {'date-parts': [[2000 + n % 20, 1, 1]]},
+        'abstract': f'Abstract of study {n}.',
+        'URL': f'https://example.org/work/{n}',
+    }, **fields), SupportedSources.CROSSREF)
+
+
+def preprint(n: int) -> Document:
+    # the same study without a DOI
+    return work(n, DOI=None, URL=f'https://example.org/preprint/{n}')
+
+
+def clusters(publications) -> set:
+    return {(publication.id, frozenset(version['id'] for version in publication.versions))
+            for publication in publications}
+
+
+class PublicationStoreTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self._directory.cleanup)
+        self.path = os.path.join(self._directory.name, 'store.db')
+        self.store = PublicationStore(self.path)
+
+    def update(self, documents, store: PublicationStore = None) -> list:
+        with mock.patch.object(Deduplicator, 'deduplicate_new', autospec=True,
+                               side_effect=Deduplicator.deduplicate_new) as deduplicate_new:
+            (store or self.store).update('query', documents, deduplicator=Deduplicator(report=None))
+
+        # publications the new ones were deduplicated against
+        return list(deduplicate_new.call_args.args[2])
+
+    def test_new_records_are_compared_only_with_stored_ones_sharing_keys(self):
+        self.store.update('query', [work(n) for n in range(200)], deduplicator=Deduplicator(report=None))
+
+        known = self.update([preprint(7), work(1000)])
+
+        self.assertIn(work(7).id, [publication.id for publication in known])
+        self.assertLess(len(known), 50)
+        self.assertEqual(len(self.store), 201)
+        merged = next(publication for publication in self.store.publications() if publication.id == work(7).id)
+        self.assertEqual({version['id'] for version in merged.versions} - {merged.id}, {preprint(7).id})
+
+    def test_incremental_update_merges_as_deduplication_against_whole_store(self):
+        stored = [work(n) for n in range(300)]
+        new = [preprint(n) for n in range(0, 300, 15)] + [work(n) for n in range(300, 330)]
+        self.store.update('query', stored, deduplicator=Deduplicator(report=None))
+
+        expected = clusters(Deduplicator(report=None).deduplicate_new(new, list(self.store.publications())))
+        self.update(new)
+
+        self.assertTrue(expected)
+        self.assertTrue(expected <= clusters(self.store.publications()))
+
+    def test_records_found_again_are_not_deduplicated(self):
+        self.store.update('query', [work(n) for n in range(10)], deduplicator=Deduplicator(report=None))
+
+        with mock.patch.object(Deduplicator, 'deduplicate_new') as deduplicate_new:
+            publications = self.store.update('other query', [work(3)], deduplicator=Deduplicator(report=None))
+
+        deduplicate_new.assert_not_called()
+        self.assertEqual([publication.id for publication in publications], [work(3).id])
+
+    def test_older_stores_get_blocking_keys(self):
+        self.store.update('query', [work(n) for n in range(50)], deduplicator=Deduplicator(report=None))
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute('DELETE FROM blocking_keys')
+            connection.execute('PRAGMA user_version = 0')
+        connection.close()
+
+        known = self.update([preprint(7)], PublicationStore(self.path))
+
+        self.assertIn(work(7).id, [publication.id for publication in known])
+        self.assertLess(len(known), 50)
+
+
+class LastRunTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = PublicationStore(os.path.join(directory.name, 'store.db'))
+
+    def test_only_sources_which_returned_all_results_are_recorded(self):
+        clients = {
+            # runs out of results before its limit
+            SupportedSources.CROSSREF: WaitingFirstClient(SupportedSources.CROSSREF, 100),
+            # has more results than the whole limit
+            SupportedSources.OPENALEX: WaitingFirstClient(SupportedSources.OPENALEX, 1000),
+        }
+
+        with mock.patch.object(registry, 'create_client', clients.get):
+            search = Search('query', 400, remove_duplicates=False, sources=SOURCES, store=self.store)
+            self.assertTrue(perform(search), 'search hung')
+
+        self.assertEqual(self.store.last_run('query', SupportedSources.CROSSREF), date.today())
+        self.assertIsNone(self.store.last_run('query', SupportedSources.OPENALEX))
+
+    def test_only_sources_which_returned_all_results_are_recorded_by_async_search(self):
+        clients = {
+            SupportedSources.CROSSREF: FakeAsyncClient(SupportedSources.CROSSREF, 100),
+            SupportedSources.OPENALEX: FakeAsyncClient(SupportedSources.OPENALEX, 1000),
+        }
+
+        search = AsyncSearch('query', 400, remove_duplicates=False, sources=SOURCES, clients=clients,
+                             store=self.store)
+        asyncio.run(search.perform())
+
+        self.assertEqual(self.store.last_run('query', SupportedSources.CROSSREF), date.today())
+        self.assertIsNone(self.store.last_run('query', SupportedSources.OPENALEX))
+
+
+if __name__ == '__main__':
+    unittest.main()
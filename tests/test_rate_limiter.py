@@ -0,0 +1,28 @@
+import unittest
+
+from utils.rate_limiter import RateLimiter
+
+URL = 'https://api.example.org/works'
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_rate_is_learned_from_headers(self):
+        limiter = RateLimiter({'api.example.org': (1, 1)})
+        limiter.update(URL, 200, {'X-Rate-Limit-Limit': '50', 'X-Rate-Limit-Interval': '1s'})
+
+        self.assertEqual(limiter._bucket(URL).rate, 50)
+
+    def test_malformed_headers_are_ignored(self):
+        limiter = RateLimiter({'api.example.org': (5, 5)})
+
+        for limit in ('', 'many', '2.5', '0', '-10'):
+            with self.subTest(limit=limit):
+                limiter.update(URL, 200, {'X-Rate-Limit-Limit': limit, 'X-Rate-Limit-Interval': '1s'})
+                self.assertEqual(limiter._bucket(URL).rate, 5)
+
+        limiter.update(URL, 200, {'X-Rate-Limit-Limit': '50', 'X-Rate-Limit-Interval': 'soon'})
+        self.assertEqual(limiter._bucket(URL).rate, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
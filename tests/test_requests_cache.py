@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from utils import requests_cache
+from utils.requests_cache import RequestsCache
+
+URL = 'https://api.example.org/works'
+TTL = 60
+
+
+class RequestsCacheTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.db')
+        self.now = 1000.0
+        clock = mock.patch.object(requests_cache.time, 'time', lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def cache(self, max_size: int = 1024 ** 3) -> RequestsCache:
+        return RequestsCache(self.path, max_size=max_size, ttls={'api.example.org': TTL})
+
+    def set(self, cache: RequestsCache, key: str, size: int = 10):
+        cache.set(key, URL, 200, {}, b'x' * size)
+        self.now += 1
+
+    def stored(self) -> dict:
+        # what other processes see
+        connection = sqlite3.connect(self.path)
+        try:
+            return {key: accessed for key, accessed in connection.execute('SELECT key, accessed FROM responses')}
+        finally:
+            connection.close()
+
+    def test_hits_do_not_write(self):
+        cache = self.cache()
+        self.set(cache, 'a')
+        changes = cache._connection.total_changes
+
+        for _ in range(10):
+            self.assertIsNotNone(cache.get('a'))
+            self.now += 1
+
+        self.assertEqual(cache._connection.total_changes, changes)
+        self.assertEqual(cache.hits, 10)
+
+    def test_access_times_are_written_with_the_next_response(self):
+        cache = self.cache()
+        self.set(cache, 'a')
+        cache.get('a')
+        accessed = self.now
+        self.now += 1
+
+        self.assertLess(self.stored()['a'], accessed)
+        self.set(cache, 'b')
+        self.assertEqual(self.stored()['a'], accessed)
+
+    def test_access_times_are_written_in_batches(self):
+        cache = self.cache()
+        for key in 'abc':
+            self.set(cache, key)
+        created = self.stored()
+
+        with mock.patch.object(requests_cache, 'ACCESS_BATCH_SIZE', 3):
+            cache.get('a')
+            cache.get('b')
+            self.assertEqual(self.stored(), created)
+
+            cache.get('c')
+            self.assertEqual(self.stored(), dict.fromkeys('abc', self.now))
+
+    def test_eviction_uses_pending_access_times(self):
+        cache = self.cache(max_size=25)
+        self.set(cache, 'a')
+        self.set(cache, 'b')
+        cache.get('a')
+
+        self.set(cache, 'c')
+
+        self.assertEqual(set(self.stored()), {'a', 'c'})
+
+    def test_expired_responses_are_deleted_once_read(self):
+        cache = self.cache()
+        self.set(cache, 'a')
+        self.set(cache, 'b')
+        self.now += TTL
+
+        self.assertIsNone(cache.get('a'))
+        cache.flush()
+
+        self.assertEqual(set(self.stored()), {'b'})
+        self.assertEqual(cache.stats()['size'], 10)
+
+    def test_response_stored_again_is_not_deleted_as_expired(self):
+        cache = self.cache()
+        self.set(cache, 'a')
+        self.now += TTL
+        self.assertIsNone(cache.get('a'))
+
+        self.set(cache, 'a')
+        cache.flush()
+
+        self.assertIsNotNone(cache.get('a'))
+
+    def test_eviction_deletes_expired_responses_first(self):
+        cache = self.cache(max_size=25)
+        self.set(cache, 'a')
+        self.now += TTL
+        self.set(cache, 'b')
+        cache.get('b')
+
+        self.set(cache, 'c')
+
+        self.assertEqual(set(self.stored()), {'b', 'c'})
+
+
+if __name__ == '__main__':
+    unittest.main()
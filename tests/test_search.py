@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+import unittest
+import uuid
+from unittest import mock
+
+import arxiv
+
+from search_engine import AsyncSearch, Search
+from search_engine.databases import registry
+from search_engine.databases.arxiv_client import ArXivClient
+from search_engine.databases.crossref_client import CrossrefClient
+from search_engine.databases.database_client import SearchStatus, SupportedSources
+from search_engine.databases.internet_archive_client import InternetArchiveClient
+from tests.fakes import FakeAsyncClient, FakeRequestsManager, WaitingFirstClient, arxiv_results, crossref_works, \
+    internet_archive_releases
+
+# a search which doesn't finish in this time is considered hung
+TIMEOUT = 30
+SOURCES = (SupportedSources.CROSSREF, SupportedSources.OPENALEX)
+
+
+def perform(search: Search) -> bool:
+    """
+    :return: False if the search didn't finish in time
+    """
+
+    thread = threading.Thread(target=search.perform, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    return not thread.is_alive()
+
+
+class CoordinatorTest(unittest.TestCase):
+    def test_limit_change_after_waiting_status_wakes_coordinator(self):
+        clients = {
+            SupportedSources.CROSSREF: WaitingFirstClient(SupportedSources.CROSSREF, 1000),
+            # starts later, so the coordinator sees its status before its limit
+            SupportedSources.OPENALEX: WaitingFirstClient(SupportedSources.OPENALEX, 1000, delay=0.2),
+        }
+
+        with mock.patch.object(registry, 'create_client', clients.get):
+            search = Search('query', 400, remove_duplicates=False,
+                            sources=(SupportedSources.CROSSREF, SupportedSources.OPENALEX))
+            self.assertTrue(perform(search), 'search hung')
+
+        self.assertEqual(len(search.results()), 400)
+
+    def test_arxiv_with_slow_limit_change_finishes(self):
+        change_limit = ArXivClient.change_limit
+
+        def slow_change_limit(client, search_id, delta):
+            if delta < 0:
+                time.sleep(0.05)
+            change_limit(client, search_id, delta)
+
+        with mock.patch.object(arxiv.Client, 'results', arxiv_results(10000)), \
+                mock.patch.object(ArXivClient, 'change_limit', slow_change_limit), \
+                mock.patch('search_engine.databases.crossref_client.RequestsManager',
+                           lambda: FakeRequestsManager(crossref_works(10000))):
+            for _ in range(4):
+                search = Search('query', 400, remove_duplicates=False,
+                                sources=(SupportedSources.ARXIV, SupportedSources.CROSSREF))
+                self.assertTrue(perform(search), 'search hung')
+                self.assertEqual(len(search.results()), 400)
+
+
+class LimitTest(unittest.TestCase):
+    @staticmethod
+    def create_client(source):
+        if source == SupportedSources.UNPAYWALL:
+            raise ValueError(f'Source {source} has no client')
+        return WaitingFirstClient(source, 1000)
+
+    def test_limit_is_shared_by_created_clients_only(self):
+        with mock.patch.object(registry, 'create_client', self.create_client):
+            search = Search('query', 400, remove_duplicates=False, sources=(
+                SupportedSources.CROSSREF, SupportedSources.UNPAYWALL, SupportedSources.OPENALEX,
+                SupportedSources.CROSSREF))
+            self.assertTrue(perform(search), 'search hung')
+
+        self.assertEqual(len(search.results()), 400)
+
+    def test_search_needs_a_client(self):
+        with mock.patch.object(registry, 'create_client', self.create_client), \
+                self.assertRaises(AssertionError):
+            Search('query', 400, sources=(SupportedSources.UNPAYWALL,))
+
+    def test_async_search_shares_limit_by_distinct_sources(self):
+        clients = {source: FakeAsyncClient(source, 1000) for source in SOURCES}
+        search = AsyncSearch('query', 400, remove_duplicates=False,
+                             sources=SOURCES + (SupportedSources.CROSSREF,), clients=clients)
+        asyncio.run(search.perform())
+
+        self.assertEqual(len(search.results()), 400)
+
+    def test_async_search_shares_limit_by_created_clients_only(self):
+        def create_async_client(source):
+            if source == SupportedSources.UNPAYWALL:
+                raise ValueError(f'Source {source} has no asyncio client')
+            return FakeAsyncClient(source, 1000)
+
+        with mock.patch.object(registry, 'create_async_client', create_async_client):
+            search = AsyncSearch('query', 400, remove_duplicates=False,
+                                 sources=(SupportedSources.UNPAYWALL,) + SOURCES)
+        asyncio.run(search.perform())
+
+        self.assertEqual(len(search.results()), 400)
+
+    def test_async_search_skips_sources_without_given_client(self):
+        clients = {SupportedSources.CROSSREF: FakeAsyncClient(SupportedSources.CROSSREF, 1000)}
+        search = AsyncSearch('query', 400, remove_duplicates=False, sources=SOURCES, clients=clients)
+        asyncio.run(search.perform())
+
+        self.assertEqual(len(search.results()), 400)
+
+    def test_async_search_needs_a_client(self):
+        with self.assertRaises(AssertionError):
+            AsyncSearch('query', 400, sources=(SupportedSources.GOOGLE_SCHOLAR,))
+
+
+class ShortLastPageTest(unittest.TestCase):
+    """
+    Sources with fewer results than the limit answer the last request with a short page.
+    """
+
+    def assert_finishes(self, client, hits: int, limit: int):
+        search_id = uuid.uuid4()
+        documents = list(client.search_publications('query', search_id, limit))
+
+        self.assertEqual(len(documents), hits)
+        self.assertEqual(client.search_status(search_id), SearchStatus.FINISHED)
+        self.assertEqual(client._documents_pulled(search_id), hits)
+
+    def test_crossref_finishes(self):
+        with mock.patch('search_engine.databases.crossref_client.RequestsManager',
+                        lambda: FakeRequestsManager(crossref_works(500))):
+            self.assert_finishes(CrossrefClient(), 500, 1000)
+
+    def test_internet_archive_finishes(self):
+        with mock.patch('search_engine.databases.internet_archive_client.RequestsManager',
+                        lambda: FakeRequestsManager(internet_archive_releases(300))):
+            self.assert_finishes(InternetArchiveClient(), 300, 400)
+
+    def test_search_stays_within_limit(self):
+        with mock.patch.object(arxiv.Client, 'results', arxiv_results(10000)), \
+                mock.patch('search_engine.databases.crossref_client.RequestsManager',
+                           lambda: FakeRequestsManager(crossref_works(100))), \
+                mock.patch('search_engine.databases.internet_archive_client.RequestsManager',
+                           lambda: FakeRequestsManager(internet_archive_releases(100))):
+            search = Search('query', 3000, remove_duplicates=False, sources=(
+                SupportedSources.ARXIV, SupportedSources.CROSSREF, SupportedSources.INTERNET_ARCHIVE))
+            self.assertTrue(perform(search), 'search hung')
+
+        self.assertEqual(len(search.results()), 3000)
+
+
+if __name__ == '__main__':
+    unittest.main()
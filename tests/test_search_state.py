@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+import unittest
+
+from search_engine.databases.database_client import SearchState
+
+THREADS = 8
+CHANGES = 2000
+TIMEOUT = 10
+
+
+def run_all(targets: list):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), 'threads hung'
+
+
+class SearchStateTest(unittest.TestCase):
+    def test_concurrent_limit_changes_are_not_lost(self):
+        state = SearchState(THREADS * CHANGES)
+
+        def increase():
+            for _ in range(CHANGES):
+                state.change_limit(1)
+
+        def pull():
+            for _ in range(CHANGES):
+                state.change_limit(-1)
+
+        run_all([increase] * (THREADS // 2) + [pull] * (THREADS // 2))
+
+        self.assertEqual(state.documents_to_pull, THREADS * CHANGES)
+        self.assertEqual(state.documents_pulled, THREADS // 2 * CHANGES)
+
+    def test_client_pulls_exactly_what_it_is_given(self):
+        # a client thread pulls whatever it is allowed to while several threads hand out the limit
+        state = SearchState(0)
+        pulled = []
+
+        def client():
+            while state.wait_for_limit():
+                documents = state.documents_to_pull
+                state.change_limit(-documents)
+                pulled.append(documents)
+
+        client_thread = threading.Thread(target=client)
+        client_thread.start()
+
+        def coordinator():
+            for _ in range(CHANGES):
+                state.change_limit(1)
+
+        run_all([coordinator] * THREADS)
+        deadline = time.monotonic() + TIMEOUT
+        while state.documents_pulled < THREADS * CHANGES and time.monotonic() < deadline:
+            time.sleep(0.01)
+        state.kill()
+        client_thread.join(TIMEOUT)
+
+        self.assertFalse(client_thread.is_alive())
+        self.assertEqual(sum(pulled), THREADS * CHANGES)
+        self.assertEqual(state.documents_pulled, THREADS * CHANGES)
+        self.assertEqual(state.documents_to_pull, 0)
+
+    def test_waiting_clients_wake_on_limit_increase(self):
+        state = SearchState(0)
+        results = queue.Queue()
+
+        threads = [threading.Thread(target=lambda: results.put(state.wait_for_limit())) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+
+        state.change_limit(1)
+        for thread in threads:
+            thread.join(TIMEOUT)
+
+        self.assertEqual([results.get_nowait() for _ in threads], [True] * THREADS)
+
+    def test_waiting_clients_wake_on_kill(self):
+        state = SearchState(0)
+        results = queue.Queue()
+
+        threads = [threading.Thread(target=lambda: results.put(state.wait_for_limit())) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+
+        state.terminate()
+        for thread in threads:
+            thread.join(TIMEOUT)
+
+        self.assertEqual([results.get_nowait() for _ in threads], [False] * THREADS)
+
+    def test_limit_never_drops_below_zero(self):
+        state = SearchState(5)
+        state.change_limit(-8)
+
+        self.assertEqual(state.documents_to_pull, 0)
+        self.assertEqual(state.documents_pulled, 8)
+
+    def test_every_change_is_reported(self):
+        events = queue.Queue()
+        client = object()
+        state = SearchState(10, events, client=client)
+
+        state.change_limit(-4)
+        state.change_limit(2)
+
+        self.assertEqual([events.get_nowait(), events.get_nowait()], [client, client])
+        self.assertTrue(events.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
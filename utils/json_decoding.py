@@ -0,0 +1,42 @@
+"""
+This module is used for decoding JSON pages returned by APIs.
+"""
+import json
+from typing import Union
+
+import httpx
+import requests
+
+# orjson decodes large pages several times faster than json, json is used where it isn't installed
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+
+def loads(content: Union[bytes, str]) -> Union[dict, list]:
+    """
+    Decode JSON with orjson if it is installed, with json otherwise. Documents which orjson rejects but json
+    accepts, e.g. with NaN, are decoded with json.
+    """
+
+    if _orjson is not None:
+        try:
+            return _orjson.loads(content)
+        except _orjson.JSONDecodeError:
+            pass
+
+    return json.loads(content)
+
+
+def decode_json(response: Union[requests.Response, httpx.Response]) -> Union[dict, list]:
+    """
+    Same as response.json(), but the body is decoded straight from bytes, without building a str of the whole
+    page first.
+    :param response: response of a synchronous or an asynchronous request
+    :type response: Union[requests.Response, httpx.Response]
+    :return: decoded body
+    :rtype: Union[dict, list]
+    """
+
+    return loads(response.content)
@@ -0,0 +1,66 @@
+"""
+This module is used for keeping several page requests of one client in flight.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Tuple
+
+
+class Prefetcher:
+    """
+    Sends requests from background threads, at most window of them at once, and returns their results in the
+    order they were submitted. Every request is tagged with a key, e.g. offset or number of the page, so the
+    caller can check it got the page it expects. Requests still go through the rate limiter, so prefetching
+    only hides latency and never exceeds the rate of the API.
+    """
+
+    def __init__(self, window: int, name: str = 'prefetch'):
+        """
+        :param window: maximum number of requests in flight
+        :type window: int
+        :param name: prefix of names of the threads, shown in logs
+        :type name: str
+        """
+
+        self._window = max(1, window)
+        self._executor = ThreadPoolExecutor(max_workers=self._window, thread_name_prefix=name)
+        self._pending = deque()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self._window
+
+    def submit(self, key: Hashable, request: Callable, *args, **kwargs):
+        self._pending.append((key, self._executor.submit(request, *args, **kwargs)))
+
+    def next(self) -> Tuple[Hashable, Any]:
+        """
+        Wait for the oldest request.
+        :return: key of the request and its result
+        :rtype: Tuple[Hashable, Any]
+        """
+
+        key, future = self._pending.popleft()
+        return key, future.result()
+
+    def clear(self):
+        """
+        Forget all submitted requests, those which haven't been sent yet are cancelled.
+        """
+
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def close(self):
+        self.clear()
+        self._executor.shutdown(wait=False)
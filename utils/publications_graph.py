@@ -1,19 +1,96 @@
 """
 This module is used for duplicates removing.
 """
-from matplotlib import pyplot as plt
-import networkx as nx
+from array import array
+from typing import Hashable, List, Set
 
 
 class PublicationsGraph:
+    """
+    Disjoint-set forest over publications: every duplicate pair merges the clusters of its publications.
+    Publications get dense integer ids in the order they are added, parents and ranks are kept in arrays
+    indexed by these ids. Finding a cluster uses path compression, merging uses union by rank, so clusters
+    can be looked up at any moment while edges are still being added.
+    """
+
     def __init__(self):
-        self._graph = nx.Graph()
+        self._ids = {}
+        self._pub_ids = []
+        self._parents = array('q')
+        self._ranks = array('B')
+        # members of every cluster by root id, smaller clusters are moved into larger ones on merge
+        self._members = {}
+
+    def __len__(self) -> int:
+        return len(self._pub_ids)
+
+    def __contains__(self, pub_id: Hashable) -> bool:
+        return pub_id in self._ids
+
+    def add_vertex(self, pub_id: Hashable) -> int:
+        """
+        :return: dense integer id of the publication
+        :rtype: int
+        """
+
+        vertex = self._ids.get(pub_id)
+        if vertex is None:
+            vertex = len(self._pub_ids)
+            self._ids[pub_id] = vertex
+            self._pub_ids.append(pub_id)
+            self._parents.append(vertex)
+            self._ranks.append(0)
+            self._members[vertex] = [vertex]
+
+        return vertex
+
+    def add_edge(self, pub_id_1: Hashable, pub_id_2: Hashable):
+        root_1 = self._find(self.add_vertex(pub_id_1))
+        root_2 = self._find(self.add_vertex(pub_id_2))
+        if root_1 == root_2:
+            return
+
+        if self._ranks[root_1] < self._ranks[root_2]:
+            root_1, root_2 = root_2, root_1
+        elif self._ranks[root_1] == self._ranks[root_2]:
+            self._ranks[root_1] += 1
+
+        self._parents[root_2] = root_1
+
+        members_1, members_2 = self._members[root_1], self._members.pop(root_2)
+        if len(members_1) < len(members_2):
+            members_1, members_2 = members_2, members_1
+        members_1.extend(members_2)
+        self._members[root_1] = members_1
+
+    def find(self, pub_id: Hashable) -> Hashable:
+        """
+        :return: publication representing the cluster of the given one
+        :rtype: Hashable
+        """
+
+        return self._pub_ids[self._find(self._ids[pub_id])]
+
+    def are_connected(self, pub_id_1: Hashable, pub_id_2: Hashable) -> bool:
+        return self._find(self._ids[pub_id_1]) == self._find(self._ids[pub_id_2])
+
+    def cluster(self, pub_id: Hashable) -> Set[Hashable]:
+        """
+        :return: publications in the same cluster as the given one, including it
+        :rtype: Set[Hashable]
+        """
+
+        return {self._pub_ids[vertex] for vertex in self._members[self._find(self._ids[pub_id])]}
+
+    def connected_components(self) -> List[Set[Hashable]]:
+        return [{self._pub_ids[vertex] for vertex in members} for members in self._members.values()]
 
-    def add_vertex(self, pub_id):
-        self._graph.add_node(pub_id)
+    def _find(self, vertex: int) -> int:
+        root = vertex
+        while self._parents[root] != root:
+            root = self._parents[root]
 
-    def add_edge(self, pub_id_1, pub_id_2):
-        self._graph.add_edge(pub_id_1, pub_id_2, length=5)
+        while self._parents[vertex] != root:
+            self._parents[vertex], vertex = root, self._parents[vertex]
 
-    def connected_components(self):
-        return list(nx.connected_components(self._graph))
+        return root
@@ -0,0 +1,195 @@
+"""
+This module is used for keeping requests to every API within its rate limit.
+"""
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Union
+from urllib.parse import urlsplit
+
+# (requests per second, burst size) by host; hosts not listed here use DEFAULT_RATE,
+# limits announced by the API itself in response headers take precedence
+RATES = {
+    'api.crossref.org': (10, 10),
+    'api.openalex.org': (10, 10),
+    'api.semanticscholar.org': (1, 1),
+    'api.core.ac.uk': (1, 5),
+    'scholar.archive.org': (2, 2),
+    'api.unpaywall.org': (1, 2),
+    'paperswithcode.com': (1, 2),
+    # arXiv asks for no more than one request every three seconds
+    'export.arxiv.org': (1 / 3, 1),
+}
+DEFAULT_RATE = (1, 1)
+
+# statuses worth retrying, any other error won't go away by itself
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def reserve(self) -> float:
+        """
+        Take a token, possibly borrowing it from the future.
+        :return: seconds to wait before sending the request
+        :rtype: float
+        """
+
+        with self._lock:
+            now = self._refill()
+            self._tokens -= 1
+            wait = max(0.0, self._paused_until - now)
+
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self._rate)
+
+            return wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def change_rate(self, rate: float, capacity: float):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            self._capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        return now
+
+
+class RateLimiter:
+    """
+    Per-host token buckets shared by all clients of the process. Limits are adjusted from rate limit headers
+    of every response and a host is paused for as long as the API asks after a 429.
+    """
+
+    def __init__(self, rates: dict = None):
+        self._rates = dict(RATES, **(rates or {}))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url: str) -> float:
+        return self._bucket(url).reserve()
+
+    def acquire(self, url: str):
+        time.sleep(self.reserve(url))
+
+    def update(self, url: str, status: int, headers):
+        """
+        Learn the limits of the host from response headers.
+        """
+
+        bucket = self._bucket(url)
+
+        limit, interval = headers.get('X-Rate-Limit-Limit'), headers.get('X-Rate-Limit-Interval')
+        if limit and interval:
+            try:
+                limit = int(limit)
+            except ValueError:
+                # a malformed header is ignored, the limits learned so far stay
+                limit = None
+            seconds = _parse_interval(interval)
+            if limit and limit > 0 and seconds and limit / seconds != bucket.rate:
+                bucket.change_rate(limit / seconds, limit)
+
+        wait = retry_after(headers)
+        if wait is None and status == 429:
+            wait = backoff(0)
+        if wait is not None and (status in RETRY_STATUSES or headers.get('X-RateLimit-Remaining') == '0'):
+            bucket.pause(wait)
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).hostname or ''
+
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(*self._rates.get(host, DEFAULT_RATE))
+            return self._buckets[host]
+
+
+def backoff(attempt: int, base: float = 1, cap: float = 60) -> float:
+    """
+    Exponential backoff with full jitter: a random delay up to base * 2 ** attempt, but not longer than cap.
+    """
+
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(headers) -> Union[float, None]:
+    """
+    Get the number of seconds the API asks to wait from Retry-After or X-RateLimit-* headers.
+    """
+
+    now = datetime.now(timezone.utc)
+
+    value = headers.get('Retry-After')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(value) - now).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    # CORE sends a timestamp like 2023-03-01T12:00:00+0000
+    value = headers.get('X-RateLimit-Retry-After')
+    if value:
+        try:
+            retry_at = datetime.fromisoformat(re.sub(r'([+-]\d\d)(\d\d)$', r'\1:\2', value))
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            return max(0.0, (retry_at - now).total_seconds())
+        except ValueError:
+            pass
+
+    value = headers.get('X-RateLimit-Reset')
+    if value and headers.get('X-RateLimit-Remaining') == '0':
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        # either an epoch timestamp or a number of seconds
+        return max(0.0, reset - now.timestamp()) if reset > 10 ** 9 else reset
+
+    return None
+
+
+def _parse_interval(value: str) -> Union[float, None]:
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*', value)
+    if not match:
+        return None
+
+    multipliers = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return float(match.group(1)) * multipliers[match.group(2) or 's']
+
+
+_default_rate_limiter = RateLimiter()
+
+
+def default_rate_limiter() -> RateLimiter:
+    """
+    Rate limiter shared by all requests managers of the process.
+    """
+
+    return _default_rate_limiter
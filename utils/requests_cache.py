@@ -0,0 +1,240 @@
+"""
+This module is used for caching API responses on disk.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Union
+from urllib.parse import urlencode, urlsplit
+
+# seconds to keep responses for, by host; hosts not listed here use DEFAULT_TTL
+TTLS = {
+    'api.openalex.org': 24 * 60 * 60,
+    'api.crossref.org': 24 * 60 * 60,
+    'api.semanticscholar.org': 24 * 60 * 60,
+    'api.unpaywall.org': 24 * 60 * 60,
+    'scholar.archive.org': 7 * 24 * 60 * 60,
+    'paperswithcode.com': 7 * 24 * 60 * 60,
+    'export.arxiv.org': 24 * 60 * 60,
+    # scroll ids returned by CORE expire, so pages fetched with them can't be kept for long
+    'api.core.ac.uk': 60 * 60,
+}
+DEFAULT_TTL = 24 * 60 * 60
+# hits whose access times are kept in memory at most, they are written together with the next response
+ACCESS_BATCH_SIZE = 1000
+SKIPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+class RequestsCache:
+    """
+    SQLite-backed cache of successful API responses. Entries expire after the TTL of their host and the least
+    recently used ones are evicted once the cache grows over max_size bytes. Safe to share between threads.
+
+    Hits don't write to the database: access times and expired entries found on reads are written in one
+    transaction with the next stored response, or once ACCESS_BATCH_SIZE hits are pending, see flush.
+    """
+
+    def __init__(self, path: str, max_size: int = 1024 ** 3, ttls: dict = None):
+        self._path = path
+        self._max_size = max_size
+        self._ttls = dict(TTLS, **(ttls or {}))
+
+        self._hits = 0
+        self._misses = 0
+        # access times of hits and creation times and sizes of expired entries by key, not written yet
+        self._accessed = {}
+        self._expired = {}
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, host TEXT, url TEXT, status INTEGER, headers TEXT, content BLOB, '
+            'size INTEGER, created REAL, accessed REAL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._connection.commit()
+        self._size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+        return dict(hits=self._hits, misses=self._misses, entries=entries, size=self._size)
+
+    @staticmethod
+    def key(method: str, url: str, params: Union[dict, list, None] = None,
+            body: Union[str, bytes, dict, None] = None) -> str:
+        """
+        Build a cache key which doesn't depend on the order of query parameters or of keys in a JSON body.
+        """
+
+        if params:
+            items = params.items() if isinstance(params, dict) else params
+            params = urlencode(sorted((str(name), str(value)) for name, value in items if value is not None))
+
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, sort_keys=True)
+        elif body:
+            try:
+                body = json.dumps(json.loads(body), sort_keys=True)
+            except ValueError:
+                body = body.decode('utf-8', errors='replace') if isinstance(body, bytes) else body
+
+        raw_key = '\n'.join((method.upper(), url, params or '', body or ''))
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Union[tuple, None]:
+        """
+        :return: (url, status, headers, content) of a fresh cached response or None
+        :rtype: Union[tuple, None]
+        """
+
+        now = time.time()
+
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT host, url, status, headers, content, created, size FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None or now - row[5] > self._ttl(row[0]):
+                if row is not None:
+                    self._expired[key] = (row[5], row[6])
+                self._misses += 1
+                return None
+
+            self._accessed[key] = now
+            self._hits += 1
+            if len(self._accessed) >= ACCESS_BATCH_SIZE:
+                self._write_pending()
+                self._connection.commit()
+
+        return row[1], row[2], json.loads(row[3]), row[4]
+
+    def set(self, key: str, url: str, status: int, headers: dict, content: bytes):
+        now = time.time()
+        host = urlsplit(url).hostname or ''
+        # content is stored decoded, so headers describing the transfer encoding don't apply to it anymore
+        headers = {name: value for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS}
+
+        with self._lock:
+            self._expired.pop(key, None)
+            self._accessed.pop(key, None)
+            self._write_pending()
+
+            replaced = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, host, url, status, json.dumps(headers), content, len(content), now, now)
+            )
+            self._size += len(content) - (replaced[0] if replaced else 0)
+
+            if self._size > self._max_size:
+                self._evict()
+            self._connection.commit()
+
+    def flush(self):
+        """
+        Write access times of hits and delete expired entries found since the last write, e.g. before exit.
+        Access times which were never written only make eviction less accurate.
+        """
+
+        with self._lock:
+            self._write_pending()
+            self._connection.commit()
+
+    def clear(self):
+        with self._lock:
+            self._accessed.clear()
+            self._expired.clear()
+            self._connection.execute('DELETE FROM responses')
+            self._connection.commit()
+            self._size = 0
+
+    def _ttl(self, host: str) -> float:
+        return self._ttls.get(host, DEFAULT_TTL)
+
+    def _write_pending(self):
+        if self._accessed:
+            self._connection.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                         [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+        if self._expired:
+            # an entry stored again in the meantime, e.g. by another process, is kept
+            self._connection.executemany('DELETE FROM responses WHERE key = ? AND created = ?',
+                                         [(key, created) for key, (created, _) in self._expired.items()])
+            self._size -= sum(size for _, size in self._expired.values())
+            self._expired.clear()
+
+    def _delete_expired(self):
+        now = time.time()
+        hosts = [row[0] for row in self._connection.execute('SELECT DISTINCT host FROM responses')]
+
+        for host in hosts:
+            created_before = now - self._ttl(host)
+            freed = self._connection.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM responses WHERE host = ? AND created < ?', (host, created_before)
+            ).fetchone()[0]
+            if freed:
+                self._connection.execute('DELETE FROM responses WHERE host = ? AND created < ?', (host, created_before))
+                self._size -= freed
+
+    def _evict(self):
+        # expired entries go first, they are of no use anymore
+        self._delete_expired()
+        if self._size <= self._max_size:
+            return
+
+        # free a bit more than needed, so that eviction doesn't run on every insert
+        to_free = self._size - int(self._max_size * 0.9)
+        freed = 0
+        keys = []
+        for key, entry_size in self._connection.execute('SELECT key, size FROM responses ORDER BY accessed'):
+            keys.append((key,))
+            freed += entry_size
+            if freed >= to_free:
+                break
+
+        self._connection.executemany('DELETE FROM responses WHERE key = ?', keys)
+        self._size -= freed
+        logging.info(f'Evicted {len(keys)} responses ({freed} bytes) from cache.')
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache() -> Union[RequestsCache, None]:
+    """
+    Cache shared by all requests managers of the process. Caching is off unless REQUESTS_CACHE_PATH is set,
+    REQUESTS_CACHE_MAX_SIZE may override the size limit in bytes.
+    """
+
+    global _default_cache
+
+    path = os.getenv('REQUESTS_CACHE_PATH')
+    if not path:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_size = os.getenv('REQUESTS_CACHE_MAX_SIZE')
+            _default_cache = RequestsCache(path, max_size=int(max_size)) if max_size else RequestsCache(path)
+            atexit.register(_default_cache.flush)
+
+    return _default_cache
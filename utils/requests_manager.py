@@ -1,6 +1,15 @@
+import asyncio
 import time
+from typing import Union
 
+import httpx
 import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from utils.rate_limiter import RETRY_STATUSES, RateLimiter, backoff, default_rate_limiter, retry_after
+from utils.requests_cache import RequestsCache, default_cache
+from utils.transport import shared_async_client, shared_session
 
 
 def catch_network_errors(method):
@@ -50,32 +59,146 @@ def _post(session, *args, **kwargs):
     return session.post(*args, **kwargs)
 
 
-class RequestsManager:
-    def __init__(self):
-        self._session = requests.Session()
+def _cached_response(url, status, headers, content) -> requests.Response:
+    """
+    Build a response from the cache entry, so that callers can't tell it from a real one.
+    """
+
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = content
+    return response
+
+
+def _retry_delay(result, attempt: int) -> float:
+    """
+    Seconds to wait before retrying: as long as the API asks, otherwise exponential backoff with jitter.
+    """
 
-    def get(self, *args, **kwargs):
-        max_failures = kwargs.get('max_failures', 10)
-        kwargs.pop('max_failures')
+    if not isinstance(result, Exception):
+        delay = retry_after(result.headers)
+        if delay is not None:
+            return delay
 
+    return backoff(attempt)
+
+
+class RequestsManager:
+    def __init__(self, session: requests.Session = None, cache: RequestsCache = None,
+                 rate_limiter: RateLimiter = None):
+        self._session = session if session is not None else shared_session()
+        self._cache = cache if cache is not None else default_cache()
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+
+    @property
+    def cache(self) -> Union[RequestsCache, None]:
+        return self._cache
+
+    def get(self, url, **kwargs):
+        return self._request('GET', _get, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._request('POST', _post, url, **kwargs)
+
+    def _request(self, method, send, url, **kwargs):
+        max_failures = kwargs.pop('max_failures', 10)
+
+        cache_key = None
+        if self._cache is not None:
+            cache_key = RequestsCache.key(method, url, kwargs.get('params'),
+                                          kwargs.get('data') or kwargs.get('json'))
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return _cached_response(*cached)
+
+        attempt = 0
         while max_failures >= 0:
-            result = _get(self._session, *args, **kwargs)
+            self._rate_limiter.acquire(url)
+            result = send(self._session, url, **kwargs)
+
+            if isinstance(result, requests.Response):
+                self._rate_limiter.update(url, result.status_code, result.headers)
 
-            if isinstance(result, requests.Response) and (result.status_code == 200 or max_failures == 0):
-                return result
+                if result.status_code == 200 or result.status_code not in RETRY_STATUSES or max_failures == 0:
+                    if cache_key is not None and result.status_code == 200:
+                        self._cache.set(cache_key, result.url, result.status_code, result.headers, result.content)
+                    return result
 
             max_failures -= 1
-            time.sleep(5)
+            time.sleep(_retry_delay(result, attempt))
+            attempt += 1
 
-    def post(self, *args, **kwargs):
-        max_failures = kwargs.get('max_failures', 10)
-        kwargs.pop('max_failures')
 
+async def _async_request(client, method, *args, **kwargs):
+    """
+    Make safe asynchronous request using given client and arguments.
+    :param client: client for request making
+    :type client: httpx.AsyncClient
+    :param method: HTTP method name
+    :type method: str
+    :return: response if success, else caught error
+    :rtype: Union[httpx.Response, Exception]
+    """
+
+    try:
+        return await client.request(method, *args, **kwargs)
+    except Exception as network_error:
+        return network_error
+
+
+class AsyncRequestsManager:
+    def __init__(self, client=None, cache: RequestsCache = None, rate_limiter: RateLimiter = None):
+        # the shared client is created lazily, it belongs to the event loop the first request runs in
+        self._client = client
+        self._owns_client = client is not None
+        self._cache = cache if cache is not None else default_cache()
+        self._rate_limiter = rate_limiter if rate_limiter is not None else default_rate_limiter()
+
+    @property
+    def cache(self) -> Union[RequestsCache, None]:
+        return self._cache
+
+    async def get(self, url, **kwargs):
+        return await self._request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self._request('POST', url, **kwargs)
+
+    async def aclose(self):
+        # the shared client outlives managers, only a client passed by the caller is closed here
+        if self._owns_client:
+            await self._client.aclose()
+
+    async def _request(self, method, url, **kwargs):
+        max_failures = kwargs.pop('max_failures', 10)
+
+        cache_key = None
+        if self._cache is not None:
+            cache_key = RequestsCache.key(method, url, kwargs.get('params'),
+                                          kwargs.get('content') or kwargs.get('json'))
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                cached_url, status, headers, content = cached
+                return httpx.Response(status, headers=headers, content=content,
+                                      request=httpx.Request(method, cached_url))
+
+        attempt = 0
         while max_failures >= 0:
-            result = _post(self._session, *args, **kwargs)
+            await asyncio.sleep(self._rate_limiter.reserve(url))
+            result = await _async_request(self._client or shared_async_client(), method, url, **kwargs)
+
+            if isinstance(result, httpx.Response):
+                self._rate_limiter.update(url, result.status_code, result.headers)
 
-            if isinstance(result, requests.Response) and (result.status_code == 200 or max_failures == 0):
-                return result
+                if result.status_code == 200 or result.status_code not in RETRY_STATUSES or max_failures == 0:
+                    if cache_key is not None and result.status_code == 200:
+                        self._cache.set(cache_key, str(result.url), result.status_code, result.headers,
+                                        result.content)
+                    return result
 
             max_failures -= 1
-            time.sleep(5)
+            await asyncio.sleep(_retry_delay(result, attempt))
+            attempt += 1
@@ -0,0 +1,155 @@
+"""
+This module is used for sharing HTTP connections between all clients and searches of the process.
+"""
+import asyncio
+import importlib.util
+import threading
+import weakref
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# maximum number of kept-alive connections by host; hosts not listed here use DEFAULT_POOL_SIZE
+POOL_SIZES = {
+    'api.crossref.org': 10,
+    'api.openalex.org': 10,
+    'api.semanticscholar.org': 4,
+    'api.core.ac.uk': 4,
+    'scholar.archive.org': 4,
+    'api.unpaywall.org': 4,
+    'paperswithcode.com': 4,
+    'export.arxiv.org': 1,
+}
+DEFAULT_POOL_SIZE = 4
+KEEPALIVE_EXPIRY = 60
+TIMEOUT = 60
+
+_lock = threading.Lock()
+_settings = dict(pool_sizes=dict(POOL_SIZES), http2=None)
+_session = None
+_async_clients = weakref.WeakKeyDictionary()
+_async_stats = defaultdict(lambda: dict(requests=0, connections=0))
+_async_streams = weakref.WeakSet()
+
+
+def configure_transport(pool_sizes: dict = None, http2: bool = None):
+    """
+    Change pool sizes and HTTP/2 usage. Takes effect for transports created after the call,
+    so call it before the first search.
+    :param pool_sizes: maximum number of connections by host, merged with POOL_SIZES
+    :type pool_sizes: dict
+    :param http2: use HTTP/2 for asynchronous requests; by default it's used when the h2 package is installed
+    :type http2: bool
+    """
+
+    with _lock:
+        _settings['pool_sizes'] = dict(POOL_SIZES, **(pool_sizes or {}))
+        _settings['http2'] = http2
+
+
+def shared_session() -> requests.Session:
+    """
+    Session shared by all synchronous requests managers, so that connections to an API are opened once
+    and then kept alive for every client and search.
+    """
+
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers['Connection'] = 'keep-alive'
+
+            _session.mount('https://', HTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE))
+            _session.mount('http://', HTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE))
+            for host, pool_size in _settings['pool_sizes'].items():
+                adapter = HTTPAdapter(pool_maxsize=pool_size)
+                _session.mount(f'https://{host}', adapter)
+                _session.mount(f'http://{host}', adapter)
+
+        return _session
+
+
+def shared_async_client() -> httpx.AsyncClient:
+    """
+    Client shared by all asynchronous requests managers running in the current event loop.
+    httpx connections can't move between event loops, so every loop gets its own client.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        if loop not in _async_clients:
+            http2 = _settings['http2']
+            if http2 is None:
+                http2 = importlib.util.find_spec('h2') is not None
+
+            mounts = {
+                f'all://{host}': httpx.AsyncHTTPTransport(limits=_limits(pool_size), http2=http2)
+                for host, pool_size in _settings['pool_sizes'].items()
+            }
+            _async_clients[loop] = httpx.AsyncClient(
+                timeout=TIMEOUT,
+                follow_redirects=True,
+                limits=_limits(DEFAULT_POOL_SIZE),
+                http2=http2,
+                mounts=mounts,
+                event_hooks={'response': [_count_async_response]},
+            )
+
+        return _async_clients[loop]
+
+
+def transport_stats() -> dict:
+    """
+    Connection reuse by host: number of requests sent, connections opened for them and the share of requests
+    which were sent over an already open connection.
+    :return: dict of host -> dict(requests, connections, reuse)
+    :rtype: dict
+    """
+
+    stats = defaultdict(lambda: dict(requests=0, connections=0))
+
+    with _lock:
+        if _session is not None:
+            for adapter in set(_session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    stats[pool.host]['requests'] += pool.num_requests
+                    stats[pool.host]['connections'] += pool.num_connections
+
+        for host, host_stats in _async_stats.items():
+            stats[host]['requests'] += host_stats['requests']
+            stats[host]['connections'] += host_stats['connections']
+
+    for host_stats in stats.values():
+        requests_number = host_stats['requests']
+        host_stats['reuse'] = 1 - host_stats['connections'] / requests_number if requests_number else 0.0
+
+    return dict(stats)
+
+
+def _limits(pool_size: int) -> httpx.Limits:
+    return httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+async def _count_async_response(response: httpx.Response):
+    stream = response.extensions.get('network_stream')
+    # older httpcore versions don't expose the connection a response came from
+    if stream is None:
+        return
+
+    host = urlsplit(str(response.request.url)).hostname or ''
+
+    with _lock:
+        _async_stats[host]['requests'] += 1
+
+        # a stream seen for the first time means a new connection was opened for this request
+        if stream not in _async_streams:
+            _async_streams.add(stream)
+            _async_stats[host]['connections'] += 1